@@ -1,4 +1,12 @@
 from hmip.hopfield import HopfieldSolver
+from hmip.result import SolveResult
 from hmip import other_solvers
+from hmip import out_of_core
+from hmip import checkpoint
+from hmip import rolling_horizon
+from hmip import decomposition
+from hmip import presolve
+from hmip import scaling
+from hmip import lazy_constraints
 
 name = "hmip"
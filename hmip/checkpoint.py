@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+RANDOM_STATE_KEYS = ['random_state_keys', 'random_state_pos',
+                     'random_state_has_gauss', 'random_state_cached_gaussian']
+
+
+def save_checkpoint(file_path, checkpoint):
+    """
+    Write the checkpoint atomically as a compressed npz file: the file is
+    written next to file_path and then renamed, a reader never sees a
+    partial checkpoint.
+    :param file_path: (str) path of the checkpoint
+    :param checkpoint: (dict) state returned by HopfieldSolver (arrays,
+    scalars, None, 'random_state' as returned by RandomState.get_state and
+    'config' as a dict)
+    """
+    arrays = dict()
+    for key, value in checkpoint.items():
+        if value is None:
+            continue
+        elif key == 'random_state':
+            arrays['random_state_name'] = np.array(value[0])
+            for name, item in zip(RANDOM_STATE_KEYS, value[1:]):
+                arrays[name] = np.asarray(item)
+        elif key == 'config':
+            arrays['config'] = np.array(json.dumps(value))
+        else:
+            arrays[key] = np.asarray(value)
+    temporary_path = file_path + '.tmp'
+    with open(temporary_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, file_path)
+
+
+def load_checkpoint(file_path):
+    """
+    :param file_path: (str) path of a checkpoint written by save_checkpoint
+    :return: (dict) checkpoint, the missing keys are None
+    """
+    checkpoint = dict()
+    with np.load(file_path) as data:
+        for key in data.files:
+            value = data[key]
+            checkpoint[key] = value.item() if value.ndim == 0 else value
+    if 'random_state_name' in checkpoint:
+        checkpoint['random_state'] = tuple(
+            [checkpoint.pop('random_state_name')] +
+            [checkpoint.pop(name) for name in RANDOM_STATE_KEYS])
+    if 'config' in checkpoint:
+        checkpoint['config'] = json.loads(checkpoint['config'])
+    for key in ['slack_variable', 'dual_variable_eq', 'dual_variable_ineq',
+                'incumbent', 'incumbent_objective', 'stagnation_pattern',
+                'random_state', 'config', 'beta', 'smoothness_coef',
+                'velocity', 'previous_x_h', 'previous_gradient',
+                'diagonal_curvature', 'preconditioned_smoothness',
+                'initial_beta', 'penalty_x', 'penalty_eq', 'penalty_ineq',
+                'dual_iteration', 'constraint_residuals',
+                'constraint_snapshot_x', 'constraint_snapshot_calls']:
+        checkpoint.setdefault(key, None)
+    return checkpoint
+
+
+class CheckpointWriter():
+    def __init__(self, file_path):
+        """
+        Write checkpoints on a background thread so that the solver does not
+        wait for the disk. A checkpoint requested while the previous one is
+        still being written is skipped.
+        :param file_path: (str) path of the checkpoint
+        """
+        self.file_path = file_path
+        self.written = 0
+        self.skipped = 0
+        self.error = None
+        self._thread = None
+
+    def write(self, checkpoint):
+        """
+        :param checkpoint: (dict) state to write, must not be modified
+        afterwards by the caller
+        :return: (boolean) False if the checkpoint was skipped
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self.skipped += 1
+            return False
+        self._thread = threading.Thread(target=self._run, args=(checkpoint,),
+                                        daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self, checkpoint):
+        try:
+            save_checkpoint(self.file_path, checkpoint)
+            self.written += 1
+        except Exception as e:
+            self.error = e
+
+    def close(self):
+        """
+        Wait for the checkpoint being written
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,537 @@
+import concurrent.futures
+import logging
+import os
+import time
+
+import hmip.utils as utils
+from hmip.hopfield import HopfieldSolver
+from hmip.result import SolveResult
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+logger = logging.getLogger(__name__)
+
+
+def connected_components(n, H=None, A_eq=None, A_ineq=None):
+    """
+    Split the variables in independent groups: two variables are connected if
+    they appear together in H or in a constraint row. The graph search is done
+    on the bipartite graph variables-rows, so A^T A is never formed.
+    :param n: (int) number of variables
+    :param H: (np.array or sparse matrix) (default=None) quadratic term
+    :param A_eq: (np.array or sparse matrix) (default=None) equality constraints
+    :param A_ineq: (np.array or sparse matrix) (default=None) inequality
+    constraints
+    :return: (int, np.array) number of components and component of each
+    variable
+    """
+    blocks = [scipy.sparse.csr_matrix(H) if H is not None
+              else scipy.sparse.csr_matrix((n, n))]
+    for A in [A_eq, A_ineq]:
+        if A is not None:
+            blocks.append(scipy.sparse.csr_matrix(A))
+    rows = scipy.sparse.vstack(blocks[1:]) if len(blocks) > 1 \
+        else scipy.sparse.csr_matrix((0, n))
+    m = rows.shape[0]
+    graph = scipy.sparse.bmat([[blocks[0], rows.T],
+                               [rows, scipy.sparse.csr_matrix((m, m))]])
+    num_components, labels = scipy.sparse.csgraph.connected_components(
+        graph, directed=False)
+    labels = labels[:n]
+    # renumber the components that contain variables
+    _, labels = np.unique(labels, return_inverse=True)
+    return int(np.max(labels)) + 1 if n > 0 else 0, labels
+
+
+class ComponentSolver():
+    def __init__(self,
+                 solver_options=None,
+                 processes=None):
+        """
+
+        Solve a quadratic problem by independent components of its sparsity
+        graph: each component has its own smoothness coefficient and step
+        sizes, and the components are solved in parallel.
+
+        :param solver_options: (dict) (default=None) arguments of
+        HopfieldSolver, must be picklable
+        :param processes: (int) (default=None) number of worker processes,
+        the number of CPUs if None, in the current process if 1
+
+        """
+        self.solver_options = solver_options if solver_options is not None \
+            else dict()
+        self.processes = processes
+        self.labels = None
+        self.component_results = None
+
+    def solve(self,
+              H,
+              q,
+              lb,
+              ub,
+              binary_indicator,
+              A_eq=None,
+              b_eq=None,
+              A_ineq=None,
+              b_ineq=None,
+              penalty_eq=0,
+              penalty_ineq=0):
+        """
+
+        Solve min 1/2 x^T H x + q^T x subject to the constraints
+
+        :param H: (np.array or sparse matrix) symmetric matrix of size (n, n)
+        :param q: (np.array) size n
+        :param lb: (np.array) lower bound
+        :param ub: (np.array) upper bound
+        :param binary_indicator: (np.array) 1 if variable is binary, 0 otw
+        :param A_eq: (np.array or sparse matrix) (default=None) matrix A in equality constraint Ax = b
+        :param b_eq: (np.array) (default=None) matrix b in equality constraint Ax = b
+        :param A_ineq: (np.array or sparse matrix) (default=None) matrix A in inequality constraint Ax <= b
+        :param b_ineq: (np.array) (default=None) matrix b in inequality constraint Ax <= b
+        :param penalty_eq: (float) (default=0) penalty for the equality constraint
+        :param penalty_ineq: (float) (default=0) penalty for the inequality constraint
+        :return: (SolveResult) solution stitched from the components, the
+        iterations are the largest number of iterations of a component and
+        the status is 'mixed' if the components have different status. The
+        result of each component is in self.component_results
+
+        """
+        start_time = time.perf_counter()
+        n = len(q)
+        num_components, self.labels = connected_components(n, H, A_eq,
+                                                           A_ineq)
+        logger.info('%s independent components found.', num_components)
+
+        H = scipy.sparse.csr_matrix(H)
+        A_eq = scipy.sparse.csr_matrix(A_eq) if A_eq is not None else None
+        A_ineq = scipy.sparse.csr_matrix(A_ineq) if A_ineq is not None \
+            else None
+        rows_eq = _row_components(A_eq, self.labels)
+        rows_ineq = _row_components(A_ineq, self.labels)
+        subproblems = _subproblems(self.labels, num_components, H, q, lb, ub,
+                                   binary_indicator, A_eq, b_eq, rows_eq,
+                                   A_ineq, b_ineq, rows_ineq, penalty_eq,
+                                   penalty_ineq)
+
+        if self.processes == 1 or num_components <= 1:
+            self.component_results = [
+                _solve_component(self.solver_options, subproblem)
+                for subproblem in subproblems]
+        else:
+            processes = self.processes if self.processes is not None \
+                else os.cpu_count()
+            # small components are sent to the workers in chunks
+            chunksize = max(1, num_components // (4 * processes))
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=processes) as executor:
+                self.component_results = list(executor.map(
+                    _solve_component,
+                    [self.solver_options] * num_components, subproblems,
+                    chunksize=chunksize))
+
+        return self._stitch(n, H, q, A_eq, rows_eq, A_ineq, rows_ineq,
+                            start_time)
+
+    def _stitch(self, n, H, q, A_eq, rows_eq, A_ineq, rows_ineq, start_time):
+        x = np.zeros(n)
+        x_h = np.zeros(n)
+        slack_variable = np.zeros(A_ineq.shape[0]) if A_ineq is not None \
+            else None
+        dual_variable_eq = np.zeros(A_eq.shape[0]) if A_eq is not None \
+            else None
+        dual_variable_ineq = np.zeros(A_ineq.shape[0]) \
+            if A_ineq is not None else None
+        for component, result in enumerate(self.component_results):
+            index = self.labels == component
+            x[index] = result.x
+            x_h[index] = result.x_h
+            if result.dual_variable_eq is not None:
+                dual_variable_eq[rows_eq == component] = \
+                    result.dual_variable_eq
+            if result.slack_variable is not None:
+                slack_variable[rows_ineq == component] = result.slack_variable
+            if result.dual_variable_ineq is not None:
+                dual_variable_ineq[rows_ineq == component] = \
+                    result.dual_variable_ineq
+
+        objective_function, _ = utils.quadratic_objective(H, q)
+        statuses = set([result.status for result in self.component_results])
+        return SolveResult(
+            x,
+            x_h,
+            objective_function(x),
+            max([result.iterations for result in self.component_results]),
+            slack_variable=slack_variable,
+            dual_variable_eq=dual_variable_eq,
+            dual_variable_ineq=dual_variable_ineq,
+            solve_time=time.perf_counter() - start_time,
+            status=statuses.pop() if len(statuses) == 1 else 'mixed')
+
+
+class DualDecompositionSolver():
+    def __init__(self,
+                 solver_options=None,
+                 processes=None,
+                 max_iterations=50,
+                 multiplier_step='subgradient',
+                 step_size=1.0,
+                 precision=10**-4,
+                 feasibility_tolerance=10**-6,
+                 warm_start_blocks=False):
+        """
+
+        Lagrangian decomposition of a quadratic problem whose variables split
+        in blocks linked by a few coupling constraints. The coupling
+        constraints are relaxed with multipliers, the subproblem of each block
+        is solved with the Hopfield method in parallel, and the multipliers
+        are updated with a projected subgradient step.
+
+        :param solver_options: (dict) (default=None) arguments of
+        HopfieldSolver for the blocks, must be picklable
+        :param processes: (int) (default=None) number of worker processes,
+        the number of CPUs if None, in the current process if 1
+        :param max_iterations: (int) (default=50) number of multiplier updates
+        :param multiplier_step: (str) (default='subgradient') 'subgradient'
+        for the step step_size / sqrt(k + 1), 'polyak' for the step
+        step_size * (upper bound - dual value) / ||subgradient||^2 (the
+        subgradient step is used until a feasible point gives an upper bound)
+        :param step_size: (float) (default=1.0) scale of the steps
+        :param precision: (float) (default=10**-4) stop when the norm of the
+        coupling residual is below precision
+        :param feasibility_tolerance: (float) (default=10**-6) tolerance on
+        the constraints for a rounded point to be kept as incumbent
+        :param warm_start_blocks: (boolean) (default=False) if True each block
+        is warm started from its previous solution. Saturated binaries then
+        stay saturated, so it only suits small multiplier changes
+
+        """
+        self.solver_options = solver_options if solver_options is not None \
+            else dict()
+        self.processes = processes
+        self.max_iterations = max_iterations
+        if multiplier_step not in ['subgradient', 'polyak']:
+            raise Exception('Multiplier step type does not exist!')
+        self.multiplier_step = multiplier_step
+        self.step_size = step_size
+        self.precision = precision
+        self.feasibility_tolerance = feasibility_tolerance
+        self.warm_start_blocks = warm_start_blocks
+        self.labels = None
+        self.dual_values = []
+        self.residuals = []
+
+    def solve(self,
+              H,
+              q,
+              lb,
+              ub,
+              binary_indicator,
+              C_eq=None,
+              d_eq=None,
+              C_ineq=None,
+              d_ineq=None,
+              A_eq=None,
+              b_eq=None,
+              A_ineq=None,
+              b_ineq=None,
+              penalty_eq=0,
+              penalty_ineq=0,
+              blocks=None):
+        """
+
+        Solve min 1/2 x^T H x + q^T x subject to the block constraints
+        A_eq x = b_eq, A_ineq x <= b_ineq and the coupling constraints
+        C_eq x = d_eq, C_ineq x <= d_ineq
+
+        :param H: (np.array or sparse matrix) symmetric matrix of size (n, n),
+        without coupling between blocks
+        :param q: (np.array) size n
+        :param lb: (np.array) lower bound
+        :param ub: (np.array) upper bound
+        :param binary_indicator: (np.array) 1 if variable is binary, 0 otw
+        :param C_eq: (np.array or sparse matrix) (default=None) coupling equality constraints
+        :param d_eq: (np.array) (default=None) right hand side of C_eq
+        :param C_ineq: (np.array or sparse matrix) (default=None) coupling inequality constraints
+        :param d_ineq: (np.array) (default=None) right hand side of C_ineq
+        :param A_eq: (np.array or sparse matrix) (default=None) equality constraints of the blocks
+        :param b_eq: (np.array) (default=None) right hand side of A_eq
+        :param A_ineq: (np.array or sparse matrix) (default=None) inequality constraints of the blocks
+        :param b_ineq: (np.array) (default=None) right hand side of A_ineq
+        :param penalty_eq: (float) (default=0) penalty for the block equality constraint
+        :param penalty_ineq: (float) (default=0) penalty for the block inequality constraint
+        :param blocks: (np.array) (default=None) block of each variable, the
+        connected components of H and the block constraints if None
+        :return: (SolveResult) best feasible rounded point found (or the
+        rounded average of the block solutions if there is none), the dual
+        variables are the multipliers of the coupling constraints
+
+        """
+        start_time = time.perf_counter()
+        n = len(q)
+        if blocks is None:
+            num_blocks, self.labels = connected_components(n, H, A_eq, A_ineq)
+        else:
+            _, self.labels = np.unique(blocks, return_inverse=True)
+            num_blocks = int(np.max(self.labels)) + 1
+
+        H = scipy.sparse.csr_matrix(H)
+        A_eq = scipy.sparse.csr_matrix(A_eq) if A_eq is not None else None
+        A_ineq = scipy.sparse.csr_matrix(A_ineq) if A_ineq is not None \
+            else None
+        C_eq = scipy.sparse.csr_matrix(C_eq) if C_eq is not None else None
+        C_ineq = scipy.sparse.csr_matrix(C_ineq) if C_ineq is not None \
+            else None
+        rows_eq = _row_components(A_eq, self.labels)
+        rows_ineq = _row_components(A_ineq, self.labels)
+        for A, rows in [(A_eq, rows_eq), (A_ineq, rows_ineq)]:
+            if A is not None and not _rows_in_blocks(A, rows, self.labels):
+                raise Exception('A block constraint couples several blocks, '
+                                'give it as a coupling constraint')
+        subproblems = _subproblems(self.labels, num_blocks, H, q, lb, ub,
+                                   binary_indicator, A_eq, b_eq, rows_eq,
+                                   A_ineq, b_ineq, rows_ineq, penalty_eq,
+                                   penalty_ineq)
+        index = [np.flatnonzero(self.labels == block)
+                 for block in range(num_blocks)]
+        logger.info('Dual decomposition in %s blocks.', num_blocks)
+
+        multiplier_eq = np.zeros(C_eq.shape[0]) if C_eq is not None else None
+        multiplier_ineq = np.zeros(C_ineq.shape[0]) if C_ineq is not None \
+            else None
+        objective_function, _ = utils.quadratic_objective(H, q)
+        constraints = [(A_eq, b_eq, 'eq'), (A_ineq, b_ineq, 'ineq'),
+                       (C_eq, d_eq, 'eq'), (C_ineq, d_ineq, 'ineq')]
+        x = np.zeros(n)
+        x_h = np.zeros(n)
+        x_average = np.zeros(n)
+        incumbent, incumbent_objective = None, np.inf
+        block_results = [None] * num_blocks
+        self.dual_values = []
+        self.residuals = []
+        status = 'max_iterations'
+        k = -1
+
+        executor = None
+        if self.processes == 1 or num_blocks <= 1:
+            _init_blocks(self.solver_options, subproblems)
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.processes, initializer=_init_blocks,
+                initargs=(self.solver_options, subproblems))
+        try:
+            for k in range(self.max_iterations):
+                # linear term of the Lagrangian: q + C^T multipliers
+                q_lagrangian = np.copy(q)
+                if C_eq is not None:
+                    q_lagrangian += C_eq.T.dot(multiplier_eq)
+                if C_ineq is not None:
+                    q_lagrangian += C_ineq.T.dot(multiplier_ineq)
+                arguments = [(block, q_lagrangian[index[block]],
+                              block_results[block]
+                              if self.warm_start_blocks else None)
+                             for block in range(num_blocks)]
+                if executor is None:
+                    block_results = [_solve_block(*argument)
+                                     for argument in arguments]
+                else:
+                    block_results = list(executor.map(
+                        _solve_block, *zip(*arguments)))
+                for block, result in enumerate(block_results):
+                    x[index[block]] = result.x
+                    x_h[index[block]] = result.x_h
+                x_average += (x - x_average) / (k + 1)
+
+                residual_eq = C_eq.dot(x) - d_eq if C_eq is not None \
+                    else np.zeros(0)
+                residual_ineq = C_ineq.dot(x) - d_ineq if C_ineq is not None \
+                    else np.zeros(0)
+                dual_value = objective_function(x)
+                if C_eq is not None:
+                    dual_value += np.dot(multiplier_eq, residual_eq)
+                if C_ineq is not None:
+                    dual_value += np.dot(multiplier_ineq, residual_ineq)
+                self.dual_values.append(dual_value)
+
+                # primal recovery: round the binaries of the block solutions
+                x_rounded = _round_binaries(x, lb, ub, binary_indicator)
+                if _is_feasible(x_rounded, constraints,
+                                self.feasibility_tolerance):
+                    objective = objective_function(x_rounded)
+                    if objective < incumbent_objective:
+                        incumbent, incumbent_objective = x_rounded, objective
+
+                # projected subgradient of the dual function
+                subgradient_ineq = np.where(
+                    multiplier_ineq > 0, residual_ineq,
+                    np.maximum(residual_ineq, 0)) \
+                    if C_ineq is not None else residual_ineq
+                norm = np.sqrt(np.sum(residual_eq ** 2) +
+                               np.sum(subgradient_ineq ** 2))
+                self.residuals.append(norm)
+                logger.debug('Dual iteration %s: dual value %s, coupling '
+                             'residual %s.', k, dual_value, norm)
+                if norm < self.precision:
+                    status = 'converged'
+                    break
+
+                if self.multiplier_step == 'polyak' and incumbent is not None:
+                    step = self.step_size * max(
+                        incumbent_objective - dual_value, 0) / norm ** 2
+                else:
+                    step = self.step_size / np.sqrt(k + 1)
+                if C_eq is not None:
+                    multiplier_eq = multiplier_eq + step * residual_eq
+                if C_ineq is not None:
+                    multiplier_ineq = np.maximum(
+                        0, multiplier_ineq + step * residual_ineq)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if incumbent is None:
+            x_final = _round_binaries(x_average, lb, ub, binary_indicator)
+        else:
+            x_final = incumbent
+        return SolveResult(
+            x_final,
+            x_h,
+            objective_function(x_final),
+            k + 1,
+            dual_variable_eq=multiplier_eq,
+            dual_variable_ineq=multiplier_ineq,
+            solve_time=time.perf_counter() - start_time,
+            status=status,
+            incumbent=incumbent,
+            incumbent_objective=incumbent_objective if incumbent is not None
+            else None)
+
+
+def _subproblems(labels, num_components, H, q, lb, ub, binary_indicator,
+                 A_eq, b_eq, rows_eq, A_ineq, b_ineq, rows_ineq, penalty_eq,
+                 penalty_ineq):
+    """
+    :return: (list of dict) data of the subproblem of each component
+    """
+    subproblems = []
+    for component in range(num_components):
+        index = np.flatnonzero(labels == component)
+        index_eq = np.flatnonzero(rows_eq == component) \
+            if A_eq is not None else None
+        index_ineq = np.flatnonzero(rows_ineq == component) \
+            if A_ineq is not None else None
+        subproblems.append(dict({
+            'H': H[index][:, index],
+            'q': q[index],
+            'lb': lb[index],
+            'ub': ub[index],
+            'binary_indicator': binary_indicator[index],
+            'A_eq': _sub_rows(A_eq, index_eq, index),
+            'b_eq': b_eq[index_eq] if _has_rows(index_eq) else None,
+            'A_ineq': _sub_rows(A_ineq, index_ineq, index),
+            'b_ineq': b_ineq[index_ineq] if _has_rows(index_ineq) else None,
+            'penalty_eq': penalty_eq,
+            'penalty_ineq': penalty_ineq,
+        }))
+    return subproblems
+
+
+def _solve_component(solver_options, subproblem, q=None, warm_start=None):
+    """
+    Solve one component with its own solver, run in a worker process
+    :param q: (np.array) (default=None) linear term replacing subproblem['q']
+    :param warm_start: (SolveResult) (default=None) previous result of the
+    component
+    """
+    solver = HopfieldSolver(**solver_options)
+    objective_function, gradient = utils.quadratic_objective(
+        subproblem['H'], subproblem['q'] if q is None else q)
+    # H does not change between the solves of a block
+    if subproblem.get('smoothness_coef') is None:
+        subproblem['smoothness_coef'] = utils.smoothness_coefficient(
+            subproblem['H'], solver.random_state)
+    smoothness_coef = subproblem['smoothness_coef']
+    problem = solver.setup_optimization_problem(
+        objective_function,
+        gradient,
+        subproblem['lb'],
+        subproblem['ub'],
+        subproblem['binary_indicator'],
+        A_eq=subproblem['A_eq'],
+        b_eq=subproblem['b_eq'],
+        A_ineq=subproblem['A_ineq'],
+        b_ineq=subproblem['b_ineq'],
+        smoothness_coef=smoothness_coef if smoothness_coef > 0 else None,
+        penalty_eq=subproblem['penalty_eq'],
+        penalty_ineq=subproblem['penalty_ineq'],
+        warm_start=warm_start)
+    return solver.solve(problem)
+
+
+# blocks of the dual decomposition, sent once to each worker process
+_BLOCKS = dict()
+
+
+def _init_blocks(solver_options, subproblems):
+    _BLOCKS['solver_options'] = solver_options
+    _BLOCKS['subproblems'] = subproblems
+
+
+def _solve_block(block, q, warm_start):
+    return _solve_component(_BLOCKS['solver_options'],
+                            _BLOCKS['subproblems'][block], q=q,
+                            warm_start=warm_start)
+
+
+def _row_components(A, labels):
+    """
+    :return: (np.array) component of each row of A (-1 for an empty row)
+    """
+    if A is None:
+        return None
+    components = -np.ones(A.shape[0], dtype=int)
+    A = A.tocsr()
+    non_empty = np.flatnonzero(np.diff(A.indptr) > 0)
+    # all the variables of a row are in the same component
+    components[non_empty] = labels[A.indices[A.indptr[non_empty]]]
+    return components
+
+
+def _has_rows(index):
+    return index is not None and len(index) > 0
+
+
+def _sub_rows(A, index_rows, index_columns):
+    if not _has_rows(index_rows):
+        return None
+    return A[index_rows][:, index_columns]
+
+
+def _rows_in_blocks(A, rows, labels):
+    """
+    :return: (boolean) True if every row of A has its variables in one block
+    """
+    A = A.tocoo()
+    return bool(np.all(labels[A.col] == rows[A.row]))
+
+
+def _round_binaries(x, lb, ub, binary_indicator):
+    rounded = np.where(x - lb <= ub - x, lb, ub)
+    return np.where(binary_indicator == 1, rounded, x).astype(np.float64)
+
+
+def _is_feasible(x, constraints, tolerance):
+    """
+    :param constraints: (list) (A, b, 'eq' or 'ineq'), A can be None
+    """
+    for A, b, constraint_type in constraints:
+        if A is None:
+            continue
+        residual = A.dot(x) - b
+        if constraint_type == 'ineq':
+            residual = np.maximum(residual, 0)
+        if np.linalg.norm(residual) > tolerance:
+            return False
+    return True
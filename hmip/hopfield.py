@@ -1,7 +1,16 @@
+import logging
 import math
+import time
 
 import hmip.utils as utils
+from hmip.checkpoint import CheckpointWriter, load_checkpoint
+from hmip.instrumentation import get_instrumentation
+from hmip.result import SolveResult
+from hmip.telemetry import get_sink
 import numpy as np
+import scipy.sparse
+
+logger = logging.getLogger(__name__)
 
 
 class HopfieldSolver():
@@ -17,7 +26,42 @@ class HopfieldSolver():
                  step_type='classic',
                  initial_ascent_type='binary_neutral_ascent',
                  precision_stopping_criterion=10**-6,
-                 beta=None):
+                 beta=None,
+                 constraint_operator='auto',
+                 instrumentation=None,
+                 verbose=True,
+                 store_history=True,
+                 telemetry=None,
+                 telemetry_interval=10,
+                 time_limit=None,
+                 gradient_evaluation_limit=None,
+                 incumbent_interval='auto',
+                 feasibility_tolerance=10**-6,
+                 stopping_criterion_combination='or',
+                 stopping_window=10,
+                 relative_improvement_tolerance=10**-6,
+                 absorption_band=10**-3,
+                 checkpoint_path=None,
+                 checkpoint_interval=None,
+                 checkpoint_time_interval=None,
+                 seed=None,
+                 momentum=None,
+                 nonmonotone_window=10,
+                 beta_continuation=None,
+                 beta_growth=2,
+                 beta_max=100,
+                 beta_interval=50,
+                 beta_settle_tolerance=10**-3,
+                 penalty_adaptation=None,
+                 penalty_balance=10,
+                 penalty_factor=2,
+                 penalty_interval=10,
+                 penalty_max=10**6,
+                 dual_iterations=1,
+                 dual_step=None,
+                 dual_restart_margin=0.25,
+                 constraint_batch_size=None,
+                 snapshot_interval=50):
 
         self.activation_type = activation_type
         self.activation_function = getattr(utils,
@@ -29,15 +73,65 @@ class HopfieldSolver():
         self.ascent_stop_criterion = utils.adapt_ascent_stop_criterion(
             ascent_stop_criterion, absorption_criterion)
         self.stopping_criterion_type = stopping_criterion_type
+        self.stopping_criteria = _stopping_criteria(stopping_criterion_type)
+        if stopping_criterion_combination not in ['or', 'and']:
+            raise Exception('Stopping criterion combination does not exist!')
+        self.stopping_criterion_combination = stopping_criterion_combination
+        self.stopping_window = stopping_window
+        self.relative_improvement_tolerance = relative_improvement_tolerance
+        self.absorption_band = absorption_band
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_time_interval = checkpoint_time_interval
+        # the global numpy random state is used if there is no seed
+        self.random_state = np.random if seed is None else \
+            np.random.RandomState(seed)
         self.absorption_criterion = absorption_criterion
         self.initial_ascent_type = initial_ascent_type
         self.step_type = step_type
         self.direction_type = direction_type
+        # None: Nesterov schedule k / (k + 3), restarted with the momentum
+        self.momentum = momentum
+        self.nonmonotone_window = nonmonotone_window
+        if beta_continuation not in [None, 'geometric', 'adaptive']:
+            raise Exception('Beta continuation does not exist!')
+        self.beta_continuation = beta_continuation
+        self.beta_growth = beta_growth
+        self.beta_max = beta_max
+        self.beta_interval = beta_interval
+        self.beta_settle_tolerance = beta_settle_tolerance
+        if penalty_adaptation not in [None, 'residual_balancing']:
+            raise Exception('Penalty adaptation does not exist!')
+        self.penalty_adaptation = penalty_adaptation
+        self.penalty_balance = penalty_balance
+        self.penalty_factor = penalty_factor
+        self.penalty_interval = penalty_interval
+        self.penalty_max = penalty_max
+        self.dual_iterations = dual_iterations
+        # None: the penalty of each constraint type (method of multipliers)
+        self.dual_step = dual_step
+        self.dual_restart_margin = dual_restart_margin
+        # None: the constraint terms use all the rows
+        self.constraint_batch_size = constraint_batch_size
+        self.snapshot_interval = snapshot_interval
         self.max_iterations = max_iterations
         self.precision_stopping_criterion = precision_stopping_criterion
         self.gamma = gamma
         self.theta = theta
         self.beta = beta
+        self.constraint_operator = constraint_operator
+        self.instrumentation = get_instrumentation(instrumentation)
+        self.verbose = verbose
+        self.log_level = _verbosity_level(verbose)
+        self.store_history = store_history
+        self.telemetry_sink = get_sink(telemetry)
+        self.telemetry_interval = telemetry_interval
+        self.time_limit = time_limit
+        self.gradient_evaluation_limit = gradient_evaluation_limit
+        # 'auto' is resolved at each solve from the limits in effect (see
+        # _incumbent_interval)
+        self.incumbent_interval = incumbent_interval
+        self.feasibility_tolerance = feasibility_tolerance
 
     def setup_optimization_problem(self,
                                    objective_function,
@@ -55,7 +149,10 @@ class HopfieldSolver():
                                    penalty_ineq=0,
                                    dual_eq=None,
                                    dual_ineq=None,
-                                   verbose=False):
+                                   value_and_grad=None,
+                                   warm_start=None,
+                                   verbose=False,
+                                   hessian=None):
 
         """
 
@@ -66,9 +163,9 @@ class HopfieldSolver():
         :param lb: (np.array) lower bound
         :param ub: (np.array) upper bound
         :param binary_indicator: (np.array) 1 if variable is binary, 0 otw
-        :param A_eq: (np.array) (default=None) matrix A in equality constraint Ax = b
+        :param A_eq: (np.array, sparse matrix or LinearOperator) (default=None) matrix A in equality constraint Ax = b
         :param b_eq: (np.array) (default=None) matrix b in equality constraint Ax = b
-        :param A_ineq: (np.array) (default=None) matrix A in inequality constraint Ax <= b
+        :param A_ineq: (np.array, sparse matrix or LinearOperator) (default=None) matrix A in inequality constraint Ax <= b
         :param b_ineq: (np.array) (default=None) matrix b in inequality constraint Ax <= b
         :param x_0: (np.array) (default=None) initial value for the solution
         :param smoothness_coed: (float) smoothness coefficient
@@ -76,63 +173,122 @@ class HopfieldSolver():
         :param penalty_ineq: (float) (default=None) penalty for the inequality constraint
         :param dual_eq: (np.array) dual variable for the equality constraint
         :param dual_ineq: (np.array) dual variable for the inequality constraint
-        :param verbose: (boolean) if True print messages
-
-        """
-        print('Set up optimization problem ....')
-        utils.check_type(len(binary_indicator),
-                         lb=lb,
-                         ub=ub,
-                         binary_indicator=binary_indicator)
-
-        if not smoothness_coef:
-            print('compute smoothness coef')
-            smoothness_coef = utils.compute_approximate_smoothness_coef(
-                gradient, lb, ub)
-
-        if A_eq is not None and len(A_eq.shape) == 1:
-            A_eq = A_eq.reshape((1, -1))
-
-        if A_ineq is not None and len(A_ineq.shape) == 1:
-            A_ineq = A_ineq.reshape((1, -1))
-
-        problem = dict({
-            'objective_function': objective_function,
-            'gradient': gradient,
-            'lb': lb,
-            'ub': ub,
-            'A_eq': A_eq,
-            'b_eq': b_eq,
-            'A_ineq': A_ineq,
-            'b_ineq': b_ineq,
-            'binary_indicator': binary_indicator,
-            'smoothness_coef': smoothness_coef,
-            'x_0': x_0,
-            'dim_problem': len(binary_indicator),
-            'penalty_eq': penalty_eq,
-            'penalty_ineq': penalty_ineq,
-            'dual_eq': dual_eq,
-            'dual_ineq': dual_ineq,
-        })
-
-        if type(self.beta) == int:
-            self.beta = self.beta * binary_indicator - binary_indicator + np.ones(problem['dim_problem'])
-        elif self.beta is None:
-            self.beta = np.ones(problem['dim_problem'])
+        :param value_and_grad: (function) (default=None) returns the objective
+        function and its gradient at the same point, used instead of calling
+        objective_function and gradient separately when they share work
+        :param warm_start: (SolveResult or dict) (default=None) result of a
+        previous solve, its x_h, slack variable and dual variables are used as
+        they are and the initial ascent is skipped
+        :param verbose: (boolean) if True log the setup messages at INFO level
+        instead of DEBUG
+        :param hessian: (np.array, sparse matrix or LinearOperator)
+        (default=None) hessian of a quadratic objective function, needed by the
+        'exact' step type
 
-        problem['x_0'] = self._compute_x_0(problem)
+        """
+        with self.instrumentation.phase('setup'):
+            setup_log_level = logging.INFO if verbose else logging.DEBUG
+            self._log(setup_log_level, 'Set up optimization problem ....')
+            utils.check_type(len(binary_indicator),
+                             lb=lb,
+                             ub=ub,
+                             binary_indicator=binary_indicator)
+
+            if not smoothness_coef:
+                self._log(setup_log_level, 'compute smoothness coef')
+                with self.instrumentation.phase('smoothness_estimation'):
+                    smoothness_coef = utils.compute_approximate_smoothness_coef(
+                        self._count_calls(gradient, 'gradient_evaluations'),
+                        lb, ub, random_state=self.random_state)
+
+            if A_eq is not None and len(A_eq.shape) == 1:
+                A_eq = A_eq.reshape((1, -1))
+
+            if A_ineq is not None and len(A_ineq.shape) == 1:
+                A_ineq = A_ineq.reshape((1, -1))
+
+            x_h_0, slack_0 = None, None
+            if warm_start is not None:
+                self._log(setup_log_level, 'warm start from a previous result')
+                x_h_0 = _warm_start_value(warm_start, 'x_h',
+                                          len(binary_indicator))
+                slack_0 = _warm_start_value(
+                    warm_start, 'slack_variable',
+                    len(b_ineq) if b_ineq is not None else 0)
+                if dual_eq is None:
+                    dual_eq = _warm_start_value(
+                        warm_start, 'dual_variable_eq',
+                        len(b_eq) if b_eq is not None else 0)
+                if dual_ineq is None:
+                    dual_ineq = _warm_start_value(
+                        warm_start, 'dual_variable_ineq',
+                        len(b_ineq) if b_ineq is not None else 0)
+
+            problem = dict({
+                'objective_function': objective_function,
+                'gradient': gradient,
+                'lb': lb,
+                'ub': ub,
+                'A_eq': A_eq,
+                'b_eq': b_eq,
+                'A_ineq': A_ineq,
+                'b_ineq': b_ineq,
+                'binary_indicator': binary_indicator,
+                'smoothness_coef': smoothness_coef,
+                'x_0': x_0,
+                'dim_problem': len(binary_indicator),
+                'penalty_eq': penalty_eq,
+                'penalty_ineq': penalty_ineq,
+                'dual_eq': dual_eq,
+                'dual_ineq': dual_ineq,
+                'value_and_grad': value_and_grad,
+                'gram_eq': None,
+                'x_h_0': x_h_0,
+                'slack_0': slack_0,
+                'squared_norm_eq': None,
+                'squared_norm_ineq': None,
+                'hessian': hessian,
+                'diagonal_curvature': None,
+                'preconditioned_smoothness': None,
+            })
+
+            if type(self.beta) == int:
+                self.beta = self.beta * binary_indicator - binary_indicator + np.ones(problem['dim_problem'])
+            elif self.beta is None:
+                self.beta = np.ones(problem['dim_problem'])
+
+            if x_h_0 is not None:
+                problem['x_0'] = self._activation(x_h_0, ub, lb)
+            else:
+                with self.instrumentation.phase('initial_ascent'):
+                    problem['x_0'] = self._compute_x_0(problem)
 
-        print('.... Optimization problem set up.')
+        self._log(setup_log_level, '.... Optimization problem set up.')
 
         return problem
 
     def solve(self, problem):
-        print('Solving optimization problem ....')
+        """
 
-        x = np.nan * np.ones((problem['dim_problem'], self.max_iterations))
-        x_h = np.nan * np.ones((problem['dim_problem'], self.max_iterations))
-        f_val_hist = np.nan * np.ones(self.max_iterations)
-        step_size = np.nan * np.ones(self.max_iterations)
+        Solve the optimization problem
+
+        :param problem: (dict) problem returned by setup_optimization_problem
+        :return: (SolveResult) final iterate, objective, dual and slack
+        variables, number of iterations, time and history of the iterates. It
+        can be unpacked as (x, x_h, f_val_hist, step_size, other_dict). If the
+        time limit or the gradient evaluation limit is reached and a feasible
+        incumbent was found, x is the incumbent and objective its objective
+        function (without penalty). With dual_iterations > 1, the result of
+        the last Hopfield pass of the dual loop (see _dual_loop)
+
+        """
+        self._log(logging.INFO, 'Solving optimization problem ....')
+        start_time = time.perf_counter()
+        # the solve writes in a copy of the problem (adapted penalties,
+        # constraint snapshot, cached norms), the problem of the caller is
+        # left unchanged
+        problem = dict(problem)
+        problem['constraint_snapshot'] = None
 
         A_ineq = problem['A_ineq']
         A_eq = problem['A_eq']
@@ -140,119 +296,906 @@ class HopfieldSolver():
         b_eq = problem['b_eq']
         dual_eq = problem['dual_eq']
         dual_ineq = problem['dual_ineq']
-
-        if (A_eq is not None and b_eq is not None and dual_eq is None) or \
+        # the time and gradient evaluation limits include the dual phase
+        budget = dict({'start_time': start_time, 'evaluations': 0})
+
+        if self.constraint_batch_size is not None and \
+                ((A_eq is not None and b_eq is not None and dual_eq is None)
+                 or (A_ineq is not None and b_ineq is not None and
+                     dual_ineq is None)):
+            # the dual phase iterates on the full constraints until
+            # convergence, the dual loop updates the dual variables instead
+            self._log(logging.DEBUG, 'Constraint sampling: the unknown dual '
+                      'variables start at 0')
+            dual_variables_eq = dual_eq if dual_eq is not None or \
+                A_eq is None or b_eq is None else np.zeros(len(b_eq))
+            dual_variables_ineq = dual_ineq if dual_ineq is not None or \
+                A_ineq is None or b_ineq is None else np.zeros(len(b_ineq))
+        elif (A_eq is not None and b_eq is not None and dual_eq is None) or \
                 (A_ineq is not None and b_ineq is not None and dual_ineq is None):
-            print('Computing the dual variable ....')
-            dual_variables_eq, dual_variables_ineq = self._get_dual_variables(
-                problem)
-            print('.... Dual variable computed.')
+            self._log(logging.DEBUG, 'Computing the dual variable ....')
+            with self.instrumentation.phase('dual_variables'):
+                dual_variables_eq, dual_variables_ineq = \
+                    self._get_dual_variables(problem, budget)
+            status = self._budget_status(start_time, budget['evaluations'])
+            if status is not None:
+                self._log(logging.WARNING, 'Computation of the dual '
+                          'variables stopped by the %s.',
+                          status.replace('_', ' '))
+            self._log(logging.DEBUG, '.... Dual variable computed.')
         else:
-            print('Dual known or no constraints')
+            self._log(logging.DEBUG, 'Dual known or no constraints')
             dual_variables_eq, dual_variables_ineq = dual_eq, dual_ineq
 
+        value_and_grad, gradient_wrt_slack_variable = \
+            self._augmented_lagrangian(problem, dual_variables_eq,
+                                       dual_variables_ineq)
+
+        x_0 = problem['x_0']
+        x_h_0 = problem['x_h_0']
+        if x_h_0 is None:
+            x_h_0 = self._inverse_activation(x_0, problem['lb'],
+                                             problem['ub'])
+        s_0 = None
+        # with constraint sampling the slack variable is eliminated
         if A_ineq is not None and b_ineq is not None and \
+                self.constraint_batch_size is None:
+            s_0 = problem['slack_0'] if problem['slack_0'] is not None \
+                else 0 * problem['b_ineq']
+        state = self._initial_state(problem, value_and_grad, x_0, x_h_0, s_0,
+                                    budget['evaluations'])
+        return self._dual_loop(problem, state, value_and_grad,
+                               gradient_wrt_slack_variable, dual_variables_eq,
+                               dual_variables_ineq, start_time)
+
+    def _initial_state(self, problem, value_and_grad, x_0, x_h_0, s_0,
+                       evaluations=0, incumbent=None,
+                       incumbent_objective=None):
+        """
+        :return: (dict) state at the first iteration of a Hopfield pass
+        starting from x_h_0 (see _iterate)
+        """
+        if s_0 is not None:
+            f_val_0, grad_f = value_and_grad((x_0, s_0))
+        else:
+            f_val_0, grad_f = value_and_grad(x_0)
+        if np.linalg.norm(grad_f) == 0:
+            grad_f = (problem['smoothness_coef'] / 10) * \
+                (self.random_state.rand(problem['dim_problem']) - 0.5)
+
+        f_val_hist = np.nan * np.ones(self.max_iterations)
+        f_val_hist[0] = f_val_0
+        return dict({
+            'x': x_0,
+            'x_h': x_h_0,
+            'slack_variable': s_0,
+            'grad_f': grad_f,
+            'f_val_hist': f_val_hist,
+            'step_size': np.nan * np.ones(self.max_iterations),
+            'iterations': 0,
+            'evaluations': evaluations + 1,
+            'incumbent': incumbent,
+            'incumbent_objective': incumbent_objective,
+            'stagnation_pattern': None,
+            'stagnation_unchanged': 0,
+            'elapsed_time': 0,
+            'velocity': None,
+            'momentum_restart': 0,
+            'previous_x_h': None,
+            'previous_gradient': None,
+            'initial_beta': None,
+            'beta_last_increase': 0,
+            'penalty_x': None,
+        })
+
+    def _dual_loop(self, problem, state, value_and_grad,
+                   gradient_wrt_slack_variable, dual_variables_eq,
+                   dual_variables_ineq, start_time):
+        """
+        Outer loop of the dual Hopfield method: up to dual_iterations
+        Hopfield passes (a single one by default), each one warm started from
+        the x_h of the previous one. Between two passes the dual variables
+        are updated with the constraint residuals of the iterate with
+        rounded binary variables, and the loop stops once this iterate is
+        feasible.
+        :return: (SolveResult) result of the last pass, with the constraint
+        residuals at the end of each pass
+        """
+        outer = int(state.get('dual_iteration') or 0)
+        previous_residuals = state.get('constraint_residuals')
+        constraint_residuals = [] if previous_residuals is None else \
+            [list(residuals) for residuals in previous_residuals]
+        try:
+            while True:
+                state['dual_iteration'] = outer
+                state['constraint_residuals'] = constraint_residuals
+                result = self._iterate(problem, state, value_and_grad,
+                                       gradient_wrt_slack_variable,
+                                       dual_variables_eq, dual_variables_ineq,
+                                       start_time)
+                if self.dual_iterations == 1:
+                    return result
+                x_rounded = self._round_binaries(result.x, problem)
+                residual_eq, residual_ineq = self._constraint_residuals(
+                    x_rounded, problem)
+                constraint_residuals.append(
+                    [residual_eq if residual_eq is not None else np.nan,
+                     residual_ineq if residual_ineq is not None else np.nan])
+                outer += 1
+                self.instrumentation.count('dual_iterations')
+                self.instrumentation.record('constraint_residual', np.nansum(
+                    constraint_residuals[-1]))
+                self._log(logging.INFO, 'Dual iteration %s: constraint '
+                          'residual %s (equality), %s (inequality).', outer,
+                          residual_eq, residual_ineq)
+                feasible = np.all(np.nan_to_num(constraint_residuals[-1]) <=
+                                  self.feasibility_tolerance)
+                if feasible or outer >= self.dual_iterations or \
+                        result.status in ['time_limit',
+                                          'gradient_evaluation_limit']:
+                    break
+
+                if residual_eq is not None:
+                    dual_variables_eq = dual_variables_eq + self._dual_step(
+                        problem, 'eq') * (utils.matvec(
+                            problem['A_eq'], x_rounded) - problem['b_eq'])
+                if residual_ineq is not None:
+                    dual_variables_ineq = np.maximum(
+                        0, dual_variables_ineq + self._dual_step(
+                            problem, 'ineq') * (utils.matvec(
+                                problem['A_ineq'], x_rounded) -
+                                problem['b_ineq']))
+                value_and_grad, gradient_wrt_slack_variable = \
+                    self._augmented_lagrangian(problem, dual_variables_eq,
+                                               dual_variables_ineq)
+                x, x_h = self.unsaturate(result.x_h, problem)
+                # with constraint sampling the slack variable is eliminated
+                s_0 = result.slack_variable \
+                    if self.constraint_batch_size is None else None
+                state = self._initial_state(
+                    problem, value_and_grad, x, x_h, s_0,
+                    state['evaluations'], result.incumbent,
+                    result.incumbent_objective)
+            result.constraint_residuals = np.array(constraint_residuals)
+            return result
+        finally:
+            # the records are written and the files closed when solve
+            # returns, a slow sink leaves records behind instead of waiting
+            if self.telemetry_sink is not None:
+                left_behind = self.telemetry_sink.close() or 0
+                if left_behind > 0:
+                    self._log(logging.WARNING, 'Telemetry: %s records were '
+                              'not written before the end of the solve.',
+                              left_behind)
+                    self.instrumentation.count('telemetry_left_behind',
+                                               left_behind)
+
+    def unsaturate(self, x_h, problem):
+        """
+        Move x_h of the variables saturated at a bound back to
+        dual_restart_margin times the width of the box from the bound, where
+        the activation is not flat, e.g. before warm starting a new solve
+        from the x_h of a result
+        :param x_h: (np.array) internal iterate (before activation)
+        :param problem: (dict) problem from setup_optimization_problem
+        :return: (np.array, np.array) x and x_h
+        """
+        lb, ub = problem['lb'], problem['ub']
+        margin = self.dual_restart_margin * (ub - lb)
+        x_h = np.clip(x_h, self._inverse_activation(lb + margin, ub, lb),
+                      self._inverse_activation(ub - margin, ub, lb))
+        return self._activation(x_h, ub, lb), x_h
+
+    def _dual_step(self, problem, constraint_type):
+        if self.dual_step is not None:
+            return self.dual_step
+        return problem['penalty_' + constraint_type]
+
+    def resume(self, problem, checkpoint):
+        """
+
+        Continue a solve from a checkpoint. The iterates, slack and dual
+        variables, the random state and the counters are restored, so the
+        iterations are the same as without interruption.
+
+        :param problem: (dict) the same problem, returned by
+        setup_optimization_problem (its functions can not be checkpointed),
+        its smoothness coefficient (and preconditioner), its penalties and
+        its constraint snapshot are replaced by the checkpointed ones in a
+        copy, the problem of the caller is left unchanged
+        :param checkpoint: (str or dict) path of the checkpoint or checkpoint
+        returned by checkpoint.load_checkpoint
+        :return: (SolveResult) as solve, the history of the iterates before
+        the checkpoint is not restored
+
+        """
+        if isinstance(checkpoint, str):
+            checkpoint = load_checkpoint(checkpoint)
+        if checkpoint['config'] != self._config():
+            self._log(logging.WARNING, 'The checkpoint was written with a '
+                      'different solver configuration.')
+        if len(checkpoint['f_val_hist']) != self.max_iterations:
+            raise Exception('The checkpoint was written with a different '
+                            'max_iterations')
+        self._log(logging.INFO, 'Resuming optimization problem at iteration '
+                  '%s ....', checkpoint['iterations'])
+        start_time = time.perf_counter() - checkpoint['elapsed_time']
+        problem = dict(problem)
+
+        if checkpoint['beta'] is not None:
+            self.beta = checkpoint['beta']
+        if checkpoint['smoothness_coef'] is not None:
+            problem['smoothness_coef'] = checkpoint['smoothness_coef']
+        if checkpoint.get('diagonal_curvature') is not None:
+            problem['diagonal_curvature'] = checkpoint['diagonal_curvature']
+            problem['preconditioned_smoothness'] = \
+                checkpoint['preconditioned_smoothness']
+        if checkpoint.get('constraint_snapshot_x') is not None:
+            problem['constraint_snapshot'] = dict({
+                'x': checkpoint['constraint_snapshot_x'],
+                'calls': int(checkpoint['constraint_snapshot_calls']),
+            })
+        if checkpoint.get('penalty_eq') is not None:
+            problem['penalty_eq'] = checkpoint['penalty_eq']
+        if checkpoint.get('penalty_ineq') is not None:
+            problem['penalty_ineq'] = checkpoint['penalty_ineq']
+        if checkpoint['random_state'] is not None:
+            self.random_state.set_state(checkpoint['random_state'])
+        dual_variables_eq = checkpoint['dual_variable_eq']
+        dual_variables_ineq = checkpoint['dual_variable_ineq']
+        value_and_grad, gradient_wrt_slack_variable = \
+            self._augmented_lagrangian(problem, dual_variables_eq,
+                                       dual_variables_ineq)
+        return self._dual_loop(problem, dict(checkpoint), value_and_grad,
+                               gradient_wrt_slack_variable, dual_variables_eq,
+                               dual_variables_ineq, start_time)
+
+    def _augmented_lagrangian(self, problem, dual_variables_eq,
+                              dual_variables_ineq):
+        """
+        :return: (function, function) value_and_grad of the augmented
+        Lagrangian and gradient with respect to the slack variable (None
+        without inequality constraints)
+        """
+        A_ineq = problem['A_ineq']
+        A_eq = problem['A_eq']
+        b_ineq = problem['b_ineq']
+        b_eq = problem['b_eq']
+
+        gradient_wrt_slack_variable = None
+        if self.constraint_batch_size is not None and (
+                (A_ineq is not None and b_ineq is not None) or
+                (A_eq is not None and b_eq is not None)):
+            _, _, value_and_grad = self._sampled_constraints_problem(
+                problem, dual_variables_eq, dual_variables_ineq)
+
+        elif A_ineq is not None and b_ineq is not None and \
                 A_eq is not None and b_eq is not None:
-            objective_function, gradient, gradient_wrt_slack_variable = \
+            _, _, value_and_grad, gradient_wrt_slack_variable = \
                 self._all_constraints_problem(
                     problem, dual_variables_eq, dual_variables_ineq)
 
         elif A_ineq is not None and b_ineq is not None and (A_eq is None
                                                             or b_eq is None):
-            objective_function, gradient, gradient_wrt_slack_variable = \
+            _, _, value_and_grad, gradient_wrt_slack_variable = \
                 self._inequality_constraints_problem(
                     problem, dual_variables_ineq)
 
         elif A_eq is not None and b_eq is not None and (A_ineq is None
                                                         or b_ineq is None):
-            objective_function, gradient = \
+            _, _, value_and_grad = \
                 self._equality_constraints_problem(
                     problem, dual_variables_eq)
 
         else:
-            objective_function, gradient = \
+            _, _, value_and_grad = \
                 self._no_constraints_problem(problem)
 
-        x[:, 0] = problem['x_0']
-        x_h[:, 0] = self._inverse_activation(problem['x_0'], problem['lb'],
-                                             problem['ub'])
-        if A_ineq is not None and b_ineq is not None:
-            s = np.nan * np.ones((len(b_ineq), self.max_iterations))
-            s[:, 0] = 0 * problem['b_ineq']
-            f_val_hist[0] = objective_function((x[:, 0], s[:, 0]))
-            grad_f = gradient((x[:, 0], s[:, 0]))
-        else:
-            grad_f = gradient(x[:, 0])
-        if np.linalg.norm(grad_f) == 0:
-            grad_f = (problem['smoothness_coef'] / 10) * \
-                (np.random.rand(problem['dim_problem']) - 0.5)
-        k = 0
-
-        while not self._stopping_criterion_met(x[:, k], grad_f, k, problem):
-
-            direction = self._find_direction(x[:, k], grad_f, problem)
-
-            if self.step_type == 'armijo':
-                alpha = np.divide(np.linalg.norm(grad_f),
-                                  problem['smoothness_coef'])
-                f_val_hist[k + 1] = f_val_hist[k] + 1
-                prox_dist = self._proxy_distance_vector(
-                    x[:, k], problem['ub'], problem['lb'])
-                while f_val_hist[k + 1] > f_val_hist[k] + alpha * np.dot(
-                        np.multiply(prox_dist, grad_f).T, direction):
-                    x[:, k + 1], x_h[:, k + 1] = self._hopfield_update(
-                        x_h[:, k], alpha, direction, problem)
-                    if A_ineq is not None and b_ineq is not None:
-                        s[:, k + 1] = np.minimum(
-                            np.zeros(len(s[:, k + 1])),
-                            s[:, k] - 1 / problem['penalty_ineq'] *
-                            gradient_wrt_slack_variable(
-                                (x[:, k + 1], s[:, k])))
-                        f_val_hist[k + 1] = objective_function(
-                            (x[:, k + 1], s[:, k + 1]))
-                        grad_f = gradient((x[:, k + 1], s[:, k + 1]))
+        value_and_grad = self._count_calls(
+            value_and_grad, 'objective_evaluations', 'gradient_evaluations')
+        return value_and_grad, gradient_wrt_slack_variable
+
+    def _iterate(self, problem, state, value_and_grad,
+                 gradient_wrt_slack_variable, dual_variables_eq,
+                 dual_variables_ineq, start_time):
+        """
+        Main loop of the Hopfield method, starting from state (see solve).
+        The number of evaluations at the end is written back in state.
+        """
+        k = int(state['iterations'])
+        i = self._column(k)
+        # without history only the current and next iterates are kept
+        width = self.max_iterations if self.store_history else 2
+        x = np.nan * np.ones((problem['dim_problem'], width))
+        x_h = np.nan * np.ones((problem['dim_problem'], width))
+        x[:, i] = state['x']
+        x_h[:, i] = state['x_h']
+        s = None
+        if state['slack_variable'] is not None:
+            s = np.nan * np.ones((len(state['slack_variable']), width))
+            s[:, i] = state['slack_variable']
+        f_val_hist = np.array(state['f_val_hist'], dtype=np.float64)
+        step_size = np.array(state['step_size'], dtype=np.float64)
+        grad_f = state['grad_f']
+        evaluations = int(state['evaluations'])
+        status = None
+        incumbent_interval = self._incumbent_interval()
+        incumbent = state['incumbent']
+        incumbent_objective = state['incumbent_objective'] \
+            if incumbent is not None else np.inf
+        stagnation = dict({'pattern': state['stagnation_pattern'],
+                           'unchanged': int(state['stagnation_unchanged']),
+                           'met': []})
+        momentum = None
+        if self.direction_type in ['heavy_ball', 'nesterov']:
+            momentum = dict({
+                'velocity': state.get('velocity')
+                if state.get('velocity') is not None
+                else np.zeros(problem['dim_problem']),
+                'restart': int(state.get('momentum_restart') or 0),
+                'coefficient': 0,
+            })
+        # x_h and gradient with respect to x_h of the previous iteration, for
+        # the Barzilai-Borwein step
+        spectral = dict({'x_h': state.get('previous_x_h'),
+                         'gradient': state.get('previous_gradient')})
+        continuation = None
+        if self.beta_continuation is not None:
+            # beta of the binary variables is increased from its value at
+            # the start of the solve, which is restored at the end
+            continuation = dict({
+                'initial_beta': np.copy(state['initial_beta'])
+                if state.get('initial_beta') is not None
+                else np.copy(self.beta),
+                'last_increase': int(state.get('beta_last_increase') or 0),
+            })
+        # point of the last penalty update, for the dual residual
+        penalty_x = state.get('penalty_x') if state.get('penalty_x') \
+            is not None else np.copy(state['x'])
+        if self.step_type == 'exact' and problem.get('hessian') is None:
+            raise Exception('The exact step type needs the hessian of the '
+                            'objective function')
+        checkpoint_writer = CheckpointWriter(self.checkpoint_path) \
+            if self.checkpoint_path is not None else None
+        checkpoint_time = time.perf_counter()
+
+        with self.instrumentation.phase('main_loop'):
+            while True:
+                converged = self._stopping_criterion_met(
+                    x[:, i], grad_f, k, problem, f_val_hist, stagnation)
+                if continuation is not None and self._beta_increase_due(
+                        k, converged, f_val_hist, continuation, problem):
+                    x_h[:, i] = self._increase_beta(x[:, i], x_h[:, i], k,
+                                                    continuation, problem)
+                    # the memories of the previous steps are in the old x_h
+                    if momentum is not None:
+                        momentum['velocity'] = np.zeros(problem['dim_problem'])
+                        momentum['restart'] = k
+                    spectral['x_h'], spectral['gradient'] = None, None
+                    converged = False
+                if converged:
+                    break
+
+                status = self._budget_status(start_time, evaluations)
+                if status is not None:
+                    break
+
+                j = self._column(k + 1)
+
+                direction = self._find_direction(x[:, i], grad_f, problem)
+                if momentum is not None:
+                    momentum['coefficient'] = self._momentum_coefficient(
+                        k, momentum)
+
+                if self.step_type == 'armijo':
+                    alpha = np.divide(np.linalg.norm(grad_f),
+                                      problem['smoothness_coef'])
+                    f_val_hist[k + 1] = f_val_hist[k] + 1
+                    prox_dist = self._proxy_distance_vector(
+                        x[:, i], problem['ub'], problem['lb'])
+                    decrease = np.dot(np.multiply(prox_dist, grad_f).T, direction)
+                    trials = 0
+                    while f_val_hist[k + 1] > f_val_hist[k] + alpha * decrease:
+                        x[:, j], x_h[:, j] = self._hopfield_update(
+                            x_h[:, i], alpha, direction, problem, momentum)
+                        f_val_hist[k + 1], grad_f = self._evaluate(
+                            value_and_grad, gradient_wrt_slack_variable,
+                            x[:, j], s, i, j, problem)
+                        alpha = alpha / 2
+                        trials += 1
+                    evaluations += trials
+                    step_size[k] = 2 * alpha
+                    self.instrumentation.count('armijo_backtracks',
+                                               max(0, trials - 1))
+
+                elif self.step_type in ['barzilai_borwein', 'exact']:
+                    if self.step_type == 'exact':
+                        alpha = self._exact_step(x[:, i], x_h[:, i], grad_f,
+                                                 direction, problem)
                     else:
-                        f_val_hist[k + 1] = objective_function(x[:, k + 1])
-                        grad_f = gradient(x[:, k + 1])
-                    alpha = alpha / 2
-                step_size[k] = 2 * alpha
+                        alpha = self._barzilai_borwein_step(
+                            x[:, i], x_h[:, i], grad_f, direction, spectral,
+                            problem)
+                    if alpha is None:
+                        alpha = self._alpha_hop(x[:, i], grad_f, k, direction,
+                                                problem)
+                    # nonmonotone safeguard: sufficient decrease, predicted
+                    # from the move of x, with respect to the largest
+                    # objective of the last iterations
+                    reference = np.max(f_val_hist[
+                        max(0, k + 1 - self.nonmonotone_window):k + 1])
+                    trials = 0
+                    while True:
+                        x[:, j], x_h[:, j] = self._hopfield_update(
+                            x_h[:, i], alpha, direction, problem, momentum)
+                        f_val_hist[k + 1], next_grad_f = self._evaluate(
+                            value_and_grad, gradient_wrt_slack_variable,
+                            x[:, j], s, i, j, problem)
+                        trials += 1
+                        # the tolerance absorbs the rounding errors once the
+                        # objective function does not change anymore
+                        decrease = np.dot(grad_f, x[:, j] - x[:, i])
+                        if f_val_hist[k + 1] <= reference + 10**-4 * \
+                                decrease + 10**-12 * max(1, abs(reference)) \
+                                or trials >= 30:
+                            break
+                        alpha = alpha / 2
+                    grad_f = next_grad_f
+                    evaluations += trials
+                    step_size[k] = alpha
+                    self.instrumentation.count('step_backtracks', trials - 1)
 
-            else:
-                alpha = self._alpha_hop(x[:, k], grad_f, k, direction, problem)
-                x[:, k + 1], x_h[:, k + 1] = self._hopfield_update(
-                    x_h[:, k], alpha, direction, problem)
-                if A_ineq is not None and b_ineq is not None:
-                    s[:, k + 1] = s[:, k + 1] = np.minimum(
-                        np.zeros(len(s[:, k + 1])), s[:, k] - 1 /
-                        problem['penalty_ineq'] * gradient_wrt_slack_variable(
-                            (x[:, k + 1], s[:, k])))
-                    f_val_hist[k + 1] = objective_function(
-                        (x[:, k + 1], s[:, k + 1]))
-                    grad_f = gradient((x[:, k + 1], s[:, k + 1]))
                 else:
-                    f_val_hist[k + 1] = objective_function(x[:, k + 1])
-                    grad_f = gradient(x[:, k + 1])
+                    alpha = self._alpha_hop(x[:, i], grad_f, k, direction, problem)
+                    x[:, j], x_h[:, j] = self._hopfield_update(
+                        x_h[:, i], alpha, direction, problem, momentum)
+                    f_val_hist[k + 1], grad_f = self._evaluate(
+                        value_and_grad, gradient_wrt_slack_variable, x[:, j],
+                        s, i, j, problem)
+                    evaluations += 1
                     step_size[k] = alpha
 
-            if self.absorption_criterion is not None:
-                x[:, k + 1] = self._absorb_solution_to_limits(
-                    x[:, k + 1], problem)
+                if momentum is not None:
+                    self._update_momentum(momentum, step_size[k], direction,
+                                          x[:, j], f_val_hist[k + 1],
+                                          f_val_hist[k], k + 1, problem)
+
+                if self.absorption_criterion is not None:
+                    x[:, j] = self._absorb_solution_to_limits(
+                        x[:, j], problem)
+
+                if self.instrumentation.enabled:
+                    self.instrumentation.record(
+                        'absorbed_variables',
+                        self._number_absorbed_variables(x[:, j], problem))
+
+                k += 1
+                i = j
+
+                if self.penalty_adaptation is not None and \
+                        k % self.penalty_interval == 0:
+                    if self._balance_penalties(
+                            x[:, i], penalty_x,
+                            s[:, i] if s is not None else None, problem):
+                        # the equality terms are built with the penalty
+                        value_and_grad, gradient_wrt_slack_variable = \
+                            self._augmented_lagrangian(
+                                problem, dual_variables_eq,
+                                dual_variables_ineq)
+                        f_val_hist[k], grad_f = value_and_grad(
+                            (x[:, i], s[:, i]) if s is not None else x[:, i])
+                        evaluations += 1
+                        if momentum is not None:
+                            momentum['velocity'] = np.zeros(
+                                problem['dim_problem'])
+                            momentum['restart'] = k
+                        spectral['x_h'], spectral['gradient'] = None, None
+                        problem['diagonal_curvature'] = None
+                    penalty_x = np.copy(x[:, i])
+
+                if self.telemetry_sink is not None and \
+                        k % self.telemetry_interval == 0:
+                    self._write_telemetry(x[:, i], grad_f, f_val_hist[k],
+                                          step_size[k - 1], k, start_time,
+                                          problem)
+
+                # with constraint sampling a check would multiply by all
+                # the rows, the incumbent is only checked at the end
+                if incumbent_interval is not None and \
+                        self.constraint_batch_size is None and \
+                        k % incumbent_interval == 0:
+                    incumbent, incumbent_objective, evaluations = \
+                        self._update_incumbent(x[:, i], incumbent,
+                                               incumbent_objective,
+                                               evaluations, problem)
+
+                if checkpoint_writer is not None and \
+                        self._checkpoint_due(k, checkpoint_time):
+                    checkpoint_time = time.perf_counter()
+                    checkpoint_writer.write(dict({
+                        'x': x[:, i].copy(),
+                        'x_h': x_h[:, i].copy(),
+                        'slack_variable': s[:, i].copy() if s is not None
+                        else None,
+                        'grad_f': np.copy(grad_f),
+                        'f_val_hist': f_val_hist.copy(),
+                        'step_size': step_size.copy(),
+                        'iterations': k,
+                        'evaluations': evaluations,
+                        'incumbent': incumbent,
+                        'incumbent_objective': incumbent_objective
+                        if incumbent is not None else None,
+                        'stagnation_pattern': stagnation['pattern'],
+                        'stagnation_unchanged': stagnation['unchanged'],
+                        'elapsed_time': checkpoint_time - start_time,
+                        'velocity': np.copy(momentum['velocity'])
+                        if momentum is not None else None,
+                        'momentum_restart': momentum['restart']
+                        if momentum is not None else 0,
+                        'previous_x_h': spectral['x_h'],
+                        'previous_gradient': spectral['gradient'],
+                        'initial_beta': continuation['initial_beta']
+                        if continuation is not None else None,
+                        'beta_last_increase': continuation['last_increase']
+                        if continuation is not None else 0,
+                        'penalty_x': np.copy(penalty_x),
+                        'penalty_eq': problem['penalty_eq'],
+                        'penalty_ineq': problem['penalty_ineq'],
+                        'dual_iteration': state.get('dual_iteration', 0),
+                        'constraint_snapshot_x': (problem.get(
+                            'constraint_snapshot') or dict()).get('x'),
+                        'constraint_snapshot_calls': (problem.get(
+                            'constraint_snapshot') or dict()).get('calls'),
+                        'constraint_residuals': np.array(
+                            state.get('constraint_residuals', []),
+                            dtype=np.float64).reshape(-1, 2),
+                        'dual_variable_eq': dual_variables_eq,
+                        'dual_variable_ineq': dual_variables_ineq,
+                        'beta': np.copy(self.beta),
+                        'smoothness_coef': problem['smoothness_coef'],
+                        'diagonal_curvature': problem.get(
+                            'diagonal_curvature'),
+                        'preconditioned_smoothness': problem.get(
+                            'preconditioned_smoothness'),
+                        'random_state': self.random_state.get_state(),
+                        'config': self._config(),
+                    }))
+
+        if checkpoint_writer is not None:
+            checkpoint_writer.close()
+            self.instrumentation.count('checkpoints_written',
+                                       checkpoint_writer.written)
+            self.instrumentation.count('checkpoints_skipped',
+                                       checkpoint_writer.skipped)
+            if checkpoint_writer.error is not None:
+                self._log(logging.WARNING, 'Checkpoint could not be written: '
+                          '%s', checkpoint_writer.error)
+
+        if self.telemetry_sink is not None and \
+                k % self.telemetry_interval != 0:
+            self._write_telemetry(x[:, i], grad_f, f_val_hist[k],
+                                  step_size[k - 1] if k > 0 else np.nan, k,
+                                  start_time, problem)
+
+        if status is None:
+            status = 'max_iterations' if k >= self.max_iterations - 1 \
+                else 'converged'
+        if status == 'converged':
+            saved_iterations = self.max_iterations - 1 - k
+            self._log(logging.INFO, 'Stopping criterion %s met, %s iterations '
+                      'saved.', (' %s ' % self.stopping_criterion_combination)
+                      .join(stagnation['met']), saved_iterations)
+            self.instrumentation.count('iterations_saved', saved_iterations)
+        if incumbent_interval is not None:
+            incumbent, incumbent_objective, evaluations = \
+                self._update_incumbent(x[:, i], incumbent,
+                                       incumbent_objective, evaluations,
+                                       problem)
+
+        x_final, objective = x[:, i], f_val_hist[k]
+        if status in ['time_limit', 'gradient_evaluation_limit']:
+            self._log(logging.WARNING, 'Solve stopped by the %s after %s '
+                      'iterations.', status.replace('_', ' '), k)
+            if incumbent is not None:
+                x_final, objective = incumbent, incumbent_objective
+
+        self._log(logging.INFO,
+                  'Candidate solution found with %s number of iterations.', k)
+        self.instrumentation.count('iterations', k)
+        self.instrumentation.flush()
+        x_h_final = x_h[:, i]
+        if continuation is not None:
+            self._log(logging.INFO, 'Beta of the binary variables increased '
+                      'to %s.', np.max(self.beta))
+            x_h_final = self._restore_beta(x[:, i], x_h_final, continuation,
+                                           problem)
+        state['evaluations'] = evaluations
+        history = dict({'f_val': f_val_hist, 'step_size': step_size})
+        if self.store_history:
+            history.update({'x': x, 'x_h': x_h, 'slack_variable': s})
+        return SolveResult(
+            x_final,
+            x_h_final,
+            objective,
+            k,
+            slack_variable=s[:, i] if s is not None else
+            self._eliminated_slack(x[:, i], dual_variables_ineq, problem),
+            dual_variable_eq=dual_variables_eq,
+            dual_variable_ineq=dual_variables_ineq,
+            solve_time=time.perf_counter() - start_time,
+            history=history,
+            status=status,
+            incumbent=incumbent,
+            incumbent_objective=incumbent_objective if incumbent is not None
+            else None,
+            penalty_eq=problem['penalty_eq'],
+            penalty_ineq=problem['penalty_ineq'])
+
+    def _checkpoint_due(self, k, checkpoint_time):
+        if self.checkpoint_interval is not None and \
+                k % self.checkpoint_interval == 0:
+            return True
+        return self.checkpoint_time_interval is not None and \
+            time.perf_counter() - checkpoint_time >= \
+            self.checkpoint_time_interval
 
-            k += 1
+    def _beta_increase_due(self, k, converged, f_val_hist, continuation,
+                           problem):
+        """
+        Beta is increased when the iterate settles at the current beta (the
+        stopping criteria are met, or for 'adaptive' the relative improvement
+        of the objective over stopping_window iterations is smaller than
+        beta_settle_tolerance) and for 'geometric' every beta_interval
+        iterations, until beta_max
+        """
+        binary = problem['binary_indicator'] == 1
+        if k >= self.max_iterations - 1 or not np.any(binary) or \
+                np.min(self.beta[binary]) >= self.beta_max:
+            return False
+        if converged:
+            return True
+        since_increase = k - continuation['last_increase']
+        if self.beta_continuation == 'geometric':
+            return since_increase >= self.beta_interval
+        return since_increase >= self.stopping_window and \
+            self._objective_stagnates(f_val_hist, k,
+                                      self.beta_settle_tolerance)
+
+    def _increase_beta(self, x, x_h, k, continuation, problem):
+        """
+        Multiply beta of the binary variables by beta_growth (at most
+        beta_max) and remap x_h so that x does not change
+        :return: (np.array) x_h for the new beta
+        """
+        binary = problem['binary_indicator'] == 1
+        self.beta = np.where(binary, np.minimum(self.beta * self.beta_growth,
+                                                self.beta_max), self.beta)
+        continuation['last_increase'] = k
+        self.instrumentation.count('beta_increases')
+        self._log(logging.DEBUG, 'Beta increased to %s at iteration %s.',
+                  np.max(self.beta[binary]), k)
+        return self._remap_x_h(x, x_h, problem)
+
+    def _restore_beta(self, x, x_h, continuation, problem):
+        """
+        Restore the beta of the start of the solve
+        :return: (np.array) x_h for this beta
+        """
+        self.beta = continuation['initial_beta']
+        return self._remap_x_h(x, x_h, problem)
 
-        x = utils.remove_nan_results(x)
+    def _remap_x_h(self, x, x_h, problem):
+        """
+        x_h of the binary variables such that activation(x_h) = x with the
+        current beta, the saturated variables without inverse (tanh) keep
+        their x_h
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            remapped = self._inverse_activation(x, problem['ub'],
+                                                problem['lb'])
+        binary = problem['binary_indicator'] == 1
+        return np.where(binary & np.isfinite(remapped), remapped, x_h)
 
-        print('Candidate solution found with %s number of iterations.' % k)
-        if A_ineq is not None and b_ineq is not None:
-            return x, x_h, f_val_hist, step_size, dict(
-                {'slack_variable': s,
-                 'dual_variable_eq': dual_variables_eq,
-                 'dual_variable_ineq': dual_variables_eq})
-        else:
-            return x, x_h, f_val_hist, step_size, dict()
+    def _config(self):
+        """
+        :return: (dict) options of the solver that change the iterates
+        """
+        return dict({
+            'activation_type': self.activation_type,
+            'gamma': self.gamma,
+            'theta': self.theta,
+            'absorption_criterion': self.absorption_criterion,
+            'max_iterations': self.max_iterations,
+            'stopping_criterion_type': self.stopping_criteria,
+            'stopping_criterion_combination':
+                self.stopping_criterion_combination,
+            'direction_type': self.direction_type,
+            'momentum': self.momentum,
+            'step_type': self.step_type,
+            'nonmonotone_window': self.nonmonotone_window,
+            'beta_continuation': self.beta_continuation,
+            'beta_growth': self.beta_growth,
+            'beta_max': self.beta_max,
+            'beta_interval': self.beta_interval,
+            'beta_settle_tolerance': self.beta_settle_tolerance,
+            'penalty_adaptation': self.penalty_adaptation,
+            'penalty_balance': self.penalty_balance,
+            'penalty_factor': self.penalty_factor,
+            'penalty_interval': self.penalty_interval,
+            'penalty_max': self.penalty_max,
+            'dual_iterations': self.dual_iterations,
+            'dual_step': self.dual_step,
+            'dual_restart_margin': self.dual_restart_margin,
+            'constraint_batch_size': self.constraint_batch_size,
+            'snapshot_interval': self.snapshot_interval,
+            'precision_stopping_criterion': self.precision_stopping_criterion,
+            'stopping_window': self.stopping_window,
+            'relative_improvement_tolerance':
+                self.relative_improvement_tolerance,
+            'absorption_band': self.absorption_band,
+            'incumbent_interval': self.incumbent_interval,
+            'feasibility_tolerance': self.feasibility_tolerance,
+        })
+
+    def _column(self, k):
+        """
+        Column of the arrays of iterates used at iteration k
+        """
+        if self.store_history:
+            return k
+        return k % 2
+
+    def _write_telemetry(self, x, grad_f, f_val, step_size, k, start_time,
+                         problem):
+        precision = np.linalg.norm(np.multiply(
+            grad_f, self._proxy_distance_vector(x, problem['ub'],
+                                                problem['lb'])))
+        number_binaries = np.sum(problem['binary_indicator'])
+        absorbed_fraction = self._number_absorbed_variables(
+            x, problem) / number_binaries if number_binaries > 0 else 1.0
+        residual_eq, residual_ineq = None, None
+        # with constraint sampling the residuals would need all the rows
+        if self.constraint_batch_size is None:
+            residual_eq, residual_ineq = self._constraint_residuals(x,
+                                                                    problem)
+        self.telemetry_sink.write(dict({
+            'iteration': int(k),
+            'time': time.perf_counter() - start_time,
+            'objective': float(f_val),
+            'gradient_precision': float(precision),
+            'step_size': float(step_size),
+            'absorbed_fraction': float(absorbed_fraction),
+            'residual_eq': residual_eq,
+            'residual_ineq': residual_ineq,
+        }))
+
+    def _budget_status(self, start_time, evaluations):
+        """
+        :return: (str) 'time_limit' or 'gradient_evaluation_limit' if the
+        budget is exhausted, None otherwise
+        """
+        if self.time_limit is not None and \
+                time.perf_counter() - start_time >= self.time_limit:
+            return 'time_limit'
+        if self.gradient_evaluation_limit is not None and \
+                evaluations >= self.gradient_evaluation_limit:
+            return 'gradient_evaluation_limit'
+        return None
+
+    def _incumbent_interval(self):
+        """
+        'auto': the incumbent is only needed when a budget can stop the
+        solve, each check costs an objective evaluation and constraint
+        products. The limits are read at each solve, they can be changed
+        between solves (e.g. by the rolling horizon driver)
+        :return: (int) iterations between two incumbent checks, None without
+        incumbent
+        """
+        if self.incumbent_interval == 'auto':
+            return 10 if self.time_limit is not None or \
+                self.gradient_evaluation_limit is not None else None
+        return self.incumbent_interval
+
+    def _round_binaries(self, x, problem):
+        binary = problem['binary_indicator'] == 1
+        lb, ub = problem['lb'], problem['ub']
+        rounded = np.where(x - lb <= ub - x, lb, ub)
+        return np.where(binary, rounded, x).astype(np.float64)
+
+    def _update_incumbent(self, x, incumbent, incumbent_objective,
+                          evaluations, problem):
+        """
+        Round the binary variables of x and keep it as incumbent if it is
+        feasible and better than the current one. The objective function
+        evaluation counts in the gradient evaluation budget
+        :return: (np.array, float, int) incumbent, its objective function and
+        the number of evaluations
+        """
+        x_rounded = self._round_binaries(x, problem)
+        residual_eq, residual_ineq = self._constraint_residuals(x_rounded,
+                                                                problem)
+        if (residual_eq is not None and
+                residual_eq > self.feasibility_tolerance) or \
+                (residual_ineq is not None and
+                 residual_ineq > self.feasibility_tolerance):
+            return incumbent, incumbent_objective, evaluations
+        objective = problem['objective_function'](x_rounded)
+        self.instrumentation.count('incumbent_evaluations')
+        if objective < incumbent_objective:
+            self.instrumentation.count('incumbent_updates')
+            return x_rounded, objective, evaluations + 1
+        return incumbent, incumbent_objective, evaluations + 1
+
+    def _constraint_residuals(self, x, problem):
+        """
+        :return: (float, float) norm of A_eq x - b_eq and of the violation
+        max(0, A_ineq x - b_ineq), None if there is no such constraint
+        """
+        residual_eq = None
+        residual_ineq = None
+        if problem['A_eq'] is not None and problem['b_eq'] is not None:
+            residual_eq = float(np.linalg.norm(
+                utils.matvec(problem['A_eq'], x) - problem['b_eq']))
+        if problem['A_ineq'] is not None and problem['b_ineq'] is not None:
+            residual_ineq = float(np.linalg.norm(np.maximum(
+                0, utils.matvec(problem['A_ineq'], x) - problem['b_ineq'])))
+        return residual_eq, residual_ineq
+
+    def _log(self, level, message, *args):
+        """
+        Send a message to the hmip logger if the verbosity of the solver and
+        the logger configuration let it through. Arguments are only formatted
+        if the message is emitted.
+        """
+        if level >= self.log_level and logger.isEnabledFor(level):
+            logger.log(level, message, *args)
+
+    def _count_calls(self, function, *counter_names):
+        """
+        Wrap function to count its calls when the instrumentation is enabled.
+        """
+        if not self.instrumentation.enabled:
+            return function
+
+        def counted_function(*args):
+            for counter_name in counter_names:
+                self.instrumentation.count(counter_name)
+            return function(*args)
+
+        return counted_function
+
+    def _number_absorbed_variables(self, x, problem):
+        at_bounds = np.logical_or(x == problem['lb'], x == problem['ub'])
+        return int(np.sum(np.logical_and(at_bounds,
+                                         problem['binary_indicator'])))
+
+    def _evaluate(self, value_and_grad, gradient_wrt_slack_variable,
+                  next_x, s, i, j, problem):
+        """
+        Update the slack variable (if there are inequality constraints) and
+        evaluate the objective and its gradient at the next iterate. The
+        constraint products with next_x are computed once and shared.
+        """
+        if s is None:
+            return value_and_grad(next_x)
+        s[:, j] = np.minimum(
+            np.zeros(len(s[:, j])), s[:, i] - 1 /
+            problem['penalty_ineq'] * gradient_wrt_slack_variable(
+                (next_x, s[:, i])))
+        return value_and_grad((next_x, s[:, j]))
 
 
-    def _get_dual_variables(self, problem):
+    def _get_dual_variables(self, problem, budget=None):
+        """
+        Dual variables of the continuous relaxation, with the method of
+        multipliers
+        :param budget: (dict) (default=None) 'start_time' and 'evaluations'
+        of the solve: the phase stops with the current dual variables once
+        the time or gradient evaluation limit is reached. The number of
+        evaluations at the end is written back in budget.
+        :return: (np.array, np.array) dual variables of the equality and
+        inequality constraints, None without such constraints
+        """
         n = problem['dim_problem']
         A_ineq = problem['A_ineq']
         A_eq = problem['A_eq']
@@ -262,6 +1205,17 @@ class HopfieldSolver():
         ub = problem['ub']
         penalty_ineq = problem['penalty_ineq']
         penalty_eq = problem['penalty_eq']
+        counted_gradient = self._count_calls(problem['gradient'],
+                                             'gradient_evaluations')
+
+        def gradient(variables):
+            if budget is not None:
+                budget['evaluations'] += 1
+            return counted_gradient(variables)
+
+        def out_of_budget():
+            return budget is not None and self._budget_status(
+                budget['start_time'], budget['evaluations']) is not None
 
         # TODO(Mathilde): add as a class variable
         precision = 10e-4
@@ -271,27 +1225,29 @@ class HopfieldSolver():
             n_ineq = A_ineq.shape[0]
 
         def inequality_constraint(variables):
-            return np.dot(A_ineq, variables[:n]) - b_ineq - variables[n:]
+            return utils.matvec(A_ineq, variables[:n]) - b_ineq - variables[n:]
 
         def equality_constraint(variables):
-            return np.dot(A_eq, variables[:n]) - b_eq
+            return utils.matvec(A_eq, variables[:n]) - b_eq
+
+        if A_eq is not None and b_eq is not None:
+            equality_gradient = self._equality_dual_gradient(problem)
+        # point of the last penalty update, for the dual residual
+        penalty_x = problem['x_0']
 
         if A_ineq is not None and b_ineq is not None and \
                 A_eq is not None and b_eq is not None:
 
-            rate = 1 / (problem['smoothness_coef'] + penalty_eq * max(
-                np.linalg.eigvals(np.dot(A_eq.T, A_eq))) + penalty_ineq *
-                        max(np.linalg.eigvals(np.dot(A_ineq.T, A_ineq))))
+            rate = self._dual_rate(problem)
 
             def gradient_augmented_lagrangian(variables, dual_variables_eq,
                                               dual_variables_ineq):
-                gradient_x_ineq = np.dot(
-                    A_ineq.T, dual_variables_ineq) + penalty_ineq * np.dot(
-                        A_ineq.T, inequality_constraint(variables))
-                gradient_x_eq = np.dot(
-                    A_eq.T, dual_variables_eq) + penalty_eq * np.dot(
-                        A_eq.T, equality_constraint(variables))
-                gradient_x = problem['gradient'](
+                gradient_x_ineq = utils.rmatvec(
+                    A_ineq, dual_variables_ineq +
+                    penalty_ineq * inequality_constraint(variables))
+                gradient_x_eq = equality_gradient(variables[:n],
+                                                  dual_variables_eq)
+                gradient_x = gradient(
                     variables[:n]) + gradient_x_ineq + gradient_x_eq
                 gradient_s = -penalty_ineq * inequality_constraint(
                     variables) - dual_variables_ineq
@@ -317,13 +1273,16 @@ class HopfieldSolver():
                 dual_variables_ineq = next_dual_variables_ineq.copy()
                 prev_x = np.copy(x)
 
-                while np.linalg.norm(next_x - x) > precision:
+                while np.linalg.norm(next_x - x) > precision and \
+                        not out_of_budget():
                     x = next_x
                     next_x = utils.projection(
                         x - rate * gradient_augmented_lagrangian(
                             x, dual_variables_eq, dual_variables_ineq), n, lb,
                         ub)
                 next_x = x
+                if out_of_budget():
+                    break
 
                 alpha = 0.9
                 c_k = alpha**iterations * np.linalg.norm(
@@ -339,18 +1298,27 @@ class HopfieldSolver():
                 next_dual_variables_ineq = dual_variables_ineq + d_k * inequality_constraint(
                     x)
 
+                if self.penalty_adaptation is not None and \
+                        self._balance_penalties(x[:n], penalty_x, x[n:],
+                                                problem):
+                    penalty_eq = problem['penalty_eq']
+                    penalty_ineq = problem['penalty_ineq']
+                    equality_gradient = self._equality_dual_gradient(problem)
+                    rate = self._dual_rate(problem)
+                penalty_x = x[:n]
+
             return dual_variables_eq, dual_variables_ineq
 
         elif A_ineq is not None and b_ineq is not None \
-                and (A_eq or b_eq) is None:
+                and (A_eq is None or b_eq is None):
 
-            rate = 1 / (problem['smoothness_coef'] + penalty_ineq *
-                        max(np.linalg.eigvals(np.dot(A_ineq.T, A_ineq))))
+            rate = self._dual_rate(problem)
 
             def gradient_augmented_lagrangian(variables, dual_variables):
-                gradient_x = problem['gradient'](variables[:n]) + np.dot(
-                    A_ineq.T, dual_variables) + penalty_ineq * np.dot(
-                        A_ineq.T, inequality_constraint(variables))
+                gradient_x = gradient(
+                    variables[:n]) + utils.rmatvec(
+                        A_ineq, dual_variables +
+                        penalty_ineq * inequality_constraint(variables))
                 gradient_s = -penalty_eq * inequality_constraint(
                     variables) - dual_variables
                 return np.concatenate((gradient_x, gradient_s))
@@ -370,13 +1338,16 @@ class HopfieldSolver():
                 dual_variables = next_dual_variables.copy()
                 prev_x = np.copy(x)
 
-                while np.linalg.norm(next_x - x) > precision:
+                while np.linalg.norm(next_x - x) > precision and \
+                        not out_of_budget():
                     x = next_x
                     next_x = utils.projection(
                         x - rate *
                         gradient_augmented_lagrangian(x, dual_variables), n,
                         lb, ub)
                 next_x = x
+                if out_of_budget():
+                    break
 
                 beta = 0.9
                 d_k = beta**iterations * np.linalg.norm(
@@ -386,19 +1357,25 @@ class HopfieldSolver():
                     np.zeros(n_ineq),
                     dual_variables + d_k * inequality_constraint(next_x))
 
+                if self.penalty_adaptation is not None and \
+                        self._balance_penalties(x[:n], penalty_x, x[n:],
+                                                problem):
+                    penalty_eq = problem['penalty_eq']
+                    penalty_ineq = problem['penalty_ineq']
+                    rate = self._dual_rate(problem)
+                penalty_x = x[:n]
+
             return None, next_dual_variables
 
         elif A_eq is not None and b_eq is not None and (A_ineq is None
                                                         or b_ineq is None):
 
-            rate = 1 / (problem['smoothness_coef'] + penalty_eq *
-                        max(np.linalg.eigvals(np.dot(A_eq.T, A_eq))))
+            rate = self._dual_rate(problem)
 
             def gradient_augmented_lagrangian(variables, dual_variables):
-                gradient_x_eq = np.dot(
-                    A_eq.T, dual_variables) + penalty_eq * np.dot(
-                        A_eq.T, equality_constraint(variables))
-                gradient_x = problem['gradient'](variables[:n]) + gradient_x_eq
+                gradient_x_eq = equality_gradient(variables[:n],
+                                                  dual_variables)
+                gradient_x = gradient(variables[:n]) + gradient_x_eq
                 return gradient_x
 
             dual_variables = np.ones(n_eq)
@@ -414,12 +1391,15 @@ class HopfieldSolver():
                 dual_variables = next_dual_variables.copy()
                 prev_x = np.copy(x)
 
-                while np.linalg.norm(next_x - x) > precision:
+                while np.linalg.norm(next_x - x) > precision and \
+                        not out_of_budget():
                     x = next_x
                     next_x = utils.projection(
                         x - rate *
                         gradient_augmented_lagrangian(x, dual_variables), n,
                         lb, ub)
+                if out_of_budget():
+                    break
 
                 alpha = 0.9
                 c_k = alpha**iterations * np.linalg.norm(
@@ -429,31 +1409,214 @@ class HopfieldSolver():
                     np.zeros(n_eq),
                     dual_variables + c_k * equality_constraint(next_x))
 
+                if self.penalty_adaptation is not None and \
+                        self._balance_penalties(x, penalty_x, None, problem):
+                    equality_gradient = self._equality_dual_gradient(problem)
+                    rate = self._dual_rate(problem)
+                penalty_x = x
+
             return next_dual_variables, None
 
 
-    def _hopfield_update(self, x_h, alpha, direction, problem):
-        x_h = x_h + alpha * direction
+    def _dual_rate(self, problem):
+        """
+        Step size of the projected gradient of the augmented Lagrangian in
+        the computation of the dual variables
+        """
+        curvature = problem['smoothness_coef']
+        for key in ['eq', 'ineq']:
+            if problem['A_' + key] is not None and \
+                    problem['b_' + key] is not None:
+                curvature = curvature + problem['penalty_' + key] * \
+                    self._squared_norm(problem, key)
+        return 1 / curvature
+
+    def _balance_penalties(self, x, penalty_x, slack, problem):
+        """
+        Residual balancing of the penalties: the penalty of a constraint type
+        is multiplied by penalty_factor when its primal residual ||Ax - b||
+        is larger than penalty_balance times its dual residual
+        penalty * ||A^T A (x - penalty_x)||, and divided by penalty_factor in
+        the opposite case
+        :param x: (np.array) current point
+        :param penalty_x: (np.array) point of the last penalty update
+        :param slack: (np.array) slack variable of the inequality constraints,
+        if None the violation max(0, Ax - b) is used
+        :param problem: (dict) problem, its penalties are updated
+        :return: (bool) True if a penalty changed
+        """
+        changed = False
+        for key in ['eq', 'ineq']:
+            A, b = problem['A_' + key], problem['b_' + key]
+            if A is None or b is None:
+                continue
+            residual = utils.matvec(A, x) - b
+            if key == 'ineq':
+                residual = residual - slack if slack is not None \
+                    else np.maximum(0, residual)
+            penalty = problem['penalty_' + key]
+            dual_residual = penalty * np.linalg.norm(
+                utils.rmatvec(A, utils.matvec(A, x - penalty_x)))
+            next_penalty = self._balanced_penalty(
+                penalty, np.linalg.norm(residual), dual_residual)
+            if next_penalty != penalty:
+                problem['penalty_' + key] = next_penalty
+                self.instrumentation.count('penalty_updates')
+                changed = True
+        return changed
+
+    def _balanced_penalty(self, penalty, primal_residual, dual_residual):
+        """
+        The penalty stays in [1 / penalty_max, penalty_max], a zero penalty
+        is raised to 1
+        """
+        if primal_residual > self.penalty_balance * dual_residual:
+            if penalty == 0:
+                return 1
+            return min(penalty * self.penalty_factor,
+                       max(penalty, self.penalty_max))
+        if dual_residual > self.penalty_balance * primal_residual:
+            return max(penalty / self.penalty_factor,
+                       min(penalty, 1 / self.penalty_max))
+        return penalty
+
+    def _hopfield_update(self, x_h, alpha, direction, problem,
+                         momentum=None):
+        if momentum is None:
+            x_h = x_h + alpha * direction
+        else:
+            x_h = x_h + self._momentum_step(alpha, direction, momentum)
         x = self._activation(x_h, problem['lb'], problem['ub'])
         return x, x_h
 
+    def _momentum_step(self, alpha, direction, momentum):
+        """
+        Step of x_h with momentum: heavy ball adds mu * v to the step of
+        _alpha_hop, Nesterov (written at the current point) uses the updated
+        velocity mu * v + alpha * d instead
+        """
+        mu = momentum['coefficient']
+        if self.direction_type == 'nesterov':
+            return mu * (mu * momentum['velocity'] + alpha * direction) + \
+                alpha * direction
+        return alpha * direction + mu * momentum['velocity']
+
+    def _momentum_coefficient(self, k, momentum):
+        if self.momentum is not None:
+            return self.momentum
+        t = k - momentum['restart']
+        return t / (t + 3)
+
+    def _update_momentum(self, momentum, alpha, direction, next_x, f_val,
+                         previous_f_val, k, problem):
+        """
+        Update the velocity after an accepted step. The momentum is restarted
+        when the objective function goes up, and the velocity of the
+        variables saturated at a bound is dropped.
+        """
+        if f_val > previous_f_val:
+            momentum['velocity'] = np.zeros(len(direction))
+            momentum['restart'] = k
+            self.instrumentation.count('momentum_restarts')
+            return
+        if self.direction_type == 'nesterov':
+            velocity = momentum['coefficient'] * momentum['velocity'] + \
+                alpha * direction
+        else:
+            velocity = self._momentum_step(alpha, direction, momentum)
+        saturated = np.logical_or(next_x <= problem['lb'],
+                                  next_x >= problem['ub'])
+        momentum['velocity'] = np.where(saturated, 0, velocity)
+
 
     def _alpha_hop(self, x, grad_f, k, direction, problem):
         sigma = self._proxy_distance_vector(x, problem['ub'],
                                             problem['lb'])
-        denominator = problem['smoothness_coef'] * np.linalg.norm(
-            np.multiply(self.beta, direction))**2 + 12 * np.dot(
+        if self.direction_type == 'preconditioned':
+            # smoothness in the norm of the preconditioner
+            diagonal, smoothness_coef = self._preconditioner(problem)
+            curvature = smoothness_coef * np.dot(diagonal, np.power(
+                np.multiply(self.beta, direction), 2))
+        else:
+            curvature = problem['smoothness_coef'] * np.linalg.norm(
+                np.multiply(self.beta, direction))**2
+        denominator = curvature + 12 * np.dot(
                 np.power(np.multiply(self.beta, direction), 2),
                 np.absolute(grad_f))
         numerator = -np.dot(np.multiply(sigma, grad_f), direction)
+        # all the variables are saturated in the direction: no step
+        if denominator == 0:
+            return 0
         alpha = np.divide(numerator, denominator)
 
-        if self.direction_type == 'stochastic':
-            alpha = (1 - 1 / np.sqrt(k)) * alpha + 1 / (
-                problem['smoothness_coef'] * np.sqrt(k))
+        if self.direction_type == 'stochastic' or \
+                self.constraint_batch_size is not None:
+            # the first iteration takes the step 1 / L
+            t = max(k, 1)
+            alpha = (1 - 1 / np.sqrt(t)) * alpha + 1 / (
+                problem['smoothness_coef'] * np.sqrt(t))
+
+        return alpha
+
 
+    def _barzilai_borwein_step(self, x, x_h, grad_f, direction, spectral,
+                               problem):
+        """
+        Spectral step s.s / s.y from the differences s of x_h and y of the
+        gradient with respect to x_h between two iterations, at most the width
+        of the box. spectral keeps the previous ones and is updated
+        :return: (float) step along direction, None if there is no positive
+        curvature information
+        """
+        gradient_h = np.multiply(
+            self._proxy_distance_vector(x, problem['ub'], problem['lb']),
+            grad_f)
+        alpha = None
+        if spectral['x_h'] is not None:
+            s = x_h - spectral['x_h']
+            y = gradient_h - spectral['gradient']
+            curvature = np.dot(s, y)
+            slope = -np.dot(gradient_h, direction)
+            if curvature > 0 and slope > 0:
+                # a step longer than the box does not change the activation
+                alpha = min(np.dot(s, s) / curvature * slope,
+                            np.max(problem['ub'] - problem['lb']))
+        spectral['x_h'] = np.copy(x_h)
+        spectral['gradient'] = gradient_h
         return alpha
 
+    def _exact_step(self, x, x_h, grad_f, direction, problem):
+        """
+        Newton step on alpha -> L(activation(x_h + alpha * direction)) for a
+        quadratic objective, the curvature of the activation is taken into
+        account by a finite difference of its derivative
+        :return: (float) step along direction, None if the curvature along
+        direction is not positive
+        """
+        ub, lb = problem['ub'], problem['lb']
+        sigma = self._proxy_distance_vector(x, ub, lb)
+        velocity = np.multiply(sigma, direction)
+        epsilon = 10**-6
+        sigma_plus = self._proxy_distance_vector(
+            self._activation(x_h + epsilon * direction, lb, ub), ub, lb)
+        sigma_minus = self._proxy_distance_vector(
+            self._activation(x_h - epsilon * direction, lb, ub), ub, lb)
+        acceleration = np.multiply((sigma_plus - sigma_minus) / (2 * epsilon),
+                                   direction)
+
+        curvature = np.dot(velocity, utils.matvec(problem['hessian'],
+                                                  velocity))
+        for key in ['eq', 'ineq']:
+            if problem['A_' + key] is not None and \
+                    problem['b_' + key] is not None:
+                curvature += problem['penalty_' + key] * np.linalg.norm(
+                    utils.matvec(problem['A_' + key], velocity))**2
+        curvature += np.dot(grad_f, acceleration)
+        if curvature <= 0:
+            return None
+        # a step longer than the box does not change the activation
+        width = np.max(ub - lb)
+        return np.clip(-np.dot(grad_f, velocity) / curvature, -width, width)
 
     def _compute_x_0(self, problem):
         x_0 = np.copy(problem['x_0'])
@@ -465,9 +1628,10 @@ class HopfieldSolver():
         iterations = 0
         max_iterations = 10**3
         grad_f = problem['gradient'](x_0)
+        self.instrumentation.count('gradient_evaluations')
         if np.linalg.norm(grad_f) == 0:
             grad_f = (problem['smoothness_coef'] / 10) *\
-                (np.random.rand(n) - 0.5)
+                (self.random_state.rand(n) - 0.5)
 
         while iterations < max_iterations and utils.is_in_box(
             x_0, problem['ub'] - self.ascent_stop_criterion,
@@ -485,23 +1649,85 @@ class HopfieldSolver():
             problem['ub'] - self.ascent_stop_criterion)
 
 
-    def _stopping_criterion_met(self, x, grad_f, iterations, problem):
+    def _stopping_criterion_met(self, x, grad_f, iterations, problem,
+                                f_val_hist=None, stagnation=None):
+        """
+        :param f_val_hist: (np.array) (default=None) objective function of the
+        iterates, needed by the 'objective' criterion
+        :param stagnation: (dict) (default=None) state of the 'binary_pattern'
+        criterion, updated in place. The criteria met are stored in
+        stagnation['met']
+        :return: (boolean) True if max_iterations is reached or if the
+        stopping criteria are met (all of them if the combination is 'and',
+        one of them if it is 'or')
+        """
         if iterations >= self.max_iterations - 1:
             return True
-        else:
-            # TODO(Mathilde): here there is not other option for the stopping
-            # criterion!!
-            precision = np.linalg.norm(
-                np.multiply(
-                    grad_f,
-                    self._proxy_distance_vector(x, problem['ub'],
-                                                problem['lb'])))
-            if self.stopping_criterion_type == 'gradient' and \
-                    precision < self.precision_stopping_criterion:
-                return True
+        met = []
+        for criterion in self.stopping_criteria:
+            if criterion == 'gradient':
+                precision = np.linalg.norm(
+                    np.multiply(
+                        grad_f,
+                        self._proxy_distance_vector(x, problem['ub'],
+                                                    problem['lb'])))
+                criterion_met = precision < self.precision_stopping_criterion
+            elif criterion == 'objective':
+                criterion_met = self._objective_stagnates(f_val_hist,
+                                                          iterations)
+            elif criterion == 'binary_pattern':
+                criterion_met = self._binary_pattern_stagnates(x, problem,
+                                                               stagnation)
             else:
-                return False
+                criterion_met = self._binaries_absorbed(x, problem)
+            if criterion_met:
+                met.append(criterion)
+        if stagnation is not None:
+            stagnation['met'] = met
+        if self.stopping_criterion_combination == 'and':
+            return len(met) == len(self.stopping_criteria)
+        return len(met) > 0
+
+    def _objective_stagnates(self, f_val_hist, iterations, tolerance=None):
+        """
+        Relative improvement of the objective function over the last
+        stopping_window iterations smaller than tolerance (default
+        relative_improvement_tolerance)
+        """
+        if tolerance is None:
+            tolerance = self.relative_improvement_tolerance
+        if f_val_hist is None or iterations < self.stopping_window:
+            return False
+        f_previous = f_val_hist[iterations - self.stopping_window]
+        improvement = f_previous - f_val_hist[iterations]
+        return improvement <= tolerance * max(1, abs(f_previous))
+
+    def _binary_pattern_stagnates(self, x, problem, stagnation):
+        """
+        Rounded binary variables unchanged for stopping_window iterations
+        """
+        if stagnation is None:
+            return False
+        binary = problem['binary_indicator'] == 1
+        pattern = self._round_binaries(x, problem)[binary]
+        if stagnation['pattern'] is not None and \
+                np.array_equal(pattern, stagnation['pattern']):
+            stagnation['unchanged'] += 1
+        else:
+            stagnation['pattern'] = pattern
+            stagnation['unchanged'] = 0
+        return stagnation['unchanged'] >= self.stopping_window
 
+    def _binaries_absorbed(self, x, problem):
+        """
+        All binary variables closer than absorption_band to one of their
+        bounds
+        """
+        binary = problem['binary_indicator'] == 1
+        if not np.any(binary):
+            return False
+        distance = np.minimum(x - problem['lb'], problem['ub'] - x)
+        return bool(np.all(distance[binary] <= self.absorption_band))
 
     def _compute_binary_absorption_mask(self, x, problem):
         n = np.size(x)
@@ -520,17 +1746,21 @@ class HopfieldSolver():
                                                                       problem)
 
         # classic gradient
-        if (self.direction_type == 'classic') \
-                or (self.direction_type == 'stochastic'):
+        if self.direction_type in ['classic', 'stochastic', 'heavy_ball',
+                                   'nesterov', 'preconditioned']:
             if self.absorption_criterion is not None:
                 direction = - grad_f
             else:
                 direction = - np.multiply(binary_absorption_mask, grad_f)
 
+            if self.direction_type == 'preconditioned':
+                curvature, _ = self._preconditioner(problem)
+                direction = np.divide(direction, curvature)
+
             if self.direction_type == 'stochastic':
                 # TODO(Mathilde): make 0.3 as a parameter
                 direction = - np.multiply(direction,
-                                          (np.random.uniform(0, 1, n) - 0.3))
+                                          (self.random_state.uniform(0, 1, n) - 0.3))
 
         elif self.direction_type == 'binary' \
                 or self.direction_type == 'soft_binary':
@@ -599,137 +1829,404 @@ class HopfieldSolver():
         return self.proxy_distance_vector(z, self.beta)
 
 
+    def _main_value_and_grad(self, problem):
+        if problem.get('value_and_grad') is not None:
+            return problem['value_and_grad']
+
+        def value_and_grad(variable):
+            return problem['objective_function'](variable), \
+                problem['gradient'](variable)
+
+        return value_and_grad
+
     def _inequality_constraints_problem(self, problem, dual_variable_ineq):
         A_ineq = problem['A_ineq']
         b_ineq = problem['b_ineq']
+        main_value_and_grad = self._main_value_and_grad(problem)
+        product_ineq = utils.cached_product(A_ineq)
 
         def inequality_constraint(optimization_variable, slack_variable):
-            return np.dot(
-                A_ineq,
-                optimization_variable) - b_ineq - slack_variable
+            return product_ineq(optimization_variable) - b_ineq - slack_variable
+
+        def inequality_term(ineq_cst):
+            return np.dot(dual_variable_ineq.T, ineq_cst) + problem[
+                'penalty_ineq'] / 2 * np.linalg.norm(ineq_cst, 2)**2
+
+        def inequality_gradient(ineq_cst):
+            return utils.rmatvec(
+                A_ineq, dual_variable_ineq + problem['penalty_ineq'] * ineq_cst)
 
         def objective_function(variables):
             optimization_variable, slack_variable = variables
-            main_function = problem['objective_function'](
-                optimization_variable)
-            inequality_term = np.dot(dual_variable_ineq.T,
-                                     inequality_constraint(
-                                         optimization_variable,
-                                         slack_variable)) + problem[
-                'penalty_ineq'] / 2 * np.linalg.norm(
-                inequality_constraint(optimization_variable,
-                                      slack_variable), 2)
-            return main_function + inequality_term
+            return problem['objective_function'](
+                optimization_variable) + inequality_term(
+                    inequality_constraint(optimization_variable,
+                                          slack_variable))
 
         def gradient(variables):
             optimization_variable, slack_variable = variables
-            main_function = problem['gradient'](optimization_variable)
-            inequality_term = np.dot(A_ineq.T,
-                                     dual_variable_ineq) + problem[
-                'penalty_ineq'] * \
-                np.dot(A_ineq.T,
-                       inequality_constraint(
-                           optimization_variable, slack_variable))
-            return main_function + inequality_term
+            return problem['gradient'](
+                optimization_variable) + inequality_gradient(
+                    inequality_constraint(optimization_variable,
+                                          slack_variable))
+
+        def value_and_grad(variables):
+            optimization_variable, slack_variable = variables
+            main_value, main_gradient = main_value_and_grad(
+                optimization_variable)
+            ineq_cst = inequality_constraint(optimization_variable,
+                                             slack_variable)
+            return main_value + inequality_term(ineq_cst), \
+                main_gradient + inequality_gradient(ineq_cst)
 
         def gradient_wrt_slack_variable(variables):
             optimization_variable, slack_variable = variables
             ineq_cst = inequality_constraint(
                 optimization_variable, slack_variable)
-            return - problem['penalty_ineq'] * ineq_cst
-            - dual_variable_ineq
+            return - problem['penalty_ineq'] * ineq_cst - dual_variable_ineq
 
-        return objective_function, gradient, gradient_wrt_slack_variable
+        return objective_function, gradient, value_and_grad, \
+            gradient_wrt_slack_variable
 
     def _equality_constraints_problem(self, problem, dual_variable_eq):
+        main_value_and_grad = self._main_value_and_grad(problem)
+        equality_terms = self._equality_terms(problem, dual_variable_eq)
+
+        def objective_function(variable):
+            return problem['objective_function'](variable) + equality_terms(
+                variable)[0]
+
+        def gradient(variable):
+            return problem['gradient'](variable) + equality_terms(variable)[1]
+
+        def value_and_grad(variable):
+            main_value, main_gradient = main_value_and_grad(variable)
+            equality_value, equality_gradient = equality_terms(variable)
+            return main_value + equality_value, \
+                main_gradient + equality_gradient
+
+        return objective_function, gradient, value_and_grad
+
+    def _squared_norm(self, problem, constraint_type):
+        """
+        Largest eigenvalue of A^T A for the 'eq' or 'ineq' constraints,
+        computed once per problem
+        """
+        key = 'squared_norm_' + constraint_type
+        if problem.get(key) is None:
+            problem[key] = utils.squared_spectral_norm(
+                problem['A_' + constraint_type], self.random_state)
+        return problem[key]
+
+    def _preconditioner(self, problem):
+        """
+        Diagonal D of the hessian of the augmented Lagrangian (objective and
+        penalty terms) and largest eigenvalue of D^-1/2 hessian D^-1/2, the
+        smoothness coefficient of the 'preconditioned' direction. Computed
+        once per problem, without the hessian the products with the hessian
+        of the objective are gradient differences around the center of the
+        box.
+        :return: (np.array, float) diagonal and smoothness coefficient
+        """
+        if problem.get('diagonal_curvature') is None:
+            with self.instrumentation.phase('preconditioner'):
+                if problem.get('hessian') is not None:
+                    def hessian_product(v):
+                        return utils.matvec(problem['hessian'], v)
+                    curvature = utils.diagonal(problem['hessian'],
+                                               self.random_state)
+                else:
+                    gradient = self._count_calls(problem['gradient'],
+                                                 'gradient_evaluations')
+                    center = (problem['ub'] + problem['lb']) / 2
+                    h = 10**-3 * np.max(problem['ub'] - problem['lb'])
+                    grad_center = gradient(center)
+
+                    def hessian_product(v):
+                        return (gradient(center + h * v) - grad_center) / h
+                    curvature = utils.estimate_diagonal(
+                        hessian_product, problem['dim_problem'],
+                        self.random_state)
+                constraints = [key for key in ['eq', 'ineq']
+                               if problem['A_' + key] is not None and
+                               problem['b_' + key] is not None]
+                for key in constraints:
+                    curvature = curvature + problem['penalty_' + key] * \
+                        utils.squared_column_norms(problem['A_' + key],
+                                                   self.random_state)
+                # nonconvex or flat coordinates get a small positive curvature
+                curvature = np.absolute(curvature)
+                curvature = np.maximum(
+                    curvature, 10**-6 * max(np.max(curvature), 10**-12))
+
+                def preconditioned_product(v):
+                    v = np.divide(v, np.sqrt(curvature))
+                    product = hessian_product(v)
+                    for key in constraints:
+                        A = problem['A_' + key]
+                        product = product + problem['penalty_' + key] * \
+                            utils.rmatvec(A, utils.matvec(A, v))
+                    return np.divide(product, np.sqrt(curvature))
+
+                problem['preconditioned_smoothness'] = np.absolute(
+                    utils.power_iteration(preconditioned_product,
+                                          problem['dim_problem'],
+                                          random_state=self.random_state))
+                problem['diagonal_curvature'] = curvature
+        return problem['diagonal_curvature'], \
+            problem['preconditioned_smoothness']
+
+    def _equality_gram(self, problem):
+        """
+        Gram matrix A_eq^T A_eq and A_eq^T b_eq, computed once per problem if
+        it is cheaper than two products with A_eq (or if forced by
+        constraint_operator), None otherwise.
+        """
+        if not utils.use_gram_operator(problem['A_eq'],
+                                       self.constraint_operator):
+            return None
+        if problem.get('gram_eq') is None:
+            problem['gram_eq'] = utils.constraint_gram(problem['A_eq'],
+                                                       problem['b_eq'])
+        return problem['gram_eq']
+
+    def _equality_terms(self, problem, dual_variable_eq):
+        """
+        Build x -> (value, gradient) of the equality part of the augmented
+        Lagrangian, dual^T (A x - b) + penalty / 2 * ||A x - b||^2.
+        """
+        A_eq = problem['A_eq']
+        b_eq = problem['b_eq']
+        penalty_eq = problem['penalty_eq']
+        gram = self._equality_gram(problem)
+
+        if gram is not None:
+            gram_matrix, gram_b = gram
+            linear_term = utils.rmatvec(A_eq, dual_variable_eq) - \
+                penalty_eq * gram_b
+            constant_term = - np.dot(dual_variable_eq, b_eq) + \
+                penalty_eq / 2 * np.dot(b_eq, b_eq)
+
+            def equality_terms(optimization_variable):
+                gram_x = utils.matvec(gram_matrix, optimization_variable)
+                value = np.dot(linear_term, optimization_variable) + \
+                    penalty_eq / 2 * np.dot(optimization_variable, gram_x) + \
+                    constant_term
+                return value, penalty_eq * gram_x + linear_term
+
+        else:
+            product_eq = utils.cached_product(A_eq)
+
+            def equality_terms(optimization_variable):
+                equ_cst = product_eq(optimization_variable) - b_eq
+                value = np.dot(dual_variable_eq.T, equ_cst) + \
+                    penalty_eq / 2 * np.linalg.norm(equ_cst, 2)**2
+                return value, utils.rmatvec(
+                    A_eq, dual_variable_eq + penalty_eq * equ_cst)
+
+        return equality_terms
+
+    def _equality_dual_gradient(self, problem):
+        """
+        Build (x, dual) -> A_eq^T (dual + penalty * (A_eq x - b_eq)) for the
+        computation of the dual variables.
+        """
         A_eq = problem['A_eq']
         b_eq = problem['b_eq']
+        penalty_eq = problem['penalty_eq']
+        gram = self._equality_gram(problem)
 
-        def equality_constraint(optimization_variable):
-            return np.dot(A_eq, optimization_variable)
-            - b_eq
+        if gram is not None:
+            gram_matrix, gram_b = gram
+            # A^T dual only changes with the dual variable
+            product_dual = utils.cached_product(A_eq, transpose=True)
 
-        def objective_function(variable):
-            main_function = problem['objective_function'](variable)
-            equality_term = np.dot(dual_variable_eq.T,
-                                   equality_constraint(
-                                       variable)) + problem[
-                'penalty_eq'] / 2 * np.linalg.norm(
-                    equality_constraint(variable), 2)
-            return main_function + equality_term
+            def equality_gradient(optimization_variable, dual_variable):
+                return product_dual(dual_variable) + penalty_eq * (
+                    utils.matvec(gram_matrix, optimization_variable) - gram_b)
 
-        def gradient(variable):
-            main_function = problem['gradient'](variable)
-            equality_term = np.dot(A_eq.T, dual_variable_eq)
-            + problem['penalty_eq'] * np.dot(A_eq.T,
-                                             equality_constraint(variable))
-            return main_function + equality_term
+        else:
+            def equality_gradient(optimization_variable, dual_variable):
+                return utils.rmatvec(A_eq, dual_variable + penalty_eq * (
+                    utils.matvec(A_eq, optimization_variable) - b_eq))
 
-        return objective_function, gradient
+        return equality_gradient
 
 
     def _all_constraints_problem(self, problem, dual_variable_eq,
                                  dual_variable_ineq):
         A_ineq = problem['A_ineq']
         b_ineq = problem['b_ineq']
-        A_eq = problem['A_eq']
-        b_eq = problem['b_eq']
+        main_value_and_grad = self._main_value_and_grad(problem)
+        equality_terms = self._equality_terms(problem, dual_variable_eq)
+        product_ineq = utils.cached_product(A_ineq)
 
         def inequality_constraint(optimization_variable, slack_variable):
-            return np.dot(A_ineq,
-                          optimization_variable)
-            - b_ineq - slack_variable
-
-        def equality_constraint(optimization_variable):
-            return np.dot(A_eq,
-                          optimization_variable) - b_eq
+            return product_ineq(optimization_variable) - b_ineq - slack_variable
+
+        def constraint_terms(optimization_variable, slack_variable):
+            ineq_cst = inequality_constraint(optimization_variable,
+                                             slack_variable)
+            inequality_value = np.dot(
+                dual_variable_ineq.T, ineq_cst) + problem[
+                    'penalty_ineq'] / 2 * np.linalg.norm(ineq_cst, 2)**2
+            inequality_gradient = utils.rmatvec(
+                A_ineq, dual_variable_ineq + problem['penalty_ineq'] * ineq_cst)
+            equality_value, equality_gradient = equality_terms(
+                optimization_variable)
+            return inequality_value + equality_value, \
+                inequality_gradient + equality_gradient
 
         def objective_function(variables):
             optimization_variable, slack_variable = variables
-            main_function = problem['objective_function'](
-                optimization_variable)
-            ineq_cst = inequality_constraint(
-                optimization_variable,
-                slack_variable)
-            equ_cst = equality_constraint(
-                optimization_variable)
-            inequality_term = np.dot(
-                dual_variable_ineq.T, ineq_cst)
-            + problem['penalty_ineq'] / 2 * np.linalg.norm(
-                ineq_cst, 2)
-            equality_term = np.dot(
-                dual_variable_eq.T, equ_cst)
-            + problem['penalty_eq'] / 2 * np.linalg.norm(
-                equ_cst, 2)
-            return main_function + inequality_term + equality_term
+            return problem['objective_function'](
+                optimization_variable) + constraint_terms(
+                    optimization_variable, slack_variable)[0]
 
         def gradient(variables):
             optimization_variable, slack_variable = variables
-            main_function = problem['gradient'](optimization_variable)
-            equ_cst = equality_constraint(
+            return problem['gradient'](
+                optimization_variable) + constraint_terms(
+                    optimization_variable, slack_variable)[1]
+
+        def value_and_grad(variables):
+            optimization_variable, slack_variable = variables
+            main_value, main_gradient = main_value_and_grad(
                 optimization_variable)
-            ineq_cst = inequality_constraint(
-                optimization_variable,
-                slack_variable)
-            equality_term = np.dot(
-                A_eq.T,
-                dual_variable_eq) + problem['penalty_eq'] * np.dot(
-                    A_eq.T, equ_cst)
-            inequality_term = np.dot(
-                A_ineq.T,
-                dual_variable_ineq) + problem[
-                    'penalty_ineq'] * np.dot(
-                A_ineq.T, ineq_cst)
-            return main_function + equality_term + inequality_term
+            constraint_value, constraint_gradient = constraint_terms(
+                optimization_variable, slack_variable)
+            return main_value + constraint_value, \
+                main_gradient + constraint_gradient
 
         def gradient_wrt_slack_variable(variables):
             optimization_variable, slack_variable = variables
             return - problem['penalty_ineq'] * inequality_constraint(
                 optimization_variable, slack_variable) - dual_variable_ineq
 
-        return objective_function, gradient, gradient_wrt_slack_variable
+        return objective_function, gradient, value_and_grad, \
+            gradient_wrt_slack_variable
 
 
+    def _sampled_constraints_problem(self, problem, dual_variable_eq,
+                                     dual_variable_ineq):
+        """
+        Augmented Lagrangian whose constraint terms are estimated from
+        constraint_batch_size rows of each constraint type, sampled with
+        replacement, with SVRG
+        variance reduction: the terms and their gradient are computed on all
+        the rows at a snapshot x_s, taken every snapshot_interval
+        evaluations, and corrected by m / batch times the difference of the
+        sampled rows between x and x_s. The slack variable of the inequality
+        constraints is eliminated, each row i contributes
+        h(r) = dual * r + penalty / 2 * r^2 (equality) or
+        h(r) = (max(0, dual + penalty * r)^2 - dual^2) / (2 * penalty)
+        (inequality) with r = a_i x - b_i.
+        The snapshot is kept in problem['constraint_snapshot'], so that it is
+        checkpointed.
+        """
+        main_value_and_grad = self._main_value_and_grad(problem)
+        terms = []
+        for key, dual_variable in [('eq', dual_variable_eq),
+                                   ('ineq', dual_variable_ineq)]:
+            A, b = problem['A_' + key], problem['b_' + key]
+            if A is None or b is None:
+                continue
+            if utils.is_linear_operator(A):
+                raise Exception('Constraint sampling needs explicit '
+                                'constraint matrices')
+            if scipy.sparse.issparse(A):
+                A = A.tocsr()
+            penalty = problem['penalty_' + key]
+            if key == 'ineq' and penalty <= 0:
+                raise Exception('Constraint sampling needs a positive '
+                                'penalty for the inequality constraints')
+            terms.append((A, b, dual_variable, penalty, key == 'ineq'))
+        if problem.get('constraint_snapshot') is None:
+            problem['constraint_snapshot'] = dict({'x': None, 'calls': 0})
+        snapshot = problem['constraint_snapshot']
+        # terms of all the rows at snapshot['x']
+        full = dict({'x': None, 'residuals': None, 'value': None,
+                     'gradient': None})
+
+        def row_terms(residual, dual_variable, penalty, inequality):
+            if inequality:
+                multiplier = np.maximum(0, dual_variable + penalty * residual)
+                return (np.dot(multiplier, multiplier) -
+                        np.dot(dual_variable, dual_variable)) / \
+                    (2 * penalty), multiplier
+            multiplier = dual_variable + penalty * residual
+            return np.dot(dual_variable, residual) + penalty / 2 * \
+                np.dot(residual, residual), multiplier
+
+        def take_snapshot():
+            full['x'] = snapshot['x']
+            full['residuals'] = []
+            full['value'] = 0
+            full['gradient'] = np.zeros(problem['dim_problem'])
+            for A, b, dual_variable, penalty, inequality in terms:
+                residual = utils.matvec(A, snapshot['x']) - b
+                value, multiplier = row_terms(residual, dual_variable,
+                                              penalty, inequality)
+                full['residuals'].append(residual)
+                full['value'] = full['value'] + value
+                full['gradient'] = full['gradient'] + \
+                    utils.rmatvec(A, multiplier)
+            self.instrumentation.count('constraint_snapshots')
+
+        def value_and_grad(optimization_variable):
+            main_value, main_gradient = main_value_and_grad(
+                optimization_variable)
+            if snapshot['x'] is None or \
+                    snapshot['calls'] >= self.snapshot_interval:
+                snapshot['x'] = np.copy(optimization_variable)
+                snapshot['calls'] = 0
+            snapshot['calls'] += 1
+            if full['x'] is not snapshot['x']:
+                take_snapshot()
+            value, gradient = full['value'], full['gradient']
+            difference = optimization_variable - snapshot['x']
+            if not np.any(difference):
+                return main_value + value, main_gradient + gradient
+            for (A, b, dual_variable, penalty, inequality), residual in \
+                    zip(terms, full['residuals']):
+                m = len(b)
+                rows = self.random_state.randint(
+                    0, m, min(self.constraint_batch_size, m))
+                A_rows = A[rows]
+                residual_rows = residual[rows] + A_rows.dot(difference)
+                value_x, multiplier_x = row_terms(
+                    residual_rows, dual_variable[rows], penalty, inequality)
+                value_s, multiplier_s = row_terms(
+                    residual[rows], dual_variable[rows], penalty, inequality)
+                scale = m / len(rows)
+                value = value + scale * (value_x - value_s)
+                gradient = gradient + scale * A_rows.T.dot(
+                    multiplier_x - multiplier_s)
+            return main_value + value, main_gradient + gradient
+
+        def objective_function(variable):
+            return value_and_grad(variable)[0]
+
+        def gradient(variable):
+            return value_and_grad(variable)[1]
+
+        return objective_function, gradient, value_and_grad
+
+    def _eliminated_slack(self, x, dual_variable_ineq, problem):
+        """
+        Slack variable min(0, A x - b + dual / penalty) minimizing the
+        augmented Lagrangian, when it is not an iterate of the solver
+        (constraint sampling)
+        :return: (np.array) slack variable, None without inequality
+        constraints or without constraint sampling
+        """
+        if self.constraint_batch_size is None or \
+                problem['A_ineq'] is None or problem['b_ineq'] is None:
+            return None
+        return np.minimum(0, utils.matvec(problem['A_ineq'], x) -
+                          problem['b_ineq'] + dual_variable_ineq /
+                          problem['penalty_ineq'])
+
     def _no_constraints_problem(self, problem):
         def objective_function(variable):
             return problem['objective_function'](variable)
@@ -737,4 +2234,54 @@ class HopfieldSolver():
         def gradient(variable):
             return problem['gradient'](variable)
 
-        return objective_function, gradient
+        return objective_function, gradient, self._main_value_and_grad(problem)
+
+
+def _warm_start_value(warm_start, key, size):
+    """
+    :param warm_start: (SolveResult or dict) previous result
+    :param key: (str) name of the variable
+    :param size: (int) expected size, the variable is ignored if it does not
+    match (the constraints of the problem changed)
+    :return: (np.array) copy of the variable or None
+    """
+    if isinstance(warm_start, dict):
+        value = warm_start.get(key)
+    else:
+        value = getattr(warm_start, key, None)
+    if value is None:
+        return None
+    value = np.array(value, dtype=np.float64)
+    if len(value) != size:
+        logger.warning('The %s of the warm start has size %s instead of %s, '
+                       'it is ignored.', key, len(value), size)
+        return None
+    return value
+
+
+def _stopping_criteria(stopping_criterion_type):
+    """
+    :param stopping_criterion_type: (str or list of str) 'gradient',
+    'objective', 'binary_pattern' or 'absorption'
+    :return: (list of str)
+    """
+    if isinstance(stopping_criterion_type, str):
+        stopping_criterion_type = [stopping_criterion_type]
+    for criterion in stopping_criterion_type:
+        if criterion not in ['gradient', 'objective', 'binary_pattern',
+                             'absorption']:
+            raise Exception('Stopping criterion type does not exist!')
+    return list(stopping_criterion_type)
+
+
+def _verbosity_level(verbose):
+    """
+    :param verbose: (boolean or int) True lets every message through, False
+    silences the solver, an int is the minimum logging level
+    :return: (int) minimum logging level of the messages of the solver
+    """
+    if verbose is True:
+        return logging.NOTSET
+    elif verbose is False or verbose is None:
+        return logging.CRITICAL + 1
+    return verbose
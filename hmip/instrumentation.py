@@ -0,0 +1,141 @@
+import contextlib
+import time
+import tracemalloc
+
+
+class Instrumentation():
+    enabled = True
+
+    def __init__(self, callback=None, track_allocations=False):
+        """
+
+        Collect wall time per phase of the solver, counters (gradient and
+        objective evaluations, Armijo backtracks, ...) and per-iteration
+        series (absorbed variables).
+
+        :param callback: (function) (default=None) called with the report
+        dict at the end of each solve
+        :param track_allocations: (boolean) (default=False) if True the memory
+        allocated in each phase is measured with tracemalloc (slow), the
+        tracing started by a phase is stopped by flush
+
+        """
+        self.callback = callback
+        self.track_allocations = track_allocations
+        self.started_tracing = False
+        self.reset()
+
+    def reset(self):
+        self.timings = dict()
+        self.counters = dict()
+        self.series = dict()
+        self.allocations = dict()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        if self.track_allocations:
+            memory_start, _ = tracemalloc.get_traced_memory()
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0) + \
+                time.perf_counter() - t
+            if self.track_allocations and tracemalloc.is_tracing():
+                memory_end, memory_peak = tracemalloc.get_traced_memory()
+                allocations = self.allocations.setdefault(
+                    name, dict({'allocated_bytes': 0, 'peak_bytes': 0}))
+                allocations['allocated_bytes'] += memory_end - memory_start
+                allocations['peak_bytes'] = max(allocations['peak_bytes'],
+                                                memory_peak - memory_start)
+
+    def count(self, name, increment=1):
+        self.counters[name] = self.counters.get(name, 0) + increment
+
+    def record(self, name, value):
+        self.series.setdefault(name, []).append(value)
+
+    def report(self):
+        """
+        :return: (dict) timings (seconds per phase), counters, series and
+        allocations (bytes per phase, only if track_allocations)
+        """
+        return dict({
+            'timings': dict(self.timings),
+            'counters': dict(self.counters),
+            'series': dict({name: list(values)
+                            for name, values in self.series.items()}),
+            'allocations': dict(self.allocations),
+        })
+
+    def flush(self):
+        if self.callback is not None:
+            self.callback(self.report())
+        self.stop_tracing()
+
+    def stop_tracing(self):
+        """
+        Stop tracemalloc if it was started by a phase, the tracing started by
+        the user is left running
+        """
+        if self.started_tracing:
+            self.started_tracing = False
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+
+class NullInstrumentation():
+    """
+    Instrumentation used by default: every method does nothing.
+    """
+    enabled = False
+
+    def phase(self, name):
+        return _NULL_CONTEXT
+
+    def count(self, name, increment=1):
+        pass
+
+    def record(self, name, value):
+        pass
+
+    def report(self):
+        return dict()
+
+    def flush(self):
+        pass
+
+    def stop_tracing(self):
+        pass
+
+
+class _NullContext():
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+def get_instrumentation(instrumentation):
+    """
+    :param instrumentation: (None, boolean, function or Instrumentation) None
+    or False disables the instrumentation, True enables it, a function is used
+    as callback
+    :return: (Instrumentation or NullInstrumentation)
+    """
+    if instrumentation is None or instrumentation is False:
+        return NullInstrumentation()
+    elif instrumentation is True:
+        return Instrumentation()
+    elif isinstance(instrumentation, (Instrumentation, NullInstrumentation)):
+        return instrumentation
+    elif callable(instrumentation):
+        return Instrumentation(callback=instrumentation)
+    raise Exception('Instrumentation type does not exist!')
@@ -0,0 +1,229 @@
+import logging
+import time
+
+import numpy as np
+import scipy.sparse
+
+logger = logging.getLogger(__name__)
+
+
+class LazyConstraintSolver():
+    def __init__(self,
+                 solver,
+                 initial_rows=None,
+                 rows_per_scan=100,
+                 chunk_size=10**5,
+                 drop_after=3,
+                 tolerance=None,
+                 max_rounds=20):
+        """
+
+        Cutting plane driver for problems with many inequality constraints of
+        which few are active: the solver only sees a working set of rows of
+        A_ineq. After each solve, all the rows are scanned by chunks, the most
+        violated rows are added to the working set and the rows that stayed
+        inactive for drop_after scans are removed. The solves are warm
+        started from the previous one.
+
+        :param solver: (HopfieldSolver) solver used for every round
+        :param initial_rows: (np.array) (default=None) indices of the rows of
+        the first working set, empty if None
+        :param rows_per_scan: (int) (default=100) maximum number of violated
+        rows added after a scan
+        :param chunk_size: (int) (default=10**5) number of rows multiplied at
+        once during a scan
+        :param drop_after: (int) (default=3) number of consecutive scans a row
+        of the working set has to be inactive (Ax - b < -tolerance) to be
+        removed, it is never removed if None
+        :param tolerance: (float) (default=None) a row is violated if
+        Ax - b > tolerance, the feasibility tolerance of the solver if None
+        :param max_rounds: (int) (default=20) maximum number of solves
+
+        """
+        self.solver = solver
+        self.initial_rows = initial_rows
+        self.rows_per_scan = rows_per_scan
+        self.chunk_size = chunk_size
+        self.drop_after = drop_after
+        self.tolerance = tolerance if tolerance is not None \
+            else solver.feasibility_tolerance
+        self.max_rounds = max_rounds
+        self.working_set = None
+        self.rounds = []
+
+    def solve(self,
+              objective_function,
+              gradient,
+              lb,
+              ub,
+              binary_indicator,
+              A_ineq,
+              b_ineq,
+              **kwargs):
+        """
+
+        Solve the problem with the constraints A_ineq x <= b_ineq
+
+        :param objective_function: (function) objective function
+        :param gradient: (function) gradient of the objective function
+        :param lb: (np.array) lower bound
+        :param ub: (np.array) upper bound
+        :param binary_indicator: (np.array) 1 if variable is binary, 0 otw
+        :param A_ineq: (np.array, np.memmap or sparse matrix) matrix A in
+        inequality constraint Ax <= b, its rows are selected so it can not
+        be a LinearOperator
+        :param b_ineq: (np.array) matrix b in inequality constraint Ax <= b
+        :param kwargs: other arguments of
+        HopfieldSolver.setup_optimization_problem (A_eq, b_eq, penalties,
+        smoothness_coef, warm_start, ...), the slack and dual variables of a
+        warm start have one value per row of A_ineq
+        :return: (SolveResult) result of the last round, its slack and dual
+        variables have one value per row of A_ineq (the slack of the rows
+        outside the working set is min(0, Ax - b) at the last scan and their
+        dual variable is the last one they had, 0 if they never were in the
+        working set). The rows of the last working set are in
+        self.working_set
+
+        """
+        if not (isinstance(A_ineq, np.ndarray) or
+                scipy.sparse.issparse(A_ineq)):
+            raise Exception('Lazy constraints need explicit constraint '
+                            'matrices')
+        if scipy.sparse.issparse(A_ineq):
+            A_ineq = scipy.sparse.csr_matrix(A_ineq)
+        m = A_ineq.shape[0]
+        self.rounds = []
+        self.working_set = np.unique(np.asarray(
+            self.initial_rows if self.initial_rows is not None else [],
+            dtype=np.int64))
+        inactive = np.zeros(len(self.working_set), dtype=np.int64)
+
+        # slack and dual variables of all the rows, the ones of the working
+        # set are given to the solver
+        warm_start = kwargs.pop('warm_start', None)
+        slack_variable = np.zeros(m)
+        dual_variable_ineq = np.zeros(m)
+        warm_start_ineq = False
+        if warm_start is not None:
+            for key, values in [('slack_variable', slack_variable),
+                                ('dual_variable_ineq', dual_variable_ineq)]:
+                value = _get(warm_start, key)
+                if value is not None and len(value) == m:
+                    values[:] = value
+                    warm_start_ineq = True
+
+        result = None
+        for round_index in range(self.max_rounds):
+            start_time = time.perf_counter()
+            setup_kwargs = dict(kwargs)
+            if result is not None:
+                # the saturated variables are moved away from their bounds,
+                # where the activation is flat, as between dual iterations
+                setup_kwargs['warm_start'] = dict({
+                    'x_h': self.solver.unsaturate(result.x_h, problem)[1],
+                    'dual_variable_eq': result.dual_variable_eq,
+                })
+            elif warm_start is not None:
+                setup_kwargs['warm_start'] = dict({
+                    'x_h': _get(warm_start, 'x_h'),
+                    'dual_variable_eq': _get(warm_start, 'dual_variable_eq'),
+                })
+            if result is not None or warm_start_ineq:
+                setup_kwargs['warm_start'].update({
+                    'slack_variable': slack_variable[self.working_set],
+                    'dual_variable_ineq': dual_variable_ineq[self.working_set],
+                })
+            if len(self.working_set) > 0:
+                setup_kwargs['A_ineq'] = A_ineq[self.working_set]
+                setup_kwargs['b_ineq'] = b_ineq[self.working_set]
+            problem = self.solver.setup_optimization_problem(
+                objective_function, gradient, lb, ub, binary_indicator,
+                **setup_kwargs)
+            # the objective function does not change between the rounds
+            kwargs['smoothness_coef'] = problem['smoothness_coef']
+            result = self.solver.solve(problem)
+            if len(self.working_set) > 0:
+                slack_variable[self.working_set] = result.slack_variable
+                dual_variable_ineq[self.working_set] = \
+                    result.dual_variable_ineq
+
+            residual = constraint_residual(A_ineq, b_ineq, result.x,
+                                           self.chunk_size)
+            outside = np.ones(m, dtype=bool)
+            outside[self.working_set] = False
+            violated = np.nonzero(outside & (residual > self.tolerance))[0]
+            if len(violated) > self.rows_per_scan:
+                most_violated = np.argpartition(
+                    -residual[violated], self.rows_per_scan)
+                violated = violated[most_violated[:self.rows_per_scan]]
+
+            inactive = np.where(residual[self.working_set] < -self.tolerance,
+                                inactive + 1, 0)
+            keep = np.ones(len(self.working_set), dtype=bool)
+            if self.drop_after is not None:
+                keep = inactive < self.drop_after
+            dropped = len(self.working_set) - int(np.sum(keep))
+
+            self.rounds.append(dict({
+                'round': round_index,
+                'working_set': len(self.working_set),
+                'added': len(violated),
+                'dropped': dropped,
+                'violation': float(max(0, np.max(residual)))
+                if m > 0 else 0.,
+                'iterations': result.iterations,
+                'status': result.status,
+                'time': time.perf_counter() - start_time,
+            }))
+            logger.info('Round %s: %s rows in the working set, %s violated '
+                        'rows added, %s inactive rows dropped, largest '
+                        'violation %.3g.', round_index,
+                        len(self.working_set), len(violated), dropped,
+                        self.rounds[-1]['violation'])
+            if len(violated) == 0:
+                break
+            if round_index == self.max_rounds - 1:
+                logger.warning('Lazy constraints: %s rows still violated '
+                               'after %s rounds.', int(np.sum(
+                                   residual > self.tolerance)),
+                               self.max_rounds)
+                break
+            order = np.argsort(np.concatenate((self.working_set[keep],
+                                               violated)))
+            self.working_set = np.concatenate(
+                (self.working_set[keep], violated))[order]
+            inactive = np.concatenate(
+                (inactive[keep], np.zeros(len(violated), dtype=np.int64)))[
+                    order]
+
+        # the working set is the one of the last solve
+        outside = np.ones(m, dtype=bool)
+        outside[self.working_set] = False
+        slack_variable[outside] = np.minimum(0, residual[outside])
+        result.slack_variable = slack_variable
+        result.dual_variable_ineq = dual_variable_ineq
+        return result
+
+
+def constraint_residual(A, b, x, chunk_size=10**5):
+    """
+    Ax - b computed by chunks of rows, so that the temporary arrays (and the
+    rows read from a memory-mapped matrix) stay small
+    :param A: (np.array, np.memmap or sparse matrix) matrix of size (m, n)
+    :param b: (np.array) size m
+    :param x: (np.array) size n
+    :param chunk_size: (int) (default=10**5) number of rows multiplied at once
+    :return: (np.array) Ax - b
+    """
+    m = A.shape[0]
+    residual = np.empty(m)
+    for start in range(0, m, chunk_size):
+        stop = min(m, start + chunk_size)
+        residual[start:stop] = A[start:stop].dot(x) - b[start:stop]
+    return residual
+
+
+def _get(warm_start, key):
+    if isinstance(warm_start, dict):
+        return warm_start.get(key)
+    return getattr(warm_start, key, None)
@@ -1,6 +1,9 @@
 import cvxpy as cvx
+import logging
 import time
 
+logger = logging.getLogger(__name__)
+
 
 def cvxpy_solver(H,
                  q,
@@ -47,7 +50,10 @@ def cvxpy_solver(H,
         sol = problem.solve(verbose=verbose, solver=solver)
     t_total = time.perf_counter() - t
 
-    print('PROBLEM STATUS: %s' % problem.status)
+    if verbose:
+        logger.info('PROBLEM STATUS: %s', problem.status)
+    else:
+        logger.debug('PROBLEM STATUS: %s', problem.status)
 
     if dual:
         return x.value, objective.value, constraints[2].dual_value, constraints[3].dual_value, t_total
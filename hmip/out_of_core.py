@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class MemmapMatrix():
+    def __init__(self, matrix, shape=None, dtype=np.float64, block_size=1024,
+                 buffer_blocks=2, prefetch=True):
+        """
+
+        Dense matrix stored on disk and multiplied by row blocks, so that a
+        quadratic term H larger than the memory can be used in the solver.
+        It behaves as a LinearOperator (shape, matvec, rmatvec) and can be
+        given to utils.quadratic_objective, utils.quadratic_value_and_grad
+        (which reads H once per evaluation) or utils.smoothness_coefficient.
+
+        :param matrix: (np.memmap or str) memory-mapped matrix, or the path to
+        a .npy file or a raw binary file (then shape is required)
+        :param shape: (tuple) (default=None) shape of a raw binary file
+        :param dtype: (np.dtype) (default=np.float64) dtype of a raw binary file
+        :param block_size: (int) (default=1024) number of rows read at once
+        :param buffer_blocks: (int) (default=2) number of blocks kept in memory
+        by the reading thread
+        :param prefetch: (boolean) (default=True) if True blocks are read on a
+        background thread while the previous block is multiplied
+
+        """
+        if isinstance(matrix, str):
+            if matrix.endswith('.npy'):
+                matrix = np.load(matrix, mmap_mode='r')
+            else:
+                matrix = np.memmap(matrix, dtype=dtype, mode='r', shape=shape)
+        if len(matrix.shape) != 2:
+            raise Exception('MemmapMatrix needs a 2d matrix')
+
+        self.matrix = matrix
+        self.shape = matrix.shape
+        self.dtype = matrix.dtype
+        self.block_size = block_size
+        self.buffer_blocks = buffer_blocks
+        self.prefetch = prefetch
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        self.bytes_read = 0
+        self.read_time = 0
+        self.wall_time = 0
+        self.number_products = 0
+
+    def statistics(self):
+        """
+        :return: (dict) bytes read from the file system, time spent reading and
+        effective bandwidth (bytes per second of matrix product)
+        """
+        return dict({
+            'bytes_read': self.bytes_read,
+            'read_time': self.read_time,
+            'wall_time': self.wall_time,
+            'number_products': self.number_products,
+            'effective_bandwidth': self.effective_bandwidth(),
+        })
+
+    def effective_bandwidth(self):
+        if self.wall_time == 0:
+            return 0
+        return self.bytes_read / self.wall_time
+
+    def matvec(self, x):
+        t = time.perf_counter()
+        result = np.empty(self.shape[0], dtype=np.result_type(self.dtype, x))
+        for start, block in self._blocks():
+            result[start:start + block.shape[0]] = np.dot(block, x)
+        self._end_product(t)
+        return result
+
+    def rmatvec(self, y):
+        t = time.perf_counter()
+        result = np.zeros(self.shape[1], dtype=np.result_type(self.dtype, y))
+        for start, block in self._blocks():
+            result += np.dot(block.T, y[start:start + block.shape[0]])
+        self._end_product(t)
+        return result
+
+    def dot(self, x):
+        return self.matvec(x)
+
+    def __matmul__(self, x):
+        return self.matvec(x)
+
+    def _end_product(self, t):
+        self.wall_time += time.perf_counter() - t
+        self.number_products += 1
+
+    def _read_block(self, start):
+        t = time.perf_counter()
+        block = np.array(self.matrix[start:start + self.block_size])
+        self.read_time += time.perf_counter() - t
+        self.bytes_read += block.nbytes
+        return start, block
+
+    def _blocks(self):
+        starts = range(0, self.shape[0], self.block_size)
+        if not self.prefetch:
+            for start in starts:
+                yield self._read_block(start)
+            return
+
+        # the buffer is bounded: the reader waits when buffer_blocks blocks
+        # are in memory and not multiplied yet
+        buffer = queue.Queue(maxsize=self.buffer_blocks)
+        stop = threading.Event()
+
+        def reader():
+            try:
+                for start in starts:
+                    item = self._read_block(start)
+                    while not stop.is_set():
+                        try:
+                            buffer.put(item, timeout=0.1)
+                            break
+                        except queue.Full:
+                            pass
+                    if stop.is_set():
+                        return
+                buffer.put(None)
+            except Exception as error:
+                buffer.put(error)
+
+        thread = threading.Thread(target=reader, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = buffer.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            while thread.is_alive():
+                try:
+                    buffer.get_nowait()
+                except queue.Empty:
+                    thread.join(0.01)
@@ -0,0 +1,405 @@
+import logging
+
+import hmip.utils as utils
+from hmip.result import SolveResult
+import numpy as np
+import scipy.sparse
+
+logger = logging.getLogger(__name__)
+
+
+def presolve(objective_function,
+             gradient,
+             lb,
+             ub,
+             binary_indicator,
+             A_eq=None,
+             b_eq=None,
+             A_ineq=None,
+             b_ineq=None,
+             value_and_grad=None,
+             max_passes=10,
+             tolerance=10**-9):
+    """
+
+    Reduce the problem before setup_optimization_problem: fixed variables are
+    removed, singleton rows become bounds, empty, duplicate and redundant
+    rows are dropped and the bounds are tightened with the row activities.
+    The passes are repeated until nothing changes.
+
+    :param objective_function: (function) objective function
+    :param gradient: (function) gradient of the objective function
+    :param lb: (np.array) lower bound
+    :param ub: (np.array) upper bound
+    :param binary_indicator: (np.array) 1 if variable is binary, 0 otw
+    :param A_eq: (np.array or sparse matrix) (default=None) matrix A in equality constraint Ax = b
+    :param b_eq: (np.array) (default=None) matrix b in equality constraint Ax = b
+    :param A_ineq: (np.array or sparse matrix) (default=None) matrix A in inequality constraint Ax <= b
+    :param b_ineq: (np.array) (default=None) matrix b in inequality constraint Ax <= b
+    :param value_and_grad: (function) (default=None) objective function and
+    gradient at the same point
+    :param max_passes: (int) (default=10) maximum number of passes
+    :param tolerance: (float) (default=10**-9) tolerance on the bounds and
+    the right hand sides
+    :return: (dict, Postsolve) arguments of setup_optimization_problem for the
+    reduced problem and the map back to the original problem
+
+    """
+    for A in [A_eq, A_ineq]:
+        if utils.is_linear_operator(A):
+            raise Exception('Presolve needs explicit constraint matrices')
+    dense = isinstance(A_eq, np.ndarray) or isinstance(A_ineq, np.ndarray)
+    n = len(lb)
+    state = dict({
+        'lb': np.array(lb, dtype=np.float64),
+        'ub': np.array(ub, dtype=np.float64),
+        'binary_indicator': np.asarray(binary_indicator),
+        'columns': np.arange(n),
+        'tightened_bounds': 0,
+    })
+    constraints = dict()
+    for constraint_type, A, b in [('eq', A_eq, b_eq), ('ineq', A_ineq, b_ineq)]:
+        if A is not None and b is not None:
+            A = scipy.sparse.csr_matrix(A, dtype=np.float64)
+            constraints[constraint_type] = dict({
+                'A': A,
+                'b': np.array(b, dtype=np.float64),
+                'rows': np.arange(A.shape[0]),
+            })
+    x_fixed = np.zeros(n)
+
+    for _ in range(max_passes):
+        size = (len(state['columns']),
+                tuple(len(c['rows']) for c in constraints.values()),
+                state['tightened_bounds'])
+        for constraint_type, constraint in constraints.items():
+            _singleton_rows(constraint, constraint_type, state, tolerance)
+            _activity_bounds(constraint, constraint_type, state, tolerance)
+        _remove_fixed_columns(constraints, state, x_fixed, tolerance)
+        for constraint_type, constraint in constraints.items():
+            _remove_empty_rows(constraint, constraint_type, tolerance)
+            _remove_duplicate_rows(constraint, constraint_type, tolerance)
+            if constraint_type == 'ineq':
+                _remove_redundant_rows(constraint, state, tolerance)
+        if size == (len(state['columns']),
+                    tuple(len(c['rows']) for c in constraints.values()),
+                    state['tightened_bounds']):
+            break
+
+    postsolve = Postsolve(
+        n, state['columns'], x_fixed,
+        constraints['eq']['rows'] if 'eq' in constraints else None,
+        len(b_eq) if 'eq' in constraints else 0,
+        constraints['ineq']['rows'] if 'ineq' in constraints else None,
+        len(b_ineq) if 'ineq' in constraints else 0,
+        state['tightened_bounds'])
+    logger.info('Presolve removed %s of %s variables, %s equality and %s '
+                'inequality constraints.',
+                postsolve.statistics['removed_variables'], n,
+                postsolve.statistics['removed_rows_eq'],
+                postsolve.statistics['removed_rows_ineq'])
+
+    reduced = dict({
+        'objective_function': postsolve.reduce_function(objective_function),
+        'gradient': postsolve.reduce_gradient(gradient),
+        'lb': state['lb'],
+        'ub': state['ub'],
+        'binary_indicator': state['binary_indicator'],
+    })
+    if value_and_grad is not None:
+        reduced['value_and_grad'] = postsolve.reduce_value_and_grad(
+            value_and_grad)
+    for constraint_type, constraint in constraints.items():
+        A = constraint['A']
+        if len(constraint['rows']) == 0:
+            A, b = None, None
+        else:
+            A, b = (A.toarray() if dense else A), constraint['b']
+        reduced['A_' + constraint_type] = A
+        reduced['b_' + constraint_type] = b
+    return reduced, postsolve
+
+
+class Postsolve():
+    def __init__(self, n, columns, x_fixed, rows_eq, num_rows_eq, rows_ineq,
+                 num_rows_ineq, tightened_bounds):
+        """
+        Map from the reduced problem back to the original one
+        :param n: (int) number of variables of the original problem
+        :param columns: (np.array) original index of the reduced variables
+        :param x_fixed: (np.array) size n, value of the removed variables
+        :param rows_eq: (np.array) original index of the kept equality rows
+        :param num_rows_eq: (int) number of original equality rows
+        :param rows_ineq: (np.array) original index of the kept inequality rows
+        :param num_rows_ineq: (int) number of original inequality rows
+        :param tightened_bounds: (int) number of bounds tightened
+        """
+        self.n = n
+        self.columns = columns
+        self.x_fixed = x_fixed
+        self.rows_eq = rows_eq
+        self.num_rows_eq = num_rows_eq
+        self.rows_ineq = rows_ineq
+        self.num_rows_ineq = num_rows_ineq
+        self.statistics = dict({
+            'removed_variables': n - len(columns),
+            'removed_rows_eq': num_rows_eq - (len(rows_eq) if rows_eq is not
+                                              None else 0),
+            'removed_rows_ineq': num_rows_ineq - (len(rows_ineq) if rows_ineq
+                                                  is not None else 0),
+            'tightened_bounds': tightened_bounds,
+        })
+
+    def expand(self, y):
+        """
+        :param y: (np.array) point of the reduced problem
+        :return: (np.array) point of the original problem
+        """
+        x = np.copy(self.x_fixed)
+        x[self.columns] = y
+        return x
+
+    def reduce_function(self, function):
+        return lambda y: function(self.expand(y))
+
+    def reduce_gradient(self, gradient):
+        return lambda y: gradient(self.expand(y))[self.columns]
+
+    def reduce_value_and_grad(self, value_and_grad):
+        def reduced_value_and_grad(y):
+            value, grad = value_and_grad(self.expand(y))
+            return value, grad[self.columns]
+        return reduced_value_and_grad
+
+    def result(self, result):
+        """
+        :param result: (SolveResult) result of the reduced problem
+        :return: (SolveResult) result of the original problem, the slack and
+        dual variables of the removed rows are 0
+        """
+        return SolveResult(
+            self.expand(result.x),
+            self.expand(result.x_h),
+            result.objective,
+            result.iterations,
+            slack_variable=_expand_rows(result.slack_variable,
+                                        self.rows_ineq, self.num_rows_ineq),
+            dual_variable_eq=_expand_rows(result.dual_variable_eq,
+                                          self.rows_eq, self.num_rows_eq),
+            dual_variable_ineq=_expand_rows(result.dual_variable_ineq,
+                                            self.rows_ineq,
+                                            self.num_rows_ineq),
+            solve_time=result.solve_time,
+            status=result.status,
+            incumbent=self.expand(result.incumbent)
+            if result.incumbent is not None else None,
+            incumbent_objective=result.incumbent_objective)
+
+
+def _expand_rows(values, rows, num_rows):
+    if rows is None:
+        return None
+    expanded = np.zeros(num_rows)
+    if values is not None:
+        expanded[rows] = values
+    return expanded
+
+
+def _round_binary_bounds(state, j, tolerance):
+    if state['binary_indicator'][j]:
+        state['lb'][j] = np.ceil(state['lb'][j] - tolerance)
+        state['ub'][j] = np.floor(state['ub'][j] + tolerance)
+
+
+def _tighten(state, j, lb=None, ub=None, tolerance=10**-9,
+             minimum_improvement=0):
+    """
+    Tighten the bounds of the reduced variable j, raise an exception if the
+    bounds cross
+    :param minimum_improvement: (float) (default=0) fraction of the range of
+    a continuous variable under which the bound is not changed
+    """
+    threshold = tolerance
+    if not state['binary_indicator'][j]:
+        threshold = max(tolerance, minimum_improvement *
+                        (state['ub'][j] - state['lb'][j]))
+    tightened = False
+    if lb is not None and lb > state['lb'][j] + threshold:
+        state['lb'][j] = lb
+        tightened = True
+    if ub is not None and ub < state['ub'][j] - threshold:
+        state['ub'][j] = ub
+        tightened = True
+    if tightened:
+        _round_binary_bounds(state, j, tolerance)
+        state['tightened_bounds'] += 1
+    if state['lb'][j] > state['ub'][j] + tolerance:
+        raise Exception('Presolve: the problem is infeasible (bounds of '
+                        'variable %s cross)' % state['columns'][j])
+    if state['lb'][j] > state['ub'][j]:
+        state['ub'][j] = state['lb'][j]
+
+
+def _keep_rows(constraint, keep):
+    constraint['A'] = constraint['A'][keep]
+    constraint['b'] = constraint['b'][keep]
+    constraint['rows'] = constraint['rows'][keep]
+
+
+def _singleton_rows(constraint, constraint_type, state, tolerance):
+    A = constraint['A']
+    row_nnz = np.diff(A.indptr)
+    singleton = np.flatnonzero(row_nnz == 1)
+    for row in singleton:
+        j = A.indices[A.indptr[row]]
+        a = A.data[A.indptr[row]]
+        value = constraint['b'][row] / a
+        if constraint_type == 'eq':
+            _tighten(state, j, lb=value, ub=value, tolerance=tolerance)
+        elif a > 0:
+            _tighten(state, j, ub=value, tolerance=tolerance)
+        else:
+            _tighten(state, j, lb=value, tolerance=tolerance)
+    if len(singleton) > 0:
+        _keep_rows(constraint, row_nnz != 1)
+
+
+def _activity_bounds(constraint, constraint_type, state, tolerance):
+    """
+    Tighten the bounds with the minimal activity of the rows a x <= b (and
+    -a x <= -b for the equality rows). The bounds implied by all the rows are
+    computed from the current bounds, then the tightest one of each variable
+    is applied
+    """
+    A = constraint['A']
+    if A.nnz == 0:
+        return
+    row_nnz = np.diff(A.indptr)
+    nonempty = row_nnz > 0
+    row = np.repeat(np.arange(A.shape[0]), row_nnz)
+    columns = A.indices
+    n = len(state['lb'])
+    lb_implied = np.full(n, -np.inf)
+    ub_implied = np.full(n, np.inf)
+    signs = [1, -1] if constraint_type == 'eq' else [1]
+    for sign in signs:
+        a = sign * A.data
+        minimum = np.minimum(a * state['lb'][columns],
+                             a * state['ub'][columns])
+        row_minimum = np.zeros(A.shape[0])
+        row_minimum[nonempty] = np.add.reduceat(minimum,
+                                                A.indptr[:-1][nonempty])
+        slack = sign * constraint['b'][row] - (row_minimum[row] - minimum)
+        positive, negative = a > 0, a < 0
+        np.minimum.at(ub_implied, columns[positive],
+                      slack[positive] / a[positive])
+        np.maximum.at(lb_implied, columns[negative],
+                      slack[negative] / a[negative])
+
+    # small improvements of continuous bounds are ignored, they would make
+    # the passes converge slowly
+    threshold = np.where(state['binary_indicator'] == 1, tolerance,
+                         np.maximum(tolerance, 10**-3 *
+                                    (state['ub'] - state['lb'])))
+    improved = np.flatnonzero(
+        (lb_implied > state['lb'] + threshold) |
+        (ub_implied < state['ub'] - threshold))
+    for j in improved:
+        _tighten(state, j, lb=lb_implied[j], ub=ub_implied[j],
+                 tolerance=tolerance, minimum_improvement=10**-3)
+
+
+def _remove_fixed_columns(constraints, state, x_fixed, tolerance):
+    fixed = state['ub'] - state['lb'] <= tolerance
+    if not np.any(fixed):
+        return
+    values = state['lb'][fixed]
+    x_fixed[state['columns'][fixed]] = values
+    for constraint in constraints.values():
+        A = constraint['A']
+        constraint['b'] = constraint['b'] - A[:, fixed].dot(values)
+        constraint['A'] = A[:, ~fixed].tocsr()
+    for key in ['lb', 'ub', 'binary_indicator', 'columns']:
+        state[key] = state[key][~fixed]
+
+
+def _remove_empty_rows(constraint, constraint_type, tolerance):
+    A = constraint['A']
+    A.eliminate_zeros()
+    empty = np.diff(A.indptr) == 0
+    if not np.any(empty):
+        return
+    b = constraint['b'][empty]
+    if (constraint_type == 'eq' and np.any(np.abs(b) > tolerance)) or \
+            (constraint_type == 'ineq' and np.any(b < -tolerance)):
+        raise Exception('Presolve: the problem is infeasible (empty %s row '
+                        'with a non zero right hand side)' % constraint_type)
+    _keep_rows(constraint, ~empty)
+
+
+def _remove_duplicate_rows(constraint, constraint_type, tolerance):
+    """
+    Rows equal up to a (positive for the inequalities) scaling: the equality
+    rows must have the same right hand side, the tightest inequality is kept.
+    The rows are normalized, then grouped by number of nonzeros and hashed
+    with np.unique
+    """
+    A = constraint['A']
+    A.sort_indices()
+    m = A.shape[0]
+    row_nnz = np.diff(A.indptr)
+    # the empty rows are removed before
+    if m < 2 or np.any(row_nnz == 0):
+        return
+    row = np.repeat(np.arange(m), row_nnz)
+    scale = np.maximum.reduceat(np.abs(A.data), A.indptr[:-1])
+    if constraint_type == 'eq':
+        # the first nonzero of an equality row is positive
+        scale = np.where(A.data[A.indptr[:-1]] < 0, -scale, scale)
+    data = np.round(A.data / scale[row], 12)
+    b = constraint['b'] / scale
+
+    # rows with the same key get the same group
+    group = np.empty(m, dtype=np.int64)
+    num_groups = 0
+    for nnz in np.unique(row_nnz):
+        rows = np.flatnonzero(row_nnz == nnz)
+        nonzeros = (A.indptr[rows][:, None] + np.arange(nnz)).ravel()
+        keys = np.hstack((A.indices[nonzeros].reshape(-1, nnz),
+                          data[nonzeros].reshape(-1, nnz)))
+        _, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        group[rows] = num_groups + inverse
+        num_groups += np.max(inverse) + 1
+    if num_groups == m:
+        return
+
+    if constraint_type == 'eq':
+        # the first row of each group is kept
+        _, first = np.unique(group, return_index=True)
+        if np.any(np.abs(b - b[first][group]) > tolerance):
+            raise Exception('Presolve: the problem is infeasible (duplicate '
+                            'equality rows with different right hand sides)')
+        kept = first
+    else:
+        # the tightest row of each group is kept, the first one if several
+        order = np.lexsort((np.arange(m), b, group))
+        is_first = np.ones(m, dtype=bool)
+        is_first[1:] = group[order][1:] != group[order][:-1]
+        kept = order[is_first]
+    keep = np.zeros(m, dtype=bool)
+    keep[kept] = True
+    _keep_rows(constraint, keep)
+
+
+def _remove_redundant_rows(constraint, state, tolerance):
+    """
+    Drop the inequality rows satisfied for all x in the bounds
+    """
+    A = constraint['A']
+    positive = A.maximum(0)
+    negative = A.minimum(0)
+    maximum = positive.dot(state['ub']) + negative.dot(state['lb'])
+    redundant = maximum <= constraint['b'] + tolerance
+    if np.any(redundant):
+        _keep_rows(constraint, ~redundant)
@@ -0,0 +1,210 @@
+import json
+
+import numpy as np
+
+
+class SolveResult():
+    def __init__(self,
+                 x,
+                 x_h,
+                 objective,
+                 iterations,
+                 slack_variable=None,
+                 dual_variable_eq=None,
+                 dual_variable_ineq=None,
+                 solve_time=None,
+                 history=None,
+                 status=None,
+                 incumbent=None,
+                 incumbent_objective=None,
+                 constraint_residuals=None,
+                 penalty_eq=None,
+                 penalty_ineq=None):
+        """
+
+        Result of HopfieldSolver.solve
+
+        :param x: (np.array) final iterate
+        :param x_h: (np.array) final internal iterate (before activation)
+        :param objective: (float) objective function at the final iterate
+        :param iterations: (int) number of iterations
+        :param slack_variable: (np.array) (default=None) final slack variable
+        :param dual_variable_eq: (np.array) (default=None) dual variable for the equality constraint
+        :param dual_variable_ineq: (np.array) (default=None) dual variable for the inequality constraint
+        :param solve_time: (float) (default=None) time spent in solve in seconds
+        :param history: (dict) (default=None) arrays 'x', 'x_h', 'f_val',
+        'step_size' and 'slack_variable' of width max_iterations filled up to
+        the column iterations, only 'f_val' and 'step_size' if the solver does
+        not store the history of the iterates
+        :param status: (str) (default=None) reason of the termination:
+        'converged', 'max_iterations', 'time_limit' or
+        'gradient_evaluation_limit'
+        :param incumbent: (np.array) (default=None) best feasible point with
+        rounded binary variables found during the solve
+        :param incumbent_objective: (float) (default=None) objective function
+        (without penalty) at the incumbent
+        :param constraint_residuals: (np.array) (default=None) norm of the
+        equality and inequality residuals (nan without such constraints) of
+        the iterate with rounded binary variables at the end of each dual
+        iteration, of shape (dual iterations, 2)
+        :param penalty_eq: (float) (default=None) penalty for the equality
+        constraint at the end of the solve (adapted with penalty_adaptation)
+        :param penalty_ineq: (float) (default=None) penalty for the inequality
+        constraint at the end of the solve (adapted with penalty_adaptation)
+
+        """
+        self.x = x
+        self.x_h = x_h
+        self.objective = objective
+        self.iterations = iterations
+        self.slack_variable = slack_variable
+        self.dual_variable_eq = dual_variable_eq
+        self.dual_variable_ineq = dual_variable_ineq
+        self.solve_time = solve_time
+        self._history = history if history is not None else dict()
+        self.status = status
+        self.incumbent = incumbent
+        self.incumbent_objective = incumbent_objective
+        self.constraint_residuals = constraint_residuals
+        self.penalty_eq = penalty_eq
+        self.penalty_ineq = penalty_ineq
+
+    @property
+    def has_history(self):
+        return self._history.get('x') is not None
+
+    def _history_view(self, key, stop):
+        array = self._history.get(key)
+        if array is None:
+            return None
+        return array[..., :stop]
+
+    @property
+    def x_history(self):
+        """(np.array) iterates of size (n, iterations + 1), view on the solver arrays"""
+        return self._history_view('x', self.iterations + 1)
+
+    @property
+    def x_h_history(self):
+        return self._history_view('x_h', self.iterations + 1)
+
+    @property
+    def f_val_history(self):
+        return self._history_view('f_val', self.iterations + 1)
+
+    @property
+    def step_size_history(self):
+        return self._history_view('step_size', self.iterations)
+
+    @property
+    def slack_variable_history(self):
+        return self._history_view('slack_variable', self.iterations + 1)
+
+    def other_dict(self):
+        if self.slack_variable is None:
+            return dict()
+        return dict({'slack_variable': self.slack_variable_history,
+                     'dual_variable_eq': self.dual_variable_eq,
+                     'dual_variable_ineq': self.dual_variable_ineq})
+
+    def __iter__(self):
+        """
+        Unpack as the former tuple (x, x_h, f_val_hist, step_size, other_dict)
+        with histories trimmed to the iterations done
+        """
+        return iter((self.x_history, self.x_h_history, self.f_val_history,
+                     self.step_size_history, self.other_dict()))
+
+    def __getstate__(self):
+        # only the filled part of the history is pickled
+        state = self.__dict__.copy()
+        state['_history'] = dict({
+            'x': self.x_history,
+            'x_h': self.x_h_history,
+            'f_val': self.f_val_history,
+            'step_size': self.step_size_history,
+            'slack_variable': self.slack_variable_history,
+        })
+        return state
+
+    def to_dict(self, include_history=False):
+        """
+        Compact representation with lists, that can be written as json
+        :param include_history: (boolean) (default=False) if True add the
+        trajectory of the iterates
+        :return: (dict)
+        """
+        d = dict({
+            'x': _to_list(self.x),
+            'x_h': _to_list(self.x_h),
+            'objective': _to_float(self.objective),
+            'iterations': int(self.iterations),
+            'slack_variable': _to_list(self.slack_variable),
+            'dual_variable_eq': _to_list(self.dual_variable_eq),
+            'dual_variable_ineq': _to_list(self.dual_variable_ineq),
+            'solve_time': self.solve_time,
+            'status': self.status,
+            'incumbent': _to_list(self.incumbent),
+            'incumbent_objective': _to_float(self.incumbent_objective),
+            'constraint_residuals': _to_list(self.constraint_residuals),
+            'penalty_eq': _to_float(self.penalty_eq),
+            'penalty_ineq': _to_float(self.penalty_ineq),
+        })
+        if include_history and self.has_history:
+            d['history'] = dict({
+                'x': _to_list(self.x_history),
+                'x_h': _to_list(self.x_h_history),
+                'f_val': _to_list(self.f_val_history),
+                'step_size': _to_list(self.step_size_history),
+                'slack_variable': _to_list(self.slack_variable_history),
+            })
+        return d
+
+    def to_json(self, include_history=False):
+        return json.dumps(self.to_dict(include_history=include_history))
+
+    @classmethod
+    def from_dict(cls, d):
+        history = d.get('history')
+        if history is not None:
+            history = dict({key: _to_array(value)
+                            for key, value in history.items()})
+        return cls(_to_array(d['x']),
+                   _to_array(d['x_h']),
+                   d['objective'],
+                   d['iterations'],
+                   slack_variable=_to_array(d.get('slack_variable')),
+                   dual_variable_eq=_to_array(d.get('dual_variable_eq')),
+                   dual_variable_ineq=_to_array(d.get('dual_variable_ineq')),
+                   solve_time=d.get('solve_time'),
+                   history=history,
+                   status=d.get('status'),
+                   incumbent=_to_array(d.get('incumbent')),
+                   incumbent_objective=d.get('incumbent_objective'),
+                   constraint_residuals=_to_array(
+                       d.get('constraint_residuals')),
+                   penalty_eq=d.get('penalty_eq'),
+                   penalty_ineq=d.get('penalty_ineq'))
+
+    def __repr__(self):
+        return 'SolveResult(objective=%s, iterations=%s, status=%s, ' \
+            'solve_time=%s)' % (self.objective, self.iterations, self.status,
+                                self.solve_time)
+
+
+def _to_list(array):
+    if array is None:
+        return None
+    return np.asarray(array).tolist()
+
+
+def _to_array(values):
+    if values is None:
+        return None
+    return np.array(values, dtype=np.float64)
+
+
+def _to_float(value):
+    if value is None:
+        return None
+    return float(value)
@@ -0,0 +1,168 @@
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class RollingHorizonSolver():
+    def __init__(self,
+                 solver,
+                 build_problem,
+                 variables_per_period,
+                 eq_rows_per_period=0,
+                 ineq_rows_per_period=0,
+                 window_time_limit=None,
+                 reuse_structure=True):
+        """
+
+        Receding horizon driver: at each window the problem over the next
+        periods is built, warm started from the previous window shifted by
+        one period and solved, then the first period is committed.
+
+        The variables (and the constraint rows) of the problem built for a
+        window are ordered by period.
+
+        :param solver: (HopfieldSolver) solver used for every window
+        :param build_problem: (function) window index -> dict of the arguments
+        of HopfieldSolver.setup_optimization_problem
+        :param variables_per_period: (int) number of variables of one period
+        :param eq_rows_per_period: (int) (default=0) number of equality
+        constraints of one period, used to shift the dual variables
+        :param ineq_rows_per_period: (int) (default=0) number of inequality
+        constraints of one period, used to shift the slack and dual variables
+        :param window_time_limit: (float) (default=None) time budget of a
+        window in seconds (building, setup and solve)
+        :param reuse_structure: (boolean) (default=True) if True the
+        smoothness coefficient and the squared spectral norms of the
+        constraints computed for the first window are reused (the structure of
+        the problem does not change between windows)
+
+        """
+        self.solver = solver
+        self.build_problem = build_problem
+        self.variables_per_period = variables_per_period
+        self.eq_rows_per_period = eq_rows_per_period
+        self.ineq_rows_per_period = ineq_rows_per_period
+        self.window_time_limit = window_time_limit
+        self.reuse_structure = reuse_structure
+        self.windows = []
+        self.committed = []
+        self._previous_result = None
+        self._structure = dict()
+
+    def solve_window(self, window):
+        """
+        Build, set up and solve one window
+        :param window: (int) index of the window
+        :return: (SolveResult) result of the window
+        """
+        start_time = time.perf_counter()
+        kwargs = dict(self.build_problem(window))
+        if self.reuse_structure and \
+                self._structure.get('smoothness_coef') is not None and \
+                kwargs.get('smoothness_coef') is None:
+            kwargs['smoothness_coef'] = self._structure['smoothness_coef']
+        if self._previous_result is not None and 'warm_start' not in kwargs:
+            kwargs['warm_start'] = shift_warm_start(
+                self._previous_result, self.variables_per_period,
+                self.eq_rows_per_period, self.ineq_rows_per_period)
+        problem = self.solver.setup_optimization_problem(**kwargs)
+        if self.reuse_structure:
+            for key in ['eq', 'ineq']:
+                if problem['squared_norm_' + key] is None:
+                    problem['squared_norm_' + key] = \
+                        self._structure.get('squared_norm_' + key)
+                # the solve works on a copy of the problem, the norms needed
+                # by the dual phase are computed here to be reused
+                if problem['squared_norm_' + key] is None and \
+                        problem['A_' + key] is not None and \
+                        problem['dual_' + key] is None:
+                    self.solver._squared_norm(problem, key)
+        setup_time = time.perf_counter() - start_time
+
+        time_limit = self.solver.time_limit
+        if self.window_time_limit is not None:
+            self.solver.time_limit = max(0, self.window_time_limit -
+                                         setup_time)
+        try:
+            result = self.solver.solve(problem)
+        finally:
+            self.solver.time_limit = time_limit
+
+        if self.reuse_structure:
+            for key in ['smoothness_coef', 'squared_norm_eq',
+                        'squared_norm_ineq']:
+                if self._structure.get(key) is None:
+                    self._structure[key] = problem[key]
+
+        latency = time.perf_counter() - start_time
+        self.windows.append(dict({
+            'window': window,
+            'latency': latency,
+            'setup_time': setup_time,
+            'solve_time': result.solve_time,
+            'iterations': result.iterations,
+            'status': result.status,
+            'objective': result.objective,
+            'warm_start': self._previous_result is not None,
+        }))
+        logger.info('Window %s solved in %.3f s (%s iterations, %s).', window,
+                    latency, result.iterations, result.status)
+        if self.window_time_limit is not None and \
+                latency > self.window_time_limit:
+            logger.warning('Window %s exceeded its time budget: %.3f s > '
+                           '%.3f s.', window, latency, self.window_time_limit)
+        self._previous_result = result
+        self.committed.append(np.copy(result.x[:self.variables_per_period]))
+        return result
+
+    def run(self, num_windows, first_window=0):
+        """
+        :param num_windows: (int) number of windows to solve
+        :param first_window: (int) (default=0) index of the first window
+        :return: (np.array) committed first periods, size
+        (num_windows, variables_per_period)
+        """
+        for window in range(first_window, first_window + num_windows):
+            self.solve_window(window)
+        return np.array(self.committed[-num_windows:])
+
+    def latencies(self):
+        """
+        :return: (np.array) latency of each window in seconds
+        """
+        return np.array([window['latency'] for window in self.windows])
+
+
+def shift_warm_start(result, variables_per_period, eq_rows_per_period=0,
+                     ineq_rows_per_period=0):
+    """
+    Shift a result by one period: the first period is dropped and the last
+    one is repeated
+    :param result: (SolveResult) result of the previous window
+    :param variables_per_period: (int) number of variables of one period
+    :param eq_rows_per_period: (int) (default=0) equality constraints of one
+    period
+    :param ineq_rows_per_period: (int) (default=0) inequality constraints of
+    one period
+    :return: (dict) warm start for setup_optimization_problem
+    """
+    return dict({
+        'x_h': _shift(result.x_h, variables_per_period),
+        'slack_variable': _shift(result.slack_variable, ineq_rows_per_period),
+        'dual_variable_eq': _shift(result.dual_variable_eq,
+                                   eq_rows_per_period),
+        'dual_variable_ineq': _shift(result.dual_variable_ineq,
+                                     ineq_rows_per_period),
+    })
+
+
+def _shift(values, period_size):
+    if values is None:
+        return None
+    values = np.asarray(values)
+    if period_size == 0 or len(values) < period_size:
+        return values
+    return np.concatenate((values[period_size:], values[-period_size:]))
@@ -0,0 +1,230 @@
+import logging
+
+import hmip.utils as utils
+from hmip.result import SolveResult
+import numpy as np
+import scipy.sparse
+
+logger = logging.getLogger(__name__)
+
+
+def scale_problem(objective_function,
+                  gradient,
+                  lb,
+                  ub,
+                  binary_indicator,
+                  A_eq=None,
+                  b_eq=None,
+                  A_ineq=None,
+                  b_ineq=None,
+                  H=None,
+                  value_and_grad=None,
+                  penalty_eq=None,
+                  penalty_ineq=None,
+                  max_iterations=20,
+                  tolerance=10**-2):
+    """
+
+    Ruiz equilibration: the variables are replaced by x = D y and the
+    constraint rows are multiplied by R so that the largest element of each
+    row and column of R A D (and of D H D) is close to 1. The binary
+    variables are not scaled, their box [lb, ub] is unchanged. The penalty
+    of row i of the scaled problem weighs penalty * R_i^2 in the original
+    one, the penalties are divided by the mean of R^2 so that a residual
+    spread evenly over the rows keeps its original penalty.
+
+    :param objective_function: (function) objective function
+    :param gradient: (function) gradient of the objective function
+    :param lb: (np.array) lower bound
+    :param ub: (np.array) upper bound
+    :param binary_indicator: (np.array) 1 if variable is binary, 0 otw
+    :param A_eq: (np.array or sparse matrix) (default=None) matrix A in equality constraint Ax = b
+    :param b_eq: (np.array) (default=None) matrix b in equality constraint Ax = b
+    :param A_ineq: (np.array or sparse matrix) (default=None) matrix A in inequality constraint Ax <= b
+    :param b_ineq: (np.array) (default=None) matrix b in inequality constraint Ax <= b
+    :param H: (np.array or sparse matrix) (default=None) quadratic term of the
+    objective, if given its columns are equilibrated too and the smoothness
+    coefficient and hessian of the scaled problem are computed
+    :param value_and_grad: (function) (default=None) objective function and
+    gradient at the same point
+    :param penalty_eq: (float) (default=None) penalty for the equality
+    constraint of the original problem
+    :param penalty_ineq: (float) (default=None) penalty for the inequality
+    constraint of the original problem
+    :param max_iterations: (int) (default=20) maximum number of Ruiz
+    iterations
+    :param tolerance: (float) (default=10**-2) stop when the row and column
+    norms are within tolerance of 1
+    :return: (dict, Scaling) arguments of setup_optimization_problem for the
+    scaled problem and the map back to the original problem
+
+    """
+    for A in [A_eq, A_ineq]:
+        if utils.is_linear_operator(A):
+            raise Exception('Scaling needs explicit constraint matrices')
+    if H is not None and utils.is_linear_operator(H):
+        logger.warning('H is matrix-free, only the constraints are used for '
+                       'the scaling.')
+        H = None
+    dense = isinstance(A_eq, np.ndarray) or isinstance(A_ineq, np.ndarray)
+    n = len(lb)
+    continuous = np.asarray(binary_indicator) == 0
+
+    matrices = dict()
+    for key, A, b in [('eq', A_eq, b_eq), ('ineq', A_ineq, b_ineq),
+                      ('H', H, None)]:
+        if A is not None and (b is not None or key == 'H'):
+            matrices[key] = scipy.sparse.csr_matrix(A, dtype=np.float64)
+
+    column_scale = np.ones(n)
+    row_scale = dict({key: np.ones(A.shape[0])
+                      for key, A in matrices.items() if key != 'H'})
+    for _ in range(max_iterations):
+        column_norm = np.zeros(n)
+        converged = True
+        for key, A in matrices.items():
+            if key == 'H':
+                scaled = _scale(A, column_scale, column_scale)
+            else:
+                scaled = _scale(A, row_scale[key], column_scale)
+                row_norm = _max_abs(scaled, axis=1)
+                converged = converged and _is_converged(row_norm, tolerance)
+                row_scale[key] = row_scale[key] / np.sqrt(
+                    np.where(row_norm > 0, row_norm, 1))
+            column_norm = np.maximum(column_norm, _max_abs(scaled, axis=0))
+        converged = converged and _is_converged(column_norm[continuous],
+                                                tolerance)
+        if converged:
+            break
+        column_scale = np.where(
+            continuous & (column_norm > 0),
+            column_scale / np.sqrt(np.where(column_norm > 0, column_norm, 1)),
+            column_scale)
+
+    scaling = Scaling(column_scale, row_scale.get('eq'),
+                      row_scale.get('ineq'))
+    scaled = dict({
+        'objective_function': scaling.scale_function(objective_function),
+        'gradient': scaling.scale_gradient(gradient),
+        'lb': np.divide(lb, column_scale),
+        'ub': np.divide(ub, column_scale),
+        'binary_indicator': binary_indicator,
+    })
+    if value_and_grad is not None:
+        scaled['value_and_grad'] = scaling.scale_value_and_grad(
+            value_and_grad)
+    for key, b, penalty in [('eq', b_eq, penalty_eq),
+                            ('ineq', b_ineq, penalty_ineq)]:
+        if key in matrices:
+            A = _scale(matrices[key], row_scale[key], column_scale)
+            scaled['A_' + key] = A.toarray() if dense else A
+            scaled['b_' + key] = row_scale[key] * b
+            if penalty is not None:
+                scaled['penalty_' + key] = penalty / _penalty_factor(
+                    row_scale[key])
+    if 'H' in matrices:
+        H_scaled = _scale(matrices['H'], column_scale, column_scale)
+        if isinstance(H, np.ndarray):
+            H_scaled = H_scaled.toarray()
+        scaled['smoothness_coef'] = utils.smoothness_coefficient(H_scaled)
+        scaled['hessian'] = H_scaled
+    logger.info('Scaling: column factors in [%.3g, %.3g].',
+                np.min(column_scale), np.max(column_scale))
+    return scaled, scaling
+
+
+class Scaling():
+    def __init__(self, column_scale, row_scale_eq=None, row_scale_ineq=None):
+        """
+        Map from the scaled problem back to the original one, x = D y
+        :param column_scale: (np.array) diagonal of D, 1 for the binaries
+        :param row_scale_eq: (np.array) (default=None) scaling of the
+        equality rows
+        :param row_scale_ineq: (np.array) (default=None) scaling of the
+        inequality rows
+        """
+        self.column_scale = column_scale
+        self.row_scale_eq = row_scale_eq
+        self.row_scale_ineq = row_scale_ineq
+
+    def unscale(self, y):
+        """
+        :param y: (np.array) point of the scaled problem
+        :return: (np.array) point of the original problem
+        """
+        return self.column_scale * y
+
+    def scale_function(self, function):
+        return lambda y: function(self.unscale(y))
+
+    def scale_gradient(self, gradient):
+        return lambda y: self.column_scale * gradient(self.unscale(y))
+
+    def scale_value_and_grad(self, value_and_grad):
+        def scaled_value_and_grad(y):
+            value, grad = value_and_grad(self.unscale(y))
+            return value, self.column_scale * grad
+        return scaled_value_and_grad
+
+    def result(self, result):
+        """
+        :param result: (SolveResult) result of the scaled problem
+        :return: (SolveResult) result of the original problem
+        """
+        return SolveResult(
+            self.unscale(result.x),
+            self.unscale(result.x_h),
+            result.objective,
+            result.iterations,
+            slack_variable=_divide(result.slack_variable,
+                                   self.row_scale_ineq),
+            dual_variable_eq=_multiply(result.dual_variable_eq,
+                                       self.row_scale_eq),
+            dual_variable_ineq=_multiply(result.dual_variable_ineq,
+                                         self.row_scale_ineq),
+            solve_time=result.solve_time,
+            status=result.status,
+            incumbent=self.unscale(result.incumbent)
+            if result.incumbent is not None else None,
+            incumbent_objective=result.incumbent_objective,
+            penalty_eq=_multiply(result.penalty_eq,
+                                 _penalty_factor(self.row_scale_eq)),
+            penalty_ineq=_multiply(result.penalty_ineq,
+                                   _penalty_factor(self.row_scale_ineq)))
+
+
+def _scale(A, row_scale, column_scale):
+    return scipy.sparse.diags(row_scale).dot(A).dot(
+        scipy.sparse.diags(column_scale)).tocsr()
+
+
+def _max_abs(A, axis):
+    if A.shape[axis] == 0 or A.nnz == 0:
+        return np.zeros(A.shape[1 - axis])
+    return np.asarray(abs(A).max(axis=axis).todense()).ravel()
+
+
+def _is_converged(norm, tolerance):
+    norm = norm[norm > 0]
+    return len(norm) == 0 or np.max(np.abs(1 - norm)) <= tolerance
+
+
+def _penalty_factor(row_scale):
+    """
+    :return: (float) mean of the squared row factors, None without rows
+    """
+    if row_scale is None or len(row_scale) == 0:
+        return None
+    return np.mean(row_scale**2)
+
+
+def _multiply(values, scale):
+    if values is None or scale is None:
+        return values
+    return values * scale
+
+
+def _divide(values, scale):
+    if values is None or scale is None:
+        return values
+    return values / scale
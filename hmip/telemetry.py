@@ -0,0 +1,269 @@
+import abc
+import collections
+import json
+import math
+import os
+import queue
+import threading
+
+
+class TelemetrySink(abc.ABC):
+    """
+    Receives the telemetry records of the solver, one dict per reported
+    iteration with the keys 'iteration', 'time', 'objective',
+    'gradient_precision', 'step_size', 'absorbed_fraction',
+    'residual_eq' and 'residual_ineq' (None without such constraints or with
+    constraint sampling).
+    """
+    # sinks that can not block (in memory) are called directly by the solver,
+    # the other ones are wrapped in an AsyncSink
+    blocking = True
+
+    @abc.abstractmethod
+    def write(self, record):
+        """
+        :param record: (dict) record of an iteration
+        """
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self):
+        """
+        :return: (int) number of records that could not be written
+        """
+        return 0
+
+
+class RingBufferSink(TelemetrySink):
+    blocking = False
+
+    def __init__(self, capacity=1000):
+        """
+        Keep the last records in memory
+        :param capacity: (int) (default=1000) maximum number of records kept
+        """
+        self.records = collections.deque(maxlen=capacity)
+
+    def write(self, record):
+        self.records.append(record)
+
+    def to_list(self):
+        return list(self.records)
+
+
+class JsonLinesSink(TelemetrySink):
+    def __init__(self, file_path):
+        """
+        Append each record as a json line to a file
+        :param file_path: (str) path of the file
+        """
+        self.file_path = file_path
+        self._file = None
+
+    def write(self, record):
+        if self._file is None:
+            self._file = open(self.file_path, 'a')
+        self._file.write(json.dumps(_finite(record)) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class PrometheusTextfileSink(TelemetrySink):
+    def __init__(self, file_path, prefix='hmip', labels=None):
+        """
+        Write the last record as gauges in the Prometheus text format, for the
+        textfile collector of node_exporter. The file is replaced atomically.
+        :param file_path: (str) path of the .prom file
+        :param prefix: (str) (default='hmip') prefix of the metric names
+        :param labels: (dict) (default=None) labels added to every metric
+        """
+        self.file_path = file_path
+        self.prefix = prefix
+        self.labels = labels if labels is not None else dict()
+
+    def write(self, record):
+        labels = ','.join('%s="%s"' % (key, value)
+                          for key, value in sorted(self.labels.items()))
+        if labels:
+            labels = '{' + labels + '}'
+        lines = []
+        for key, value in record.items():
+            if value is None:
+                continue
+            name = '%s_%s' % (self.prefix, key)
+            lines.append('# TYPE %s gauge' % name)
+            lines.append('%s%s %s' % (name, labels, _prometheus_value(value)))
+        temporary_path = self.file_path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temporary_path, self.file_path)
+
+
+class AsyncSink(TelemetrySink):
+    blocking = False
+
+    def __init__(self, sink, max_queue_size=100, close_timeout=1.):
+        """
+        Hand the records to sink on a background thread. The queue is
+        bounded: when it is full the record is dropped instead of waiting, so
+        a slow sink never blocks the solver. The thread is started by the
+        first write after a close, so the sink can be closed after each solve.
+        :param sink: (TelemetrySink) sink doing the writing
+        :param max_queue_size: (int) (default=100) maximum number of records
+        waiting to be written
+        :param close_timeout: (float) (default=1.) maximum time in seconds
+        close waits for the queued records to be written
+        """
+        self.sink = sink
+        self.max_queue_size = max_queue_size
+        self.close_timeout = close_timeout
+        self.queue = None
+        self.dropped = 0
+        self.left_behind = 0
+        self.errors = 0
+        self._thread = None
+        self._stop = None
+        # the writing thread of a previous solve may still be writing
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        if self._thread is None:
+            self.queue = queue.Queue(maxsize=self.max_queue_size)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, args=(self.queue, self._stop), daemon=True)
+            self._thread.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self, records, stop):
+        while not stop.is_set():
+            record = records.get()
+            try:
+                if record is None:
+                    break
+                with self._lock:
+                    self.sink.write(record)
+            except Exception:
+                self.errors += 1
+            finally:
+                records.task_done()
+        # a thread stopped by close after its timeout closes the sink once
+        # its last record is written, unless a new thread uses it
+        with self._lock:
+            if stop.is_set() and self._thread is None:
+                self.sink.close()
+
+    def flush(self, timeout=None):
+        """
+        Wait until the records in the queue are written
+        :param timeout: (float) (default=None) maximum time to wait in seconds
+        :return: (boolean) True if the queue is empty
+        """
+        if self.queue is None:
+            return True
+        if timeout is None:
+            self.queue.join()
+            return True
+        with self.queue.all_tasks_done:
+            return self.queue.all_tasks_done.wait_for(
+                lambda: self.queue.unfinished_tasks == 0, timeout)
+
+    def close(self, timeout=None):
+        """
+        Stop the thread once the queued records are written, and close sink.
+        It waits at most timeout seconds: the records still queued are then
+        dropped, counted in left_behind, and the thread closes sink after the
+        record it is writing.
+        :param timeout: (float) (default=None) maximum time to wait in
+        seconds, close_timeout if None
+        :return: (int) number of records left behind
+        """
+        if timeout is None:
+            timeout = self.close_timeout
+        thread, records, stop = self._thread, self.queue, self._stop
+        self._thread = None
+        if thread is None:
+            self._close_sink(timeout)
+            return 0
+        try:
+            records.put_nowait(None)
+        except queue.Full:
+            stop.set()
+        thread.join(timeout)
+        stop.set()
+        left_behind = 0
+        while True:
+            try:
+                record = records.get_nowait()
+            except queue.Empty:
+                break
+            records.task_done()
+            if record is not None:
+                left_behind += 1
+        self.left_behind += left_behind
+        if not thread.is_alive():
+            self._close_sink(timeout)
+        return left_behind
+
+    def _close_sink(self, timeout):
+        # a thread stopped by a previous close may still be writing, it
+        # closes the sink itself when it is done
+        if self._lock.acquire(timeout=timeout):
+            try:
+                self.sink.close()
+            finally:
+                self._lock.release()
+
+
+class MultiSink(TelemetrySink):
+    blocking = False
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def write(self, record):
+        for sink in self.sinks:
+            sink.write(record)
+
+    def flush(self, timeout=None):
+        return all([sink.flush(timeout) is not False for sink in self.sinks])
+
+    def close(self):
+        return sum([sink.close() or 0 for sink in self.sinks])
+
+
+def get_sink(telemetry):
+    """
+    :param telemetry: (None, TelemetrySink or list of TelemetrySink)
+    :return: (TelemetrySink) sink that does not block, or None
+    """
+    if telemetry is None:
+        return None
+    if isinstance(telemetry, (list, tuple)):
+        return MultiSink([get_sink(sink) for sink in telemetry])
+    if getattr(telemetry, 'blocking', True):
+        return AsyncSink(telemetry)
+    return telemetry
+
+
+def _finite(record):
+    return dict({key: (None if isinstance(value, float) and
+                       not math.isfinite(value) else value)
+                 for key, value in record.items()})
+
+
+def _prometheus_value(value):
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    elif math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
@@ -1,15 +1,263 @@
+import logging
+
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 
-def smoothness_coefficient(H):
+def smoothness_coefficient(H, random_state=None):
     """
     Compute the soothness coefficient with max(eig(H))
-    :param H: (np.array) matrix of size (n, n), quadratic term of the problem
+    :param H: (np.array, sparse matrix or LinearOperator) matrix of size
+    (n, n), quadratic term of the problem. If H is not a dense array, the
+    eigenvalue is estimated with power iterations
+    :param random_state: (RandomState) (default=None) numpy random state of
+    the initial vector of the power iterations
     :return: (np.float) scalar, smoothness coefficient
     """
+    if not isinstance(H, np.ndarray):
+        return np.absolute(power_iteration(lambda v: matvec(H, v),
+                                           H.shape[1],
+                                           random_state=random_state))
     return np.absolute(np.max(np.linalg.eigvals(H)))
 
 
+def is_linear_operator(A):
+    """
+    Check if A is a matrix-free operator (e.g. scipy LinearOperator) that
+    only provides matvec and rmatvec
+    :param A: (object) matrix or operator
+    :return: (boolean) True if A is matrix-free
+    """
+    return A is not None and not isinstance(A, np.ndarray) \
+        and hasattr(A, 'matvec') and hasattr(A, 'rmatvec')
+
+
+def matvec(A, x):
+    """
+    Compute A x for a dense array, a sparse matrix or a LinearOperator
+    :param A: (np.array, sparse matrix or LinearOperator) size (m, n)
+    :param x: (np.array) size n
+    :return: (np.array) size m
+    """
+    if isinstance(A, np.ndarray):
+        return np.dot(A, x)
+    elif is_linear_operator(A):
+        return A.matvec(x)
+    return A.dot(x)
+
+
+def rmatvec(A, y):
+    """
+    Compute A^T y for a dense array, a sparse matrix or a LinearOperator
+    :param A: (np.array, sparse matrix or LinearOperator) size (m, n)
+    :param y: (np.array) size m
+    :return: (np.array) size n
+    """
+    if isinstance(A, np.ndarray):
+        return np.dot(A.T, y)
+    elif is_linear_operator(A):
+        return A.rmatvec(y)
+    return A.T.dot(y)
+
+
+def cached_product(A, transpose=False):
+    """
+    Build x -> A x remembering the last product, so that the objective, the
+    gradient and the slack gradient evaluated at the same point share one
+    matrix-vector product with the constraint matrix.
+    :param A: (np.array, sparse matrix or LinearOperator) size (m, n)
+    :param transpose: (boolean) (default=False) if True compute A^T x instead
+    :return: (function) x -> A x
+    """
+    cache = dict({'x': None, 'product': None})
+    multiply = rmatvec if transpose else matvec
+
+    def product(x):
+        if cache['x'] is None or not np.array_equal(cache['x'], x):
+            cache['product'] = multiply(A, x)
+            cache['x'] = np.array(x, copy=True)
+        return cache['product']
+
+    return product
+
+
+def use_gram_operator(A, constraint_operator='auto'):
+    """
+    Choose between applying A^T (A x) with two products with A and applying
+    the precomputed Gram matrix A^T A with one product.
+    :param A: (np.array, sparse matrix or LinearOperator) size (m, n)
+    :param constraint_operator: (string) 'auto' compares the cost of both
+    forms from the shape and the density of A, 'gram' and 'matvec' force one
+    :return: (boolean) True if the Gram matrix should be used
+    """
+    if constraint_operator == 'matvec':
+        return False
+    elif constraint_operator == 'gram':
+        if is_linear_operator(A):
+            raise Exception('The Gram matrix of a LinearOperator can not be '
+                            'precomputed')
+        return True
+    elif constraint_operator != 'auto':
+        raise Exception('Constraint operator type does not exist!')
+
+    if is_linear_operator(A):
+        return False
+    m, n = A.shape
+    if isinstance(A, np.ndarray):
+        return n * n < 2 * m * n
+    # sparse matrix: each row with r nonzeros adds at most r^2 nonzeros
+    # to A^T A
+    row_nnz = np.diff(A.tocsr().indptr)
+    gram_nnz = min(n * n, np.sum(np.power(row_nnz, 2)))
+    return gram_nnz < 2 * A.nnz
+
+
+def constraint_gram(A, b):
+    """
+    Precompute the Gram matrix A^T A and A^T b of a constraint A x = b
+    :param A: (np.array or sparse matrix) size (m, n)
+    :param b: (np.array) size m
+    :return: (np.array or sparse matrix, np.array) A^T A of size (n, n) and
+    A^T b of size n
+    """
+    if isinstance(A, np.ndarray):
+        gram = np.dot(A.T, A)
+    else:
+        gram = A.T.dot(A)
+    return gram, rmatvec(A, b)
+
+
+def power_iteration(operator, n, max_iterations=100, precision=10**-6,
+                    random_state=None):
+    """
+    Estimate the eigenvalue of largest magnitude of a symmetric operator with
+    power iterations. Only products with the operator are needed.
+    :param operator: (function) v -> M v
+    :param n: (int) dimension of the operator
+    :param max_iterations: (int) maximum number of iterations
+    :param precision: (float) relative precision on the eigenvalue
+    :param random_state: (RandomState) (default=None) numpy random state of
+    the initial vector, a fixed seed if None so that the estimate does not
+    depend on the global random state
+    :return: (float) eigenvalue estimate
+    """
+    if random_state is None:
+        random_state = np.random.RandomState(0)
+    v = normalize_array(random_state.rand(n) + 0.1)
+    eigenvalue = 0
+    for _ in range(max_iterations):
+        w = operator(v)
+        next_eigenvalue = np.dot(v, w)
+        norm = np.linalg.norm(w)
+        if norm == 0:
+            return 0
+        v = w / norm
+        if abs(next_eigenvalue - eigenvalue) <= precision * abs(
+                next_eigenvalue):
+            return next_eigenvalue
+        eigenvalue = next_eigenvalue
+    return eigenvalue
+
+
+def squared_spectral_norm(A, random_state=None):
+    """
+    Compute max(eig(A^T A)), used in the step size of the dual computation.
+    For matrix-free or sparse A it is estimated with power iterations on
+    A^T A, which only requires O(n) memory.
+    :param A: (np.array, sparse matrix or LinearOperator) size (m, n)
+    :param random_state: (RandomState) (default=None) numpy random state of
+    the initial vector of the power iterations
+    :return: (float) largest eigenvalue of A^T A
+    """
+    if isinstance(A, np.ndarray):
+        return max(np.linalg.eigvalsh(np.dot(A.T, A)))
+    return power_iteration(lambda v: rmatvec(A, matvec(A, v)), A.shape[1],
+                           random_state=random_state)
+
+
+def estimate_diagonal(product, n, random_state=None, samples=10):
+    """
+    Estimate the diagonal of a matrix known through its products with the
+    average of v * (M v) over random vectors v of +-1
+    :param product: (function) v -> M v
+    :param n: (int) size of M
+    :param random_state: (RandomState) (default=None) numpy random state
+    :param samples: (int) (default=10) number of random vectors
+    :return: (np.array) size n
+    """
+    if random_state is None:
+        random_state = np.random
+    diagonal = np.zeros(n)
+    for _ in range(samples):
+        v = 2 * random_state.randint(0, 2, n) - 1.
+        diagonal += np.multiply(v, product(v))
+    return diagonal / samples
+
+
+def diagonal(H, random_state=None):
+    """
+    :param H: (np.array, sparse matrix or LinearOperator) size (n, n)
+    :param random_state: (RandomState) (default=None) numpy random state
+    :return: (np.array) diagonal of H, estimated if H is a LinearOperator
+    """
+    if isinstance(H, np.ndarray):
+        return np.diag(H).astype(np.float64)
+    elif is_linear_operator(H):
+        return estimate_diagonal(lambda v: matvec(H, v), H.shape[1],
+                                 random_state)
+    return np.asarray(H.diagonal(), dtype=np.float64)
+
+
+def squared_column_norms(A, random_state=None):
+    """
+    :param A: (np.array, sparse matrix or LinearOperator) size (m, n)
+    :param random_state: (RandomState) (default=None) numpy random state
+    :return: (np.array) diagonal of A^T A, estimated if A is a
+    LinearOperator
+    """
+    if isinstance(A, np.ndarray):
+        return np.sum(np.power(A, 2), axis=0).astype(np.float64)
+    elif is_linear_operator(A):
+        return estimate_diagonal(lambda v: rmatvec(A, matvec(A, v)),
+                                 A.shape[1], random_state)
+    return np.asarray(A.multiply(A).sum(axis=0), dtype=np.float64).ravel()
+
+
+def quadratic_objective(H, q):
+    """
+    Build the objective function 1/2 x^T H x + q^T x and its gradient.
+    :param H: (np.array, sparse matrix or LinearOperator) symmetric matrix of
+    size (n, n), e.g. an out_of_core.MemmapMatrix
+    :param q: (np.array) size n
+    :return: (function, function) objective function and gradient
+    """
+    def objective_function(x):
+        return 1 / 2 * np.dot(x, matvec(H, x)) + np.dot(q, x)
+
+    def gradient(x):
+        return matvec(H, x) + q
+
+    return objective_function, gradient
+
+
+def quadratic_value_and_grad(H, q):
+    """
+    Build the fused objective function and gradient of 1/2 x^T H x + q^T x,
+    H x is computed once per evaluation so an out-of-core H is read once.
+    :param H: (np.array, sparse matrix or LinearOperator) symmetric matrix of
+    size (n, n), e.g. an out_of_core.MemmapMatrix
+    :param q: (np.array) size n
+    :return: (function) value_and_grad, to give to
+    HopfieldSolver.setup_optimization_problem
+    """
+    def value_and_grad(x):
+        Hx = matvec(H, x)
+        return 1 / 2 * np.dot(x, Hx) + np.dot(q, x), Hx + q
+
+    return value_and_grad
+
+
 def projection(z, n, lb, ub):
     z[:n] = np.maximum(z[:n], lb)
     z[:n] = np.minimum(z[:n], ub)
@@ -18,13 +266,15 @@ def projection(z, n, lb, ub):
     return z
 
 
-def compute_approximate_smoothness_coef(gradient, lb, ub):
+def compute_approximate_smoothness_coef(gradient, lb, ub, random_state=None):
+    if random_state is None:
+        random_state = np.random
     n = len(lb)
     n_rand =  n
     smoothness_val_list = []
     for n_rand_trials in range(n_rand):
-        point_1 = np.multiply(np.random.rand(n), ub - lb) + lb
-        point_2 = np.multiply(np.random.rand(n), ub - lb) + lb
+        point_1 = np.multiply(random_state.rand(n), ub - lb) + lb
+        point_2 = np.multiply(random_state.rand(n), ub - lb) + lb
         distance = np.linalg.norm(point_1 - point_2)
         smoothness_val_list.append(np.linalg.norm(gradient(point_1) - gradient(point_2)) / distance)
     return np.max(smoothness_val_list)
@@ -297,14 +547,14 @@ def check_type(n,
         if isinstance(initial_state, np.ndarray):
             return len(initial_state) == n
         else:
-            print('initial_state is not of the correct type or dim')
+            logger.warning('initial_state is not of the correct type or dim')
             return False
 
     if lb is not None:
         if isinstance(lb, np.ndarray):
             return len(lb) == n
         else:
-            print('lb is not of the correct type or dim')
+            logger.warning('lb is not of the correct type or dim')
             return False
 
     if ub is not None:
@@ -363,7 +613,7 @@ def check_type(n,
     if initial_ascent_type is not None:
         return isinstance(initial_ascent_type, str)
 
-    print('Add a variable to check')
+    logger.debug('Add a variable to check')
     return None
 
 
@@ -375,7 +625,7 @@ def make_symmetric(matrix):
     """
     if not np.allclose(matrix, matrix.T, atol=0):
         matrix = 1 / 2 * (matrix + matrix.T)
-        print(
+        logger.warning(
             'Specified matrix H was not symmetric, matrix H has been replaced by 1/2 * (matrix + matrix.transpose)'
         )
     return matrix
@@ -389,7 +639,7 @@ def adapt_ascent_stop_criterion(ascent_stop, absorption):
     """
     if absorption is not None and ascent_stop is not None and ascent_stop <= absorption:
         ascent_stop = absorption * 2
-        print(
+        logger.warning(
             'Choice of initial ascent stopping criterion was smaller than the '
             'chosen absorption value, ascent_stop was taken to be absorption * 2'
         )
@@ -771,7 +1021,7 @@ def remove_nan_results(x):
     :param x: (np.array) variable dimension n
     :return: (np.array) dimension <= n
     """
-    stop_index = len(x)
+    stop_index = x.shape[1]
     for i in range(x.shape[1]):
         if np.isnan(x[:, i]).any():
             stop_index = i
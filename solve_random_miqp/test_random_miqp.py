@@ -1,7 +1,9 @@
 import numpy as np
 import scipy.sparse
 import pandas as pd
+import logging
 import time
+import tempfile
 import math
 import sys
 import os
@@ -82,6 +84,7 @@ def test_without_constraints():
                     precision_stopping_criterion=test_info[
                         'precision_stopping_criterion'],
                     beta=test_info['beta'],
+                    instrumentation=True,
                 )
 
                 # generate problem
@@ -160,6 +163,7 @@ def test_with_constraints():
                     precision_stopping_criterion=test_info[
                         'precision_stopping_criterion'],
                     beta=test_info['beta'],
+                    instrumentation=True,
                 )
 
                 dual_eq = None
@@ -220,6 +224,139 @@ def test_with_constraints():
                 index += 1
 
 
+def test_out_of_core():
+    num_vars = [1000, 5000]
+    block_sizes = [128, 512, 2048]
+    index = 0
+    for num_var in num_vars:
+        H, q = generate_objective(num_var)
+        binary_indicator = np.ones(num_var)
+        lb = np.zeros(num_var)
+        ub = np.ones(num_var)
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'H.npy')
+            np.save(file_path, H)
+            del H
+            for block_size in block_sizes:
+                print('------------------ Variables: %s -----------------' % num_var)
+                print('------------------ Block size: %s -----------------' % block_size)
+                H_memmap = hmip.out_of_core.MemmapMatrix(file_path,
+                                                         block_size=block_size)
+                objective_function, gradient = hmip.utils.quadratic_objective(
+                    H_memmap, q)
+                # the value and the gradient share one product with H
+                value_and_grad = hmip.utils.quadratic_value_and_grad(
+                    H_memmap, q)
+                smoothness_coef = hmip.utils.smoothness_coefficient(H_memmap)
+
+                solver = hmip.HopfieldSolver(max_iterations=100)
+                H_memmap.reset_statistics()
+                t = time.perf_counter()
+                problem = solver.setup_optimization_problem(
+                    objective_function,
+                    gradient,
+                    lb,
+                    ub,
+                    binary_indicator,
+                    smoothness_coef=smoothness_coef,
+                    value_and_grad=value_and_grad)
+                x, x_h, f_val_hist, step_size, other_dict = solver.solve(
+                    problem)
+                t_hmip = time.perf_counter() - t
+
+                stats = H_memmap.statistics()
+                print('effective bandwidth: %.1f MB/s' %
+                      (stats['effective_bandwidth'] / 10**6))
+                d = {
+                    'num_variables': num_var,
+                    'block_size': block_size,
+                    't_hmip': t_hmip,
+                    'number_products': stats['number_products'],
+                    'bytes_read': stats['bytes_read'],
+                    'read_time': stats['read_time'],
+                    'product_time': stats['wall_time'],
+                    'effective_bandwidth': stats['effective_bandwidth'],
+                }
+                df = pd.DataFrame(data=d, index=[index])
+                with open('stats_out_of_core.csv', 'a') as f:
+                    df.to_csv(f, header=(index == 0))
+                index += 1
+
+
+def test_scaling():
+    num_vars = [10, 50, 100]
+    row_magnitudes = [1, 10**2, 10**4]
+    index = 0
+    for num_var in num_vars:
+        for magnitude in row_magnitudes:
+            print('------------------ Variables: %s -----------------' % num_var)
+            print('------------------ Row magnitude: %s -----------------' % magnitude)
+            H, q = generate_objective(num_var)
+            objective_function, gradient = hmip.utils.quadratic_objective(H, q)
+            binary_indicator = (np.random.uniform(0, 1, num_var) >= 0.7) * 1
+            lb = np.zeros(num_var)
+            ub = np.ones(num_var)
+            num_rows = math.ceil(0.2 * num_var)
+            # rows with magnitudes spread over [1, magnitude]
+            row_scale = np.logspace(0, np.log10(magnitude), num_rows)
+            A_eq = np.diag(row_scale) @ np.random.uniform(
+                0, 1, (num_rows, num_var))
+            A_ineq = np.diag(row_scale) @ np.random.uniform(
+                0, 1, (num_rows, num_var))
+            z = np.where(binary_indicator == 1,
+                         np.random.binomial(1, 0.5, num_var),
+                         np.random.uniform(0, 1, num_var))
+            b_eq = A_eq @ z
+            b_ineq = A_ineq @ z + 0.005 * row_scale
+
+            d = {
+                'num_variables': num_var,
+                'row_magnitude': magnitude,
+            }
+            for scaled in [False, True]:
+                kwargs = dict({
+                    'objective_function': objective_function,
+                    'gradient': gradient,
+                    'lb': lb,
+                    'ub': ub,
+                    'binary_indicator': binary_indicator,
+                    'A_eq': A_eq,
+                    'b_eq': b_eq,
+                    'A_ineq': A_ineq,
+                    'b_ineq': b_ineq,
+                    'penalty_eq': 10,
+                    'penalty_ineq': 10,
+                })
+                if scaled:
+                    kwargs, scaling = hmip.scaling.scale_problem(H=H,
+                                                                 **kwargs)
+                solver = hmip.HopfieldSolver(
+                    max_iterations=1000,
+                    stopping_criterion_type=['gradient', 'objective'],
+                    verbose=False,
+                    seed=0)
+                t = time.perf_counter()
+                problem = solver.setup_optimization_problem(**kwargs)
+                result = solver.solve(problem)
+                if scaled:
+                    result = scaling.result(result)
+                suffix = '_scaled' if scaled else ''
+                d['iterations' + suffix] = result.iterations
+                d['t_hmip' + suffix] = time.perf_counter() - t
+                d['f_value' + suffix] = objective_function(result.x)
+                d['norm_eq' + suffix] = np.linalg.norm(A_eq @ result.x - b_eq)
+                d['norm_ineq' + suffix] = np.linalg.norm(
+                    np.maximum(0, A_ineq @ result.x - b_ineq))
+            d['iteration_reduction'] = 1 - d['iterations_scaled'] / max(
+                d['iterations'], 1)
+            print('iterations: %s -> %s' % (d['iterations'],
+                                            d['iterations_scaled']))
+            df = pd.DataFrame(data=d, index=[index])
+            with open('stats_scaling.csv', 'a') as f:
+                df.to_csv(f, header=(index == 0))
+            index += 1
+
+
 def save_stats(solver, problem, x, x_h, f_val_hist, step_size, t_hmip,
                other_dict, index, t_cplex, f_cplex, t_cplex_relax,
                f_cplex_relax, csv_name):
@@ -263,6 +400,13 @@ def save_stats(solver, problem, x, x_h, f_val_hist, step_size, t_hmip,
     d['t_cplex'] = t_cplex
     d['f_cplex'] = f_cplex
 
+    report = solver.instrumentation.report()
+    for phase, phase_time in report.get('timings', {}).items():
+        d['t_hmip_' + phase] = phase_time
+    for counter, value in report.get('counters', {}).items():
+        d[counter] = value
+    solver.instrumentation.reset()
+
     d['t_cplex_relax'] = t_cplex_relax
     d['f_cplex_relax'] = f_cplex_relax
 
@@ -275,6 +419,23 @@ def save_stats(solver, problem, x, x_h, f_val_hist, step_size, t_hmip,
             df.to_csv(f, header=False)
 
 
+def generate_objective(num_variables, sparsity=0.6):
+    A = scipy.sparse.random(num_variables, num_variables, density=sparsity).todense()
+    V, _ = np.linalg.qr(A)
+    d = np.random.uniform(0, 1, num_variables)
+    D = np.diag(d)
+    H = np.array(V.T @ D @ V)
+    H = 0.5 * (H.T + H)
+
+    B = scipy.sparse.random(num_variables, num_variables, density=sparsity).todense()
+    S = B.T @ B
+    M, v = np.linalg.eig(S)
+    L = np.min(v)
+    S = S - L * np.identity(num_variables)
+    q = np.random.multivariate_normal(np.zeros(num_variables), S)
+    return H, q
+
+
 def generate_problem(solver, constraints=False, num_variables=2, beta=0.7, sparsity=0.6):
     """Generate random problems
 
@@ -291,19 +452,7 @@ def generate_problem(solver, constraints=False, num_variables=2, beta=0.7, spars
             binary_indicator[i] = 1
 
     # objective function
-    A = scipy.sparse.random(num_variables, num_variables, density=sparsity).todense()
-    V, _ = np.linalg.qr(A)
-    d = np.random.uniform(0, 1, num_variables)
-    D = np.diag(d)
-    H = np.array(V.T @ D @ V)
-    H = 0.5 * (H.T + H)
-
-    B = scipy.sparse.random(num_variables, num_variables, density=sparsity).todense()
-    S = B.T @ B
-    M, v = np.linalg.eig(S)
-    L = np.min(v)
-    S = S - L * np.identity(num_variables)
-    q = np.random.multivariate_normal(np.zeros(num_variables), S)
+    H, q = generate_objective(num_variables, sparsity)
 
     gamma = 0.8
     Z = np.random.uniform(0, 1)
@@ -361,7 +510,12 @@ def generate_problem(solver, constraints=False, num_variables=2, beta=0.7, spars
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     print('--- test without constraints ---')
     #test_without_constraints()
     print('--- test with constraints ---')
     test_with_constraints()
+    print('--- test out of core ---')
+    test_out_of_core()
+    print('--- test scaling ---')
+    test_scaling()
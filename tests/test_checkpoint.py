@@ -0,0 +1,243 @@
+import unittest
+import tempfile
+import threading
+import numpy as np
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import hmip.checkpoint as checkpoint
+from hmip.checkpoint import CheckpointWriter, load_checkpoint, save_checkpoint
+from hmip.hopfield import HopfieldSolver
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.H = np.array([[1, 1], [1, 10]])
+        self.q = np.array([-1, -6])
+        self.A = np.array([[1, 2]])
+        self.b = np.array([0.5])
+        self.k_max = 30
+        self.objective_function = lambda x: 1 / 2 * np.dot(
+            np.dot(x.T, self.H), x) + np.dot(self.q.T, x)
+        self.gradient = lambda x: np.dot(self.H, x) + self.q
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'solve.ckpt')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def setup_problem(self, solver):
+        return solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            np.array([0, 0]),
+            np.array([1, 1]),
+            np.array([1, 1]),
+            A_eq=self.A,
+            b_eq=self.b,
+            A_ineq=self.A,
+            b_ineq=self.b,
+            penalty_eq=10,
+            penalty_ineq=10)
+
+    def test_save_load(self):
+        random_state = np.random.RandomState(3)
+        random_state.rand(5)
+        save_checkpoint(self.file_path, dict({
+            'x': np.array([0.1, 0.2]),
+            'iterations': 4,
+            'incumbent': None,
+            'random_state': random_state.get_state(),
+            'config': dict({'step_type': 'classic', 'theta': 0.01}),
+        }))
+        self.assertFalse(os.path.exists(self.file_path + '.tmp'))
+        loaded = load_checkpoint(self.file_path)
+        np.testing.assert_array_equal(loaded['x'], np.array([0.1, 0.2]))
+        self.assertEqual(loaded['iterations'], 4)
+        self.assertIsNone(loaded['incumbent'])
+        self.assertEqual(loaded['config'],
+                         dict({'step_type': 'classic', 'theta': 0.01}))
+        other_random_state = np.random.RandomState()
+        other_random_state.set_state(loaded['random_state'])
+        np.testing.assert_array_equal(other_random_state.rand(3),
+                                      random_state.rand(3))
+
+    def test_writer_skips_when_busy(self):
+        event = threading.Event()
+        save = checkpoint.save_checkpoint
+
+        def slow_save(file_path, state):
+            event.wait()
+            save(file_path, state)
+
+        checkpoint.save_checkpoint = slow_save
+        try:
+            writer = CheckpointWriter(self.file_path)
+            self.assertTrue(writer.write(dict({'iterations': 1})))
+            self.assertFalse(writer.write(dict({'iterations': 2})))
+            event.set()
+            writer.close()
+        finally:
+            checkpoint.save_checkpoint = save
+        self.assertEqual((writer.written, writer.skipped), (1, 1))
+        self.assertEqual(load_checkpoint(self.file_path)['iterations'], 1)
+
+    def test_resume(self):
+        solver = HopfieldSolver(max_iterations=self.k_max, seed=0,
+                                precision_stopping_criterion=0,
+                                checkpoint_path=self.file_path,
+                                checkpoint_interval=10)
+        result = solver.solve(self.setup_problem(solver))
+        state = load_checkpoint(self.file_path)
+        self.assertEqual(state['iterations'] % 10, 0)
+
+        solver = HopfieldSolver(max_iterations=self.k_max, seed=1,
+                                precision_stopping_criterion=0)
+        resumed = solver.resume(self.setup_problem(solver), self.file_path)
+        self.assertEqual(resumed.iterations, result.iterations)
+        np.testing.assert_array_equal(resumed.x, result.x)
+        np.testing.assert_array_equal(resumed.x_h, result.x_h)
+        np.testing.assert_array_equal(resumed.slack_variable,
+                                      result.slack_variable)
+        np.testing.assert_array_equal(resumed.f_val_history,
+                                      result.f_val_history)
+
+    def test_resume_leaves_problem_unchanged(self):
+        options = dict({'max_iterations': self.k_max, 'seed': 0,
+                        'precision_stopping_criterion': 0,
+                        'direction_type': 'preconditioned'})
+        solver = HopfieldSolver(checkpoint_path=self.file_path,
+                                checkpoint_interval=10, **options)
+        problem = self.setup_problem(solver)
+        original = dict(problem)
+        solver.solve(problem)
+        self.assertEqual(problem.keys(), original.keys())
+        for key in problem:
+            self.assertIs(problem[key], original[key], key)
+
+        solver = HopfieldSolver(**options)
+        problem = self.setup_problem(solver)
+        problem['smoothness_coef'] = 2 * problem['smoothness_coef']
+        original = dict(problem)
+        solver.resume(problem, self.file_path)
+        self.assertEqual(problem.keys(), original.keys())
+        for key in problem:
+            self.assertIs(problem[key], original[key], key)
+
+    def test_resume_momentum(self):
+        options = dict({'max_iterations': self.k_max, 'seed': 0,
+                        'precision_stopping_criterion': 0,
+                        'direction_type': 'nesterov'})
+        solver = HopfieldSolver(checkpoint_path=self.file_path,
+                                checkpoint_interval=10, **options)
+        result = solver.solve(self.setup_problem(solver))
+        self.assertIsNotNone(load_checkpoint(self.file_path)['velocity'])
+
+        solver = HopfieldSolver(**options)
+        resumed = solver.resume(self.setup_problem(solver), self.file_path)
+        np.testing.assert_array_equal(resumed.x_h, result.x_h)
+        np.testing.assert_array_equal(resumed.f_val_history,
+                                      result.f_val_history)
+
+    def test_resume_barzilai_borwein(self):
+        options = dict({'max_iterations': self.k_max, 'seed': 0,
+                        'precision_stopping_criterion': 0,
+                        'step_type': 'barzilai_borwein'})
+        solver = HopfieldSolver(checkpoint_path=self.file_path,
+                                checkpoint_interval=10, **options)
+        result = solver.solve(self.setup_problem(solver))
+        self.assertIsNotNone(load_checkpoint(self.file_path)['previous_x_h'])
+
+        solver = HopfieldSolver(**options)
+        resumed = solver.resume(self.setup_problem(solver), self.file_path)
+        np.testing.assert_array_equal(resumed.x_h, result.x_h)
+        np.testing.assert_array_equal(resumed.f_val_history,
+                                      result.f_val_history)
+
+    def test_resume_beta_continuation(self):
+        options = dict({'max_iterations': self.k_max, 'seed': 0,
+                        'precision_stopping_criterion': 0,
+                        'beta_continuation': 'geometric',
+                        'beta_interval': 7})
+        solver = HopfieldSolver(checkpoint_path=self.file_path,
+                                checkpoint_interval=10, **options)
+        result = solver.solve(self.setup_problem(solver))
+        state = load_checkpoint(self.file_path)
+        self.assertGreater(np.max(state['beta']),
+                           np.max(state['initial_beta']))
+
+        solver = HopfieldSolver(**options)
+        resumed = solver.resume(self.setup_problem(solver), self.file_path)
+        np.testing.assert_array_equal(resumed.x_h, result.x_h)
+        np.testing.assert_array_equal(resumed.f_val_history,
+                                      result.f_val_history)
+        np.testing.assert_array_equal(solver.beta, state['initial_beta'])
+
+    def test_resume_penalty_adaptation(self):
+        options = dict({'max_iterations': self.k_max, 'seed': 0,
+                        'precision_stopping_criterion': 0,
+                        'penalty_adaptation': 'residual_balancing',
+                        'penalty_interval': 4})
+        solver = HopfieldSolver(checkpoint_path=self.file_path,
+                                checkpoint_interval=10, **options)
+        problem = self.setup_problem(solver)
+        result = solver.solve(problem)
+        state = load_checkpoint(self.file_path)
+
+        solver = HopfieldSolver(**options)
+        problem = self.setup_problem(solver)
+        resumed = solver.resume(problem, self.file_path)
+        np.testing.assert_array_equal(resumed.x_h, result.x_h)
+        np.testing.assert_array_equal(resumed.f_val_history,
+                                      result.f_val_history)
+        self.assertIsNotNone(state['penalty_x'])
+
+    def test_resume_dual_iterations(self):
+        options = dict({'max_iterations': self.k_max, 'seed': 0,
+                        'dual_iterations': 3, 'feasibility_tolerance': 0})
+        solver = HopfieldSolver(checkpoint_path=self.file_path,
+                                checkpoint_interval=5, **options)
+        result = solver.solve(self.setup_problem(solver))
+        state = load_checkpoint(self.file_path)
+        self.assertGreater(state['dual_iteration'], 0)
+
+        solver = HopfieldSolver(**options)
+        resumed = solver.resume(self.setup_problem(solver), self.file_path)
+        np.testing.assert_array_equal(resumed.x_h, result.x_h)
+        np.testing.assert_array_equal(resumed.constraint_residuals,
+                                      result.constraint_residuals)
+        np.testing.assert_array_equal(resumed.dual_variable_eq,
+                                      result.dual_variable_eq)
+
+    def test_resume_constraint_sampling(self):
+        options = dict({'max_iterations': self.k_max, 'seed': 0,
+                        'precision_stopping_criterion': 0,
+                        'constraint_batch_size': 1, 'snapshot_interval': 4})
+        solver = HopfieldSolver(checkpoint_path=self.file_path,
+                                checkpoint_interval=10, **options)
+        result = solver.solve(self.setup_problem(solver))
+        state = load_checkpoint(self.file_path)
+        self.assertIsNotNone(state['constraint_snapshot_x'])
+
+        solver = HopfieldSolver(**options)
+        resumed = solver.resume(self.setup_problem(solver), self.file_path)
+        np.testing.assert_array_equal(resumed.x_h, result.x_h)
+        np.testing.assert_array_equal(resumed.f_val_history,
+                                      result.f_val_history)
+        np.testing.assert_array_equal(resumed.slack_variable,
+                                      result.slack_variable)
+
+    def test_resume_different_max_iterations(self):
+        solver = HopfieldSolver(max_iterations=self.k_max,
+                                precision_stopping_criterion=0,
+                                checkpoint_path=self.file_path,
+                                checkpoint_interval=5)
+        solver.solve(self.setup_problem(solver))
+        solver = HopfieldSolver(max_iterations=self.k_max + 1)
+        with self.assertRaises(Exception):
+            solver.resume(self.setup_problem(solver), self.file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
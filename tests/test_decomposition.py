@@ -0,0 +1,123 @@
+import unittest
+import numpy as np
+import scipy.sparse
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hmip.decomposition import (ComponentSolver, DualDecompositionSolver,
+                                connected_components)
+
+
+class TestComponents(unittest.TestCase):
+    def setUp(self):
+        # two blocks {0, 1} and {2, 3} coupled by H, variable 4 alone, the
+        # constraint row couples 2 and 3
+        self.H = np.array([[2, 1, 0, 0, 0],
+                           [1, 2, 0, 0, 0],
+                           [0, 0, 2, 0, 0],
+                           [0, 0, 0, 2, 0],
+                           [0, 0, 0, 0, 1]])
+        self.q = np.array([-1, -1, -2, -1, -0.5])
+        self.A_ineq = np.array([[0, 0, 1, 1, 0]])
+        self.b_ineq = np.array([1])
+        self.n = 5
+
+    def test_connected_components(self):
+        num_components, labels = connected_components(self.n, self.H)
+        self.assertEqual(num_components, 4)
+        num_components, labels = connected_components(
+            self.n, scipy.sparse.csr_matrix(self.H), A_ineq=self.A_ineq)
+        self.assertEqual(num_components, 3)
+        self.assertEqual(labels[0], labels[1])
+        self.assertEqual(labels[2], labels[3])
+        self.assertEqual(len(set(labels)), 3)
+
+    def test_solve(self):
+        solver = ComponentSolver(solver_options={'max_iterations': 50},
+                                 processes=1)
+        result = solver.solve(self.H, self.q, np.zeros(self.n),
+                              np.ones(self.n), np.array([1, 1, 1, 1, 0]),
+                              A_ineq=self.A_ineq, b_ineq=self.b_ineq,
+                              penalty_ineq=10)
+        self.assertEqual(len(solver.component_results), 3)
+        self.assertEqual(result.x.shape, (self.n,))
+        self.assertEqual(result.dual_variable_ineq.shape, (1,))
+        self.assertAlmostEqual(
+            result.objective,
+            1 / 2 * np.dot(result.x, np.dot(self.H, result.x)) +
+            np.dot(self.q, result.x))
+        # the isolated continuous variable minimizes 1/2 x^2 - 0.5 x
+        self.assertAlmostEqual(result.x[4], 0.5, places=2)
+
+    def test_solve_parallel(self):
+        options = {'max_iterations': 50, 'seed': 0}
+        serial = ComponentSolver(solver_options=options, processes=1).solve(
+            self.H, self.q, np.zeros(self.n), np.ones(self.n),
+            np.array([1, 1, 1, 1, 0]), A_ineq=self.A_ineq,
+            b_ineq=self.b_ineq, penalty_ineq=10)
+        parallel = ComponentSolver(solver_options=options, processes=2).solve(
+            self.H, self.q, np.zeros(self.n), np.ones(self.n),
+            np.array([1, 1, 1, 1, 0]), A_ineq=self.A_ineq,
+            b_ineq=self.b_ineq, penalty_ineq=10)
+        np.testing.assert_allclose(parallel.x, serial.x)
+
+
+class TestDualDecomposition(unittest.TestCase):
+    def setUp(self):
+        # three blocks of two binaries, at most two variables can be 1
+        self.n = 6
+        self.H = np.eye(self.n)
+        self.q = -np.array([3, 2.5, 2, 1.5, 1.2, 1.0])
+        self.C = np.ones((1, self.n))
+        self.d = np.array([2.])
+        self.blocks = np.repeat([0, 1, 2], 2)
+        self.options = {'max_iterations': 100, 'seed': 0}
+
+    def solve(self, processes):
+        solver = DualDecompositionSolver(solver_options=self.options,
+                                         processes=processes,
+                                         max_iterations=30)
+        result = solver.solve(self.H, self.q, np.zeros(self.n),
+                              np.ones(self.n), np.ones(self.n),
+                              C_ineq=self.C, d_ineq=self.d,
+                              blocks=self.blocks)
+        return solver, result
+
+    def test_solve(self):
+        solver, result = self.solve(1)
+        np.testing.assert_array_equal(result.x, np.array([1, 1, 0, 0, 0, 0]))
+        self.assertAlmostEqual(result.objective, -4.5)
+        self.assertEqual(result.status, 'converged')
+        self.assertGreater(result.dual_variable_ineq[0], 0)
+        self.assertEqual(len(solver.dual_values), result.iterations)
+        self.assertLess(solver.residuals[-1], solver.precision)
+
+    def test_solve_parallel(self):
+        _, serial = self.solve(1)
+        _, parallel = self.solve(2)
+        np.testing.assert_array_equal(parallel.x, serial.x)
+        np.testing.assert_allclose(parallel.dual_variable_ineq,
+                                   serial.dual_variable_ineq)
+
+    def test_no_iteration(self):
+        solver = DualDecompositionSolver(solver_options=self.options,
+                                         processes=1, max_iterations=0)
+        result = solver.solve(self.H, self.q, np.zeros(self.n),
+                              np.ones(self.n), np.ones(self.n),
+                              C_ineq=self.C, d_ineq=self.d,
+                              blocks=self.blocks)
+        self.assertEqual(result.iterations, 0)
+        self.assertEqual(result.status, 'max_iterations')
+        np.testing.assert_array_equal(result.x, np.zeros(self.n))
+
+    def test_block_constraint_across_blocks(self):
+        solver = DualDecompositionSolver(processes=1)
+        with self.assertRaises(Exception):
+            solver.solve(self.H, self.q, np.zeros(self.n), np.ones(self.n),
+                         np.ones(self.n), A_ineq=self.C, b_ineq=self.d,
+                         blocks=self.blocks)
+
+
+if __name__ == '__main__':
+    unittest.main()
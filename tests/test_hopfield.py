@@ -1,14 +1,30 @@
 import unittest
+import logging
+import time
 import numpy as np
 import cvxpy as cvx
+import scipy.sparse.linalg
 
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 
 from hmip.hopfield import HopfieldSolver
+from hmip.telemetry import RingBufferSink
 import hmip.utils as utils
 
 
+class CountingMatrix(scipy.sparse.csr_matrix):
+    """
+    Sparse matrix counting the products with all its rows
+    """
+    full_products = 0
+
+    def dot(self, other):
+        if self.shape[0] == CountingMatrix.rows:
+            CountingMatrix.full_products += 1
+        return super().dot(other)
+
+
 class TestHopfield(unittest.TestCase):
     def setUp(self):
         self.H = np.array([[1, 1], [1, 10]])
@@ -41,7 +57,7 @@ class TestHopfield(unittest.TestCase):
         x, x_h, f_val_hist, step_size, _ = solver.solve(
             problem)
         self.assertEqual(x.shape[0], self.q.shape[0])
-        self.assertEqual(x.shape[1], 2)
+        self.assertEqual(x.shape[1], self.k_max)
 
     def test_hopfield_step_type_classic(self):
         solver = HopfieldSolver(max_iterations=self.k_max, step_type='classic')
@@ -55,7 +71,7 @@ class TestHopfield(unittest.TestCase):
         x, x_h, f_val_hist, step_size, _ = solver.solve(
             problem)
         self.assertEqual(x.shape[0], self.q.shape[0])
-        self.assertEqual(x.shape[1], 2)
+        self.assertEqual(x.shape[1], self.k_max)
 
     def test_hopfield_step_type_armijo(self):
         solver = HopfieldSolver(max_iterations=self.k_max, step_type='armijo')
@@ -69,7 +85,7 @@ class TestHopfield(unittest.TestCase):
         x, x_h, f_val_hist, step_size, _ = solver.solve(
             problem)
         self.assertEqual(x.shape[0], self.q.shape[0])
-        self.assertEqual(x.shape[1], 1)
+        self.assertEqual(x.shape[1], self.k_max)
 
     def test_hopfield_with_absorption(self):
         solver = HopfieldSolver(max_iterations=self.k_max,
@@ -146,6 +162,736 @@ class TestHopfield(unittest.TestCase):
         self.assertTrue(abs(dual_variables_ineq[0] - dual_variables_ineq_cvxpy[0]) <= 0.1)
         self.assertTrue(abs(dual_variables_eq[0] - dual_variables_eq_cvxpy[0]) <= 0.2)
 
+    def test_linear_operator_constraints(self):
+        A = scipy.sparse.linalg.aslinearoperator(self.A)
+        H = scipy.sparse.linalg.aslinearoperator(self.H)
+        solver = HopfieldSolver()
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            lambda x: H.matvec(x) + self.q,
+            self.lb,
+            self.ub,
+            self.binary_indicator,
+            A_eq=A,
+            b_eq=self.b,
+            A_ineq=A,
+            b_ineq=self.b,
+            smoothness_coef=utils.smoothness_coefficient(H),
+            penalty_eq=self.penalty,
+            penalty_ineq=self.penalty)
+        dual_variables_eq, dual_variables_ineq = solver._get_dual_variables(
+            problem)
+        dual_variables_eq_cvxpy, dual_variables_ineq_cvxpy = get_dual_variables_cvxpy_solver(self.H, self.q, self.lb, self.ub,
+               A_ineq=self.A, b_ineq=self.b, A_eq=self.A, b_eq=self.b)
+        self.assertTrue(abs(dual_variables_ineq[0] - dual_variables_ineq_cvxpy[0]) <= 0.1)
+        self.assertTrue(abs(dual_variables_eq[0] - dual_variables_eq_cvxpy[0]) <= 0.2)
+
+        x, _, _, _, _ = solver.solve(problem)
+        self.assertEqual(x.shape[0], self.q.shape[0])
+
+    def test_value_and_grad_constraints_problem(self):
+        solver = HopfieldSolver()
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            self.lb,
+            self.ub,
+            self.binary_indicator,
+            A_eq=self.A,
+            b_eq=self.b,
+            A_ineq=self.A,
+            b_ineq=self.b,
+            smoothness_coef=self.smoothness_coefficient,
+            penalty_eq=self.penalty,
+            penalty_ineq=self.penalty)
+        variables = (np.array([0.2, 0.7]), np.array([-0.1]))
+        dual = np.array([0.5])
+        objective_function, gradient, value_and_grad, _ = \
+            solver._all_constraints_problem(problem, dual, dual)
+        value, grad = value_and_grad(variables)
+        self.assertAlmostEqual(value, objective_function(variables))
+        self.assertTrue(np.allclose(grad, gradient(variables)))
+
+        objective_function, gradient, value_and_grad = \
+            solver._equality_constraints_problem(problem, dual)
+        value, grad = value_and_grad(variables[0])
+        self.assertAlmostEqual(value, objective_function(variables[0]))
+        self.assertTrue(np.allclose(grad, gradient(variables[0])))
+
+    def test_constraint_operator_gram(self):
+        variables = (np.array([0.2, 0.7]), np.array([-0.1]))
+        dual = np.array([0.5])
+        results = []
+        for constraint_operator in ['gram', 'matvec']:
+            solver = HopfieldSolver(constraint_operator=constraint_operator)
+            problem = solver.setup_optimization_problem(
+                self.objective_function,
+                self.gradient,
+                self.lb,
+                self.ub,
+                self.binary_indicator,
+                A_eq=self.A,
+                b_eq=self.b,
+                A_ineq=self.A,
+                b_ineq=self.b,
+                smoothness_coef=self.smoothness_coefficient,
+                penalty_eq=self.penalty,
+                penalty_ineq=self.penalty)
+            _, _, value_and_grad, _ = solver._all_constraints_problem(
+                problem, dual, dual)
+            results.append(value_and_grad(variables) +
+                           solver._get_dual_variables(problem))
+            self.assertEqual(problem['gram_eq'] is not None,
+                             constraint_operator == 'gram')
+        for gram_result, matvec_result in zip(*results):
+            self.assertTrue(np.allclose(gram_result, matvec_result))
+
+    def test_constraint_products_shared(self):
+        counts = {'matvec': 0}
+
+        def matvec(x):
+            counts['matvec'] += 1
+            return np.dot(self.A, x)
+
+        A = scipy.sparse.linalg.LinearOperator(
+            self.A.shape, matvec=matvec, rmatvec=lambda y: np.dot(self.A.T, y),
+            dtype=float)
+        solver = HopfieldSolver(max_iterations=self.k_max)
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            self.lb,
+            self.ub,
+            self.binary_indicator,
+            A_ineq=A,
+            b_ineq=self.b,
+            smoothness_coef=self.smoothness_coefficient,
+            penalty_ineq=self.penalty,
+            dual_ineq=np.array([0.5]))
+        _, _, f_val_hist, _, _ = solver.solve(problem)
+        self.assertEqual(counts['matvec'], np.sum(~np.isnan(f_val_hist)))
+
+    def test_user_value_and_grad(self):
+        counts = {'value_and_grad': 0}
+
+        def value_and_grad(x):
+            counts['value_and_grad'] += 1
+            return self.objective_function(x), self.gradient(x)
+
+        solver = HopfieldSolver(max_iterations=self.k_max)
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            self.lb,
+            self.ub,
+            self.binary_indicator,
+            smoothness_coef=self.smoothness_coefficient,
+            value_and_grad=value_and_grad)
+        _, _, f_val_hist, _, _ = solver.solve(problem)
+        self.assertEqual(counts['value_and_grad'],
+                         np.sum(~np.isnan(f_val_hist)))
+
+    def test_logging(self):
+        solver = HopfieldSolver(max_iterations=self.k_max)
+        with self.assertLogs('hmip.hopfield', level='INFO') as logs:
+            problem = solver.setup_optimization_problem(
+                self.objective_function,
+                self.gradient,
+                self.lb,
+                self.ub,
+                self.binary_indicator,
+                smoothness_coef=self.smoothness_coefficient)
+            solver.solve(problem)
+        self.assertTrue(any('Candidate solution found' in message
+                            for message in logs.output))
+
+    def test_logging_quiet(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger('hmip.hopfield')
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        try:
+            solver = HopfieldSolver(max_iterations=self.k_max, verbose=False)
+            problem = solver.setup_optimization_problem(
+                self.objective_function,
+                self.gradient,
+                self.lb,
+                self.ub,
+                self.binary_indicator,
+                verbose=True)
+            solver.solve(problem)
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(logging.NOTSET)
+        self.assertEqual(records, [])
+
+    def test_time_limit_returns_incumbent(self):
+        solver = HopfieldSolver(max_iterations=self.k_max, time_limit=0)
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            self.lb,
+            self.ub,
+            self.binary_indicator,
+            smoothness_coef=self.smoothness_coefficient)
+        result = solver.solve(problem)
+        self.assertEqual(result.status, 'time_limit')
+        self.assertEqual(result.iterations, 0)
+        np.testing.assert_array_equal(result.x, result.incumbent)
+        self.assertTrue(np.all(np.isin(result.x, [0, 1])))
+        self.assertEqual(result.objective,
+                         self.objective_function(result.incumbent))
+
+    def test_gradient_evaluation_limit(self):
+        solver = HopfieldSolver(max_iterations=self.k_max,
+                                gradient_evaluation_limit=5)
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            self.lb,
+            self.ub,
+            self.binary_indicator,
+            smoothness_coef=self.smoothness_coefficient)
+        result = solver.solve(problem)
+        self.assertEqual(result.status, 'gradient_evaluation_limit')
+        self.assertEqual(result.iterations, 4)
+
+    def test_time_limit_covers_dual_variables(self):
+        random_state = np.random.RandomState(0)
+        n = 100
+        B = random_state.rand(n, n)
+        H = np.dot(B.T, B) / n
+        objective_function, gradient = utils.quadratic_objective(
+            H, random_state.rand(n) - 0.5)
+        A = random_state.rand(120, n)
+        b = np.dot(A, 0.5 * np.ones(n))
+        for budget in [dict({'time_limit': 0.2}),
+                       dict({'gradient_evaluation_limit': 50})]:
+            solver = HopfieldSolver(max_iterations=100, seed=0, **budget)
+            problem = solver.setup_optimization_problem(
+                objective_function, gradient, np.zeros(n), np.ones(n),
+                np.ones(n), A_eq=A[:60], b_eq=b[:60], A_ineq=A[60:],
+                b_ineq=b[60:], penalty_eq=1, penalty_ineq=1,
+                smoothness_coef=utils.smoothness_coefficient(H))
+            t = time.perf_counter()
+            result = solver.solve(problem)
+            # the dual phase alone takes much longer without the budget
+            self.assertLess(time.perf_counter() - t, 1)
+            self.assertEqual(result.status, list(budget)[0])
+            self.assertEqual(result.iterations, 0)
+            self.assertTrue(np.all(np.isfinite(result.x)))
+
+    def test_incumbent_interval_auto(self):
+        self.assertIsNone(HopfieldSolver()._incumbent_interval())
+        self.assertEqual(HopfieldSolver(time_limit=1)._incumbent_interval(),
+                         10)
+        self.assertEqual(HopfieldSolver(
+            gradient_evaluation_limit=5)._incumbent_interval(), 10)
+        # the limits in effect at the solve are used
+        solver = HopfieldSolver()
+        solver.time_limit = 1
+        self.assertEqual(solver._incumbent_interval(), 10)
+        self.assertIsNone(HopfieldSolver(time_limit=1, incumbent_interval=None)
+                          ._incumbent_interval())
+
+    def test_incumbent_evaluations_in_budget(self):
+        solver = HopfieldSolver(max_iterations=self.k_max,
+                                gradient_evaluation_limit=5,
+                                incumbent_interval=1)
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            self.lb,
+            self.ub,
+            self.binary_indicator,
+            smoothness_coef=self.smoothness_coefficient)
+        result = solver.solve(problem)
+        self.assertEqual(result.status, 'gradient_evaluation_limit')
+        # one gradient and one incumbent objective evaluation per iteration
+        self.assertEqual(result.iterations, 2)
+
+    def test_incumbent_feasible(self):
+        solver = HopfieldSolver(max_iterations=self.k_max,
+                                incumbent_interval=1)
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            self.lb,
+            self.ub,
+            self.binary_indicator,
+            A_ineq=self.A,
+            b_ineq=self.b,
+            smoothness_coef=self.smoothness_coefficient,
+            penalty_ineq=self.penalty)
+        result = solver.solve(problem)
+        self.assertEqual(result.status, 'max_iterations')
+        if result.incumbent is not None:
+            self.assertTrue(np.all(np.dot(self.A, result.incumbent)
+                                   <= self.b + 10**-6))
+            self.assertTrue(np.all(np.isin(result.incumbent, [0, 1])))
+
+    def test_stopping_criteria(self):
+        problem = dict({'binary_indicator': np.array([1, 0]),
+                        'lb': np.array([0, 0]),
+                        'ub': np.array([1, 1])})
+        solver = HopfieldSolver(
+            max_iterations=100, stopping_window=2,
+            stopping_criterion_type=['binary_pattern', 'absorption'])
+        x = np.array([0.9995, 0.5])
+        grad_f = np.ones(2)
+        stagnation = dict({'pattern': None, 'unchanged': 0, 'met': []})
+        self.assertTrue(solver._stopping_criterion_met(x, grad_f, 0, problem,
+                                                       None, stagnation))
+        self.assertEqual(stagnation['met'], ['absorption'])
+
+        solver.stopping_criterion_combination = 'and'
+        stagnation = dict({'pattern': None, 'unchanged': 0, 'met': []})
+        met = [solver._stopping_criterion_met(x, grad_f, k, problem, None,
+                                              stagnation) for k in range(3)]
+        self.assertEqual(met, [False, False, True])
+
+        solver = HopfieldSolver(max_iterations=100, stopping_window=2,
+                                stopping_criterion_type='objective')
+        f_val_hist = np.array([3, 2, 1, 1, 1])
+        met = [solver._stopping_criterion_met(x, grad_f, k, problem,
+                                              f_val_hist) for k in range(5)]
+        self.assertEqual(met, [False, False, False, False, True])
+
+    def test_stopping_criterion_type_error(self):
+        with self.assertRaises(Exception):
+            HopfieldSolver(stopping_criterion_type='unknown')
+        with self.assertRaises(Exception):
+            HopfieldSolver(stopping_criterion_combination='xor')
+
+    def test_stagnation_saves_iterations(self):
+        solver = HopfieldSolver(max_iterations=200, stopping_window=5,
+                                stopping_criterion_type=['gradient',
+                                                         'binary_pattern'],
+                                instrumentation=True)
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            self.lb,
+            self.ub,
+            self.binary_indicator,
+            smoothness_coef=self.smoothness_coefficient)
+        with self.assertLogs('hmip.hopfield', level='INFO') as logs:
+            result = solver.solve(problem)
+        self.assertEqual(result.status, 'converged')
+        self.assertLess(result.iterations, 199)
+        self.assertEqual(
+            solver.instrumentation.report()['counters']['iterations_saved'],
+            199 - result.iterations)
+        self.assertTrue(any('iterations saved' in message
+                            for message in logs.output))
+
+    def test_warm_start(self):
+        def setup(solver, warm_start=None):
+            return solver.setup_optimization_problem(
+                self.objective_function,
+                self.gradient,
+                self.lb,
+                self.ub,
+                np.array([0, 1]),
+                A_ineq=self.A,
+                b_ineq=self.b,
+                smoothness_coef=self.smoothness_coefficient,
+                penalty_ineq=self.penalty,
+                warm_start=warm_start)
+
+        options = dict({'max_iterations': 500, 'stopping_window': 5,
+                        'stopping_criterion_type': ['gradient', 'objective'],
+                        'relative_improvement_tolerance': 10**-4})
+        solver = HopfieldSolver(**options)
+        result = solver.solve(setup(solver))
+
+        solver = HopfieldSolver(instrumentation=True, **options)
+        problem = setup(solver, warm_start=result)
+        np.testing.assert_array_equal(problem['x_h_0'], result.x_h)
+        np.testing.assert_array_equal(problem['dual_ineq'],
+                                      result.dual_variable_ineq)
+        self.assertNotIn('initial_ascent',
+                         solver.instrumentation.report()['timings'])
+        warm_result = solver.solve(problem)
+        self.assertLess(warm_result.iterations, result.iterations)
+        self.assertLessEqual(warm_result.iterations, 10)
+
+        solver = HopfieldSolver(**options)
+        problem = setup(solver, warm_start=result.to_dict())
+        np.testing.assert_array_equal(problem['slack_0'],
+                                      result.slack_variable)
+
+    def test_warm_start_size_mismatch(self):
+        solver = HopfieldSolver(max_iterations=self.k_max)
+        with self.assertLogs('hmip.hopfield', level='WARNING'):
+            problem = solver.setup_optimization_problem(
+                self.objective_function,
+                self.gradient,
+                self.lb,
+                self.ub,
+                self.binary_indicator,
+                smoothness_coef=self.smoothness_coefficient,
+                warm_start=dict({'x_h': np.array([0.5, 0.5, 0.5])}))
+        self.assertIsNone(problem['x_h_0'])
+
+    def test_momentum(self):
+        # ill-conditioned QP with a few binary variables
+        random_state = np.random.RandomState(100)
+        n = 100
+        V, _ = np.linalg.qr(random_state.randn(n, n))
+        H = V.dot(np.diag(np.logspace(-3, 0, n))).dot(V.T)
+        objective_function, gradient = utils.quadratic_objective(
+            H, 0.1 * random_state.randn(n))
+        binary_indicator = np.zeros(n)
+        binary_indicator[:n // 4] = 1
+
+        f_val = dict()
+        for direction_type in ['classic', 'heavy_ball', 'nesterov']:
+            solver = HopfieldSolver(max_iterations=300, seed=0,
+                                    direction_type=direction_type,
+                                    instrumentation=True)
+            problem = solver.setup_optimization_problem(
+                objective_function, gradient, np.zeros(n), np.ones(n),
+                binary_indicator)
+            f_val[direction_type] = solver.solve(problem).f_val_history
+        target = np.nanmin(f_val['classic'])
+        for direction_type in ['heavy_ball', 'nesterov']:
+            reached = np.nonzero(f_val[direction_type] <= target)[0]
+            self.assertGreater(len(reached), 0)
+            self.assertLess(reached[0], 100)
+
+    def test_momentum_restart(self):
+        solver = HopfieldSolver(max_iterations=100, seed=0, momentum=0.99,
+                                direction_type='heavy_ball',
+                                instrumentation=True)
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            self.lb,
+            self.ub,
+            np.array([0, 0]),
+            smoothness_coef=self.smoothness_coefficient)
+        result = solver.solve(problem)
+        self.assertGreater(
+            solver.instrumentation.report()['counters']['momentum_restarts'],
+            0)
+        self.assertTrue(np.all(np.isfinite(result.f_val_history)))
+
+    def test_step_types(self):
+        random_state = np.random.RandomState(20)
+        n = 20
+        V, _ = np.linalg.qr(random_state.randn(n, n))
+        H = V.dot(np.diag(np.logspace(-3, 0, n))).dot(V.T)
+        objective_function, gradient = utils.quadratic_objective(
+            H, 0.1 * random_state.randn(n))
+        binary_indicator = np.zeros(n)
+        binary_indicator[:n // 4] = 1
+
+        f_val = dict()
+        for step_type in ['classic', 'barzilai_borwein', 'exact']:
+            solver = HopfieldSolver(max_iterations=300, seed=0,
+                                    direction_type='classic',
+                                    step_type=step_type)
+            problem = solver.setup_optimization_problem(
+                objective_function, gradient, np.zeros(n), np.ones(n),
+                binary_indicator, hessian=H)
+            f_val[step_type] = solver.solve(problem).f_val_history
+        target = np.nanmin(f_val['classic'])
+        for step_type in ['barzilai_borwein', 'exact']:
+            reached = np.nonzero(f_val[step_type] <= target)[0]
+            self.assertGreater(len(reached), 0)
+            self.assertLess(reached[0], 50)
+
+    def test_exact_step_needs_hessian(self):
+        solver = HopfieldSolver(max_iterations=self.k_max, step_type='exact')
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            self.lb,
+            self.ub,
+            self.binary_indicator,
+            smoothness_coef=self.smoothness_coefficient)
+        with self.assertRaises(Exception):
+            solver.solve(problem)
+
+    def test_preconditioned_direction(self):
+        # curvatures from 0.01 to 100 and sparse constraints
+        random_state = np.random.RandomState(20)
+        n = 20
+        scales = np.logspace(-2, 2, n)
+        random_state.shuffle(scales)
+        V, _ = np.linalg.qr(random_state.randn(n, n))
+        H = 0.1 * V.dot(np.diag(random_state.rand(n))).dot(V.T) + \
+            np.diag(scales)
+        objective_function, gradient = utils.quadratic_objective(
+            H, 0.5 * scales * random_state.randn(n))
+        A = np.zeros((5, n))
+        for row in range(5):
+            A[row, random_state.choice(n, 3, replace=False)] = \
+                random_state.rand(3)
+        b = np.dot(A, random_state.rand(n))
+        binary_indicator = np.zeros(n)
+        binary_indicator[:n // 4] = 1
+
+        f_val = dict()
+        for direction_type in ['classic', 'preconditioned']:
+            solver = HopfieldSolver(max_iterations=300, seed=0,
+                                    direction_type=direction_type,
+                                    instrumentation=True)
+            problem = solver.setup_optimization_problem(
+                objective_function, gradient, np.zeros(n), np.ones(n),
+                binary_indicator, A_eq=A, b_eq=b, penalty_eq=10,
+                dual_eq=np.zeros(5))
+            f_val[direction_type] = solver.solve(problem).f_val_history
+        np.testing.assert_allclose(solver._preconditioner(problem)[0],
+                                   np.diag(H) + 10 * np.sum(A**2, axis=0),
+                                   atol=0.1)
+        self.assertIn('preconditioner',
+                      solver.instrumentation.report()['timings'])
+        target = np.nanmin(f_val['classic'])
+        reached = np.nonzero(f_val['preconditioned'] <= target)[0]
+        self.assertGreater(len(reached), 0)
+        self.assertLess(reached[0], 100)
+
+    def test_beta_continuation(self):
+        for beta_continuation in ['geometric', 'adaptive']:
+            solver = HopfieldSolver(max_iterations=200, seed=0, beta=1,
+                                    beta_continuation=beta_continuation,
+                                    beta_interval=10, beta_max=16,
+                                    precision_stopping_criterion=0,
+                                    instrumentation=True)
+            problem = solver.setup_optimization_problem(
+                self.objective_function,
+                self.gradient,
+                self.lb,
+                self.ub,
+                np.array([1, 0]),
+                smoothness_coef=self.smoothness_coefficient)
+            result = solver.solve(problem)
+            # 1, 2, 4, 8, 16
+            self.assertEqual(solver.instrumentation.report()['counters'][
+                'beta_increases'], 4)
+            np.testing.assert_array_equal(solver.beta, np.ones(2))
+            np.testing.assert_allclose(
+                solver._activation(result.x_h, self.ub, self.lb), result.x)
+
+        with self.assertRaises(Exception):
+            HopfieldSolver(beta_continuation='linear')
+
+    def test_penalty_adaptation(self):
+        penalties = dict()
+        for penalty in [10**-2, 10**4]:
+            solver = HopfieldSolver(max_iterations=300, seed=0,
+                                    penalty_adaptation='residual_balancing',
+                                    instrumentation=True)
+            problem = solver.setup_optimization_problem(
+                self.objective_function,
+                self.gradient,
+                self.lb,
+                self.ub,
+                np.array([0, 0]),
+                A_eq=self.A,
+                b_eq=self.b,
+                smoothness_coef=self.smoothness_coefficient,
+                penalty_eq=penalty)
+            result = solver.solve(problem)
+            self.assertGreater(solver.instrumentation.report()['counters'][
+                'penalty_updates'], 0)
+            self.assertLess(np.linalg.norm(np.dot(self.A, result.x) - self.b),
+                            10**-2)
+            penalties[penalty] = result.penalty_eq
+            # the problem keeps the given penalty for the next solve
+            self.assertEqual(problem['penalty_eq'], penalty)
+        self.assertGreater(penalties[10**-2], 10**-2)
+        self.assertLess(penalties[10**4], 10**4)
+
+        with self.assertRaises(Exception):
+            HopfieldSolver(penalty_adaptation='increasing')
+
+    def test_balanced_penalty(self):
+        solver = HopfieldSolver(penalty_balance=10, penalty_factor=2,
+                                penalty_max=100)
+        self.assertEqual(solver._balanced_penalty(4, 1, 0.01), 8)
+        self.assertEqual(solver._balanced_penalty(4, 0.01, 1), 2)
+        self.assertEqual(solver._balanced_penalty(4, 1, 1), 4)
+        self.assertEqual(solver._balanced_penalty(0, 1, 0), 1)
+        self.assertEqual(solver._balanced_penalty(80, 1, 0), 100)
+        self.assertEqual(solver._balanced_penalty(0.011, 0, 1), 0.01)
+
+    def test_remap_x_h(self):
+        problem = dict({'binary_indicator': np.array([1, 1, 0]),
+                        'lb': np.zeros(3), 'ub': np.ones(3)})
+        solver = HopfieldSolver(activation_type='tanh')
+        solver.beta = np.array([10, 10, 1])
+        x = np.array([0.3, 1, 0.6])
+        x_h = np.array([0.45, 5, 0.7])
+        remapped = solver._remap_x_h(x, x_h, problem)
+        self.assertEqual(remapped[1], 5)
+        self.assertEqual(remapped[2], 0.7)
+        self.assertAlmostEqual(
+            solver._activation(remapped, problem['ub'], problem['lb'])[0],
+            0.3)
+
+    def test_dual_iterations(self):
+        random_state = np.random.RandomState(1)
+        V = random_state.randn(6, 6)
+        H = V.dot(V.T) / 6
+        objective_function, gradient = utils.quadratic_objective(
+            H, random_state.randn(6))
+        # one variable equal to 1 in each group of 3
+        A = np.kron(np.eye(2), np.ones(3))
+        residuals = dict()
+        for dual_iterations in [1, 10]:
+            solver = HopfieldSolver(max_iterations=100, seed=0,
+                                    dual_iterations=dual_iterations,
+                                    instrumentation=True)
+            problem = solver.setup_optimization_problem(
+                objective_function, gradient, np.zeros(6), np.ones(6),
+                np.ones(6), A_eq=A, b_eq=np.ones(2), penalty_eq=1,
+                smoothness_coef=utils.smoothness_coefficient(H))
+            result = solver.solve(problem)
+            residuals[dual_iterations] = solver._constraint_residuals(
+                solver._round_binaries(result.x, problem), problem)[0]
+        self.assertIsNone(self.solver.solve(
+            self.solver.setup_optimization_problem(
+                self.objective_function, self.gradient, self.lb, self.ub,
+                self.binary_indicator)).constraint_residuals)
+        self.assertGreater(residuals[1], 0)
+        self.assertEqual(residuals[10], 0)
+        self.assertLessEqual(len(result.constraint_residuals), 10)
+        self.assertEqual(result.constraint_residuals[-1, 0], 0)
+        self.assertTrue(np.isnan(result.constraint_residuals[-1, 1]))
+        self.assertEqual(solver.instrumentation.report()['counters'][
+            'dual_iterations'], len(result.constraint_residuals))
+
+    def test_unsaturate(self):
+        problem = dict({'lb': np.zeros(3), 'ub': np.array([1, 1, 2])})
+        solver = HopfieldSolver(dual_restart_margin=0.25)
+        solver.beta = np.ones(3)
+        x, x_h = solver.unsaturate(np.array([-20, 0.5, 40]), problem)
+        np.testing.assert_allclose(x, np.array([0.25, 0.5, 1.5]))
+        self.assertEqual(x_h[1], 0.5)
+
+    def test_constraint_sampling_estimate(self):
+        random_state = np.random.RandomState(0)
+        n, m = 5, 400
+        A_eq = random_state.rand(m, n)
+        b_eq = A_eq.dot(random_state.rand(n))
+        A_ineq = random_state.rand(m, n)
+        b_ineq = A_ineq.dot(0.5 * np.ones(n))
+        dual_eq, dual_ineq = random_state.rand(m), random_state.rand(m)
+        x, y = random_state.rand(n), random_state.rand(n)
+        value_and_grad = dict()
+        for batch_size in [None, 50]:
+            solver = HopfieldSolver(constraint_batch_size=batch_size, seed=0,
+                                    snapshot_interval=10**4)
+            # only the constraint terms
+            problem = solver.setup_optimization_problem(
+                lambda x: 0, lambda x: np.zeros(n), np.zeros(n), np.ones(n),
+                np.zeros(n), A_eq=A_eq, b_eq=b_eq, A_ineq=A_ineq,
+                b_ineq=b_ineq, penalty_eq=2, penalty_ineq=3,
+                smoothness_coef=1)
+            value_and_grad[batch_size], _ = solver._augmented_lagrangian(
+                problem, dual_eq, dual_ineq)
+
+        def full(point):
+            # the eliminated slack variable minimizes the augmented Lagrangian
+            slack = np.minimum(0, A_ineq.dot(point) - b_ineq + dual_ineq / 3)
+            return value_and_grad[None]((point, slack))
+
+        # exact at the snapshot, unbiased elsewhere
+        value, gradient = value_and_grad[50](x)
+        self.assertAlmostEqual(value, full(x)[0])
+        np.testing.assert_allclose(gradient, full(x)[1])
+        estimates = [value_and_grad[50](y) for _ in range(2000)]
+        self.assertAlmostEqual(np.mean([e[0] for e in estimates]),
+                               full(y)[0], delta=1)
+        np.testing.assert_allclose(np.mean([e[1] for e in estimates], axis=0),
+                                   full(y)[1], atol=1)
+
+    def test_constraint_sampling(self):
+        random_state = np.random.RandomState(0)
+        n, m = 5, 1000
+        A = random_state.rand(m, n)
+        b = A.dot(random_state.rand(n))
+        solver = HopfieldSolver(max_iterations=300, seed=0,
+                                constraint_batch_size=20,
+                                snapshot_interval=20, instrumentation=True)
+        problem = solver.setup_optimization_problem(
+            lambda x: np.dot(x, x) / 2, lambda x: x, np.zeros(n), np.ones(n),
+            np.zeros(n), A_eq=A[:m // 2], b_eq=b[:m // 2], A_ineq=A[m // 2:],
+            b_ineq=b[m // 2:] - 0.1, penalty_eq=0.1, penalty_ineq=0.1,
+            smoothness_coef=1)
+        result = solver.solve(problem)
+        self.assertLess(np.linalg.norm(A[:m // 2].dot(result.x) - b[:m // 2])
+                        / np.sqrt(m // 2), 0.05)
+        self.assertEqual(result.slack_variable.shape, (m // 2,))
+        self.assertTrue(np.all(result.slack_variable <= 0))
+        self.assertGreater(solver.instrumentation.report()['counters'][
+            'constraint_snapshots'], 1)
+
+        problem['penalty_ineq'] = 0
+        with self.assertRaises(Exception):
+            solver.solve(problem)
+        problem['penalty_ineq'] = 1
+        problem['A_ineq'] = scipy.sparse.linalg.aslinearoperator(A[m // 2:])
+        with self.assertRaises(Exception):
+            solver.solve(problem)
+
+    def test_constraint_sampling_dual_iterations(self):
+        random_state = np.random.RandomState(0)
+        n, m = 5, 400
+        A = random_state.rand(m, n)
+        b = A.dot(0.5 * np.ones(n))
+        solver = HopfieldSolver(max_iterations=50, seed=0,
+                                constraint_batch_size=20, dual_iterations=2,
+                                instrumentation=True)
+        problem = solver.setup_optimization_problem(
+            lambda x: -np.sum(x), lambda x: -np.ones(n), np.zeros(n),
+            np.ones(n), np.zeros(n), A_ineq=A, b_ineq=b, penalty_ineq=1,
+            smoothness_coef=1)
+        result = solver.solve(problem)
+        self.assertEqual(solver.instrumentation.report()['counters'][
+            'dual_iterations'], 2)
+        self.assertEqual(result.constraint_residuals.shape, (2, 2))
+        self.assertEqual(result.slack_variable.shape, (m,))
+
+    def test_constraint_sampling_full_passes(self):
+        random_state = np.random.RandomState(0)
+        n, m = 5, 400
+        A = random_state.rand(m, n)
+        CountingMatrix.rows = m
+        CountingMatrix.full_products = 0
+        sink = RingBufferSink()
+        # the time limit enables the incumbent checks
+        solver = HopfieldSolver(max_iterations=100, seed=0,
+                                constraint_batch_size=20,
+                                snapshot_interval=50, time_limit=60,
+                                telemetry=sink, telemetry_interval=1,
+                                instrumentation=True)
+        problem = solver.setup_optimization_problem(
+            lambda x: -np.sum(x), lambda x: -np.ones(n), np.zeros(n),
+            np.ones(n), np.zeros(n), A_ineq=CountingMatrix(A),
+            b_ineq=A.dot(0.5 * np.ones(n)), penalty_ineq=1,
+            smoothness_coef=1)
+        result = solver.solve(problem)
+        self.assertEqual(result.iterations, 99)
+        self.assertIsNone(sink.to_list()[-1]['residual_ineq'])
+        # the snapshots, the incumbent check and the slack at the end
+        self.assertEqual(CountingMatrix.full_products,
+                         solver.instrumentation.report()['counters'][
+                             'constraint_snapshots'] + 2)
+
+    def test_round_binaries(self):
+        problem = dict({'binary_indicator': np.array([1, 0, 1]),
+                        'lb': np.array([0, 0, -1]),
+                        'ub': np.array([1, 1, 3])})
+        np.testing.assert_array_equal(
+            self.solver._round_binaries(np.array([0.4, 0.4, 1.2]), problem),
+            np.array([0, 0.4, 3]))
+
 
 class TestOthers(unittest.TestCase):
     def setUp(self):
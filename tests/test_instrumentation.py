@@ -0,0 +1,91 @@
+import unittest
+import tracemalloc
+import numpy as np
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hmip.hopfield import HopfieldSolver
+from hmip.instrumentation import Instrumentation, NullInstrumentation
+import hmip.utils as utils
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.H = np.array([[1, 1], [1, 10]])
+        self.q = np.array([-1, -6])
+        self.A = np.array([[1, 2]])
+        self.b = np.array([0.5])
+        self.k_max = 20
+        self.objective_function = lambda x: 1 / 2 * np.dot(
+            np.dot(x.T, self.H), x) + np.dot(self.q.T, x)
+        self.gradient = lambda x: np.dot(self.H, x) + self.q
+
+    def solve(self, solver, **kwargs):
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            np.array([0, 0]),
+            np.array([1, 1]),
+            np.array([1, 1]),
+            A_eq=self.A,
+            b_eq=self.b,
+            penalty_eq=10,
+            **kwargs)
+        return solver.solve(problem)
+
+    def test_disabled_by_default(self):
+        solver = HopfieldSolver(max_iterations=self.k_max)
+        self.assertIsInstance(solver.instrumentation, NullInstrumentation)
+        self.solve(solver)
+        self.assertEqual(solver.instrumentation.report(), dict())
+
+    def test_report(self):
+        solver = HopfieldSolver(max_iterations=self.k_max,
+                                step_type='armijo',
+                                instrumentation=True)
+        result = self.solve(solver)
+        report = solver.instrumentation.report()
+        for phase in ['setup', 'smoothness_estimation', 'initial_ascent',
+                      'dual_variables', 'main_loop']:
+            self.assertIn(phase, report['timings'])
+        self.assertEqual(report['counters']['iterations'], result.iterations)
+        self.assertEqual(report['counters']['objective_evaluations'],
+                         1 + result.iterations +
+                         report['counters']['armijo_backtracks'])
+        self.assertTrue(report['counters']['gradient_evaluations'] >=
+                        report['counters']['objective_evaluations'])
+        self.assertEqual(len(report['series']['absorbed_variables']),
+                         result.iterations)
+
+    def test_callback(self):
+        reports = []
+        solver = HopfieldSolver(max_iterations=self.k_max,
+                                instrumentation=reports.append)
+        self.solve(solver, smoothness_coef=utils.smoothness_coefficient(self.H))
+        self.assertEqual(len(reports), 1)
+        self.assertNotIn('smoothness_estimation', reports[0]['timings'])
+
+    def test_allocations(self):
+        instrumentation = Instrumentation(track_allocations=True)
+        solver = HopfieldSolver(max_iterations=self.k_max,
+                                instrumentation=instrumentation)
+        self.solve(solver)
+        self.assertIn('main_loop', instrumentation.report()['allocations'])
+        # the tracing started by the instrumentation stops with the solve
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_allocations_user_tracing(self):
+        tracemalloc.start()
+        try:
+            instrumentation = Instrumentation(track_allocations=True)
+            solver = HopfieldSolver(max_iterations=self.k_max,
+                                    instrumentation=instrumentation)
+            self.solve(solver)
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
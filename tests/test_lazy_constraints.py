@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hmip.hopfield import HopfieldSolver
+from hmip.lazy_constraints import LazyConstraintSolver, constraint_residual
+import hmip.utils as utils
+
+
+class TestLazyConstraints(unittest.TestCase):
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.n = 10
+        self.m = 500
+        V = random_state.randn(self.n, self.n)
+        self.H = V.dot(V.T) / self.n + np.eye(self.n)
+        # the unconstrained minimum is outside of the feasible set
+        self.objective_function, self.gradient = utils.quadratic_objective(
+            self.H, -self.H.dot(1.5 * random_state.rand(self.n)))
+        self.A = scipy.sparse.random(self.m, self.n, density=0.3,
+                                     random_state=random_state, format='csr')
+        self.b = self.A.dot(0.5 * np.ones(self.n)) + \
+            random_state.exponential(0.5, self.m)
+        self.binary_indicator = np.zeros(self.n)
+        self.binary_indicator[:2] = 1
+
+    def solve(self, lazy_solver, A):
+        return lazy_solver.solve(
+            self.objective_function, self.gradient, np.zeros(self.n),
+            np.ones(self.n), self.binary_indicator, A, self.b,
+            penalty_ineq=10,
+            smoothness_coef=utils.smoothness_coefficient(self.H))
+
+    def test_constraint_residual(self):
+        x = np.linspace(0, 1, self.n)
+        expected = self.A.dot(x) - self.b
+        np.testing.assert_allclose(
+            constraint_residual(self.A, self.b, x, chunk_size=7), expected)
+        np.testing.assert_allclose(
+            constraint_residual(self.A.toarray(), self.b, x, chunk_size=7),
+            expected)
+
+    def test_lazy_constraints(self):
+        solver = HopfieldSolver(max_iterations=300, seed=0, dual_iterations=3)
+        lazy_solver = LazyConstraintSolver(solver, rows_per_scan=20,
+                                           tolerance=10**-3)
+        result = self.solve(lazy_solver, self.A)
+        self.assertGreater(len(lazy_solver.rounds), 1)
+        self.assertEqual(lazy_solver.rounds[0]['working_set'], 0)
+        self.assertEqual(lazy_solver.rounds[-1]['added'], 0)
+        self.assertLess(len(lazy_solver.working_set), self.m / 2)
+        self.assertLessEqual(max(r['added'] for r in lazy_solver.rounds), 20)
+        self.assertEqual(result.slack_variable.shape, (self.m,))
+        self.assertEqual(result.dual_variable_ineq.shape, (self.m,))
+        residual = self.A.dot(result.x) - self.b
+        outside = np.ones(self.m, dtype=bool)
+        outside[lazy_solver.working_set] = False
+        self.assertLessEqual(np.max(residual[outside]), 10**-3)
+        self.assertLess(np.max(residual), 0.1)
+
+    def test_linear_operator(self):
+        solver = HopfieldSolver(max_iterations=10)
+        with self.assertRaises(Exception):
+            self.solve(LazyConstraintSolver(solver),
+                       scipy.sparse.linalg.aslinearoperator(self.A))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import tempfile
+import numpy as np
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hmip.hopfield import HopfieldSolver
+from hmip.out_of_core import MemmapMatrix
+import hmip.utils as utils
+
+
+class TestMemmapMatrix(unittest.TestCase):
+    def setUp(self):
+        self.n = 50
+        B = np.random.rand(self.n, self.n)
+        self.H = np.dot(B.T, B) / self.n
+        self.q = np.random.rand(self.n) - 0.5
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'H.npy')
+        np.save(self.file_path, self.H)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_matvec(self):
+        x = np.random.rand(self.n)
+        for prefetch in [True, False]:
+            H = MemmapMatrix(self.file_path, block_size=7, prefetch=prefetch)
+            self.assertTrue(np.allclose(H.matvec(x), np.dot(self.H, x)))
+            self.assertTrue(np.allclose(H.rmatvec(x), np.dot(self.H.T, x)))
+
+    def test_raw_file(self):
+        file_path = os.path.join(self.directory.name, 'H.bin')
+        self.H.tofile(file_path)
+        H = MemmapMatrix(file_path, shape=self.H.shape, block_size=16)
+        x = np.random.rand(self.n)
+        self.assertTrue(np.allclose(H.matvec(x), np.dot(self.H, x)))
+
+    def test_statistics(self):
+        H = MemmapMatrix(self.file_path, block_size=16)
+        H.matvec(np.ones(self.n))
+        statistics = H.statistics()
+        self.assertEqual(statistics['bytes_read'], self.H.nbytes)
+        self.assertEqual(statistics['number_products'], 1)
+        self.assertTrue(statistics['effective_bandwidth'] > 0)
+
+    def test_quadratic_value_and_grad(self):
+        H = MemmapMatrix(self.file_path, block_size=16)
+        value_and_grad = utils.quadratic_value_and_grad(H, self.q)
+        x = np.random.rand(self.n)
+        value, grad = value_and_grad(x)
+        self.assertAlmostEqual(
+            value, 1 / 2 * np.dot(x, np.dot(self.H, x)) + np.dot(self.q, x))
+        self.assertTrue(np.allclose(grad, np.dot(self.H, x) + self.q))
+        # H is read once for both the value and the gradient
+        statistics = H.statistics()
+        self.assertEqual(statistics['bytes_read'], self.H.nbytes)
+        self.assertEqual(statistics['number_products'], 1)
+
+    def test_solve(self):
+        H = MemmapMatrix(self.file_path, block_size=16)
+        objective_function, gradient = utils.quadratic_objective(H, self.q)
+        solver = HopfieldSolver(max_iterations=20)
+        problem = solver.setup_optimization_problem(
+            objective_function,
+            gradient,
+            np.zeros(self.n),
+            np.ones(self.n),
+            np.ones(self.n),
+            smoothness_coef=utils.smoothness_coefficient(H))
+        x, _, _, _, _ = solver.solve(problem)
+        self.assertEqual(x.shape[0], self.n)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import numpy as np
+import scipy.sparse
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hmip.hopfield import HopfieldSolver
+from hmip.presolve import presolve
+import hmip.utils as utils
+
+
+class TestPresolve(unittest.TestCase):
+    def setUp(self):
+        self.n = 5
+        self.H = np.eye(self.n)
+        self.q = np.array([-1, -2, 1, -1, 0.5])
+        self.objective_function, self.gradient = utils.quadratic_objective(
+            self.H, self.q)
+        self.lb = np.zeros(self.n)
+        self.ub = np.ones(self.n)
+        self.binary_indicator = np.array([1, 1, 1, 0, 0])
+
+    def presolve(self, **kwargs):
+        return presolve(self.objective_function, self.gradient, self.lb,
+                        self.ub, self.binary_indicator, **kwargs)
+
+    def test_fixed_variables(self):
+        self.lb[2] = 1
+        A_ineq = np.array([[1, 1, 1, 0, 0], [0, 0, 1, 1, 1]])
+        reduced, postsolve = self.presolve(A_ineq=A_ineq,
+                                           b_ineq=np.array([2, 2]))
+        np.testing.assert_array_equal(postsolve.columns,
+                                      np.array([0, 1, 3, 4]))
+        np.testing.assert_array_equal(reduced['b_ineq'], np.array([1, 1]))
+        np.testing.assert_array_equal(reduced['A_ineq'],
+                                      np.array([[1, 1, 0, 0], [0, 0, 1, 1]]))
+        y = np.array([0.1, 0.2, 0.3, 0.4])
+        x = postsolve.expand(y)
+        np.testing.assert_array_equal(x, np.array([0.1, 0.2, 1, 0.3, 0.4]))
+        self.assertEqual(reduced['objective_function'](y),
+                         self.objective_function(x))
+        np.testing.assert_array_equal(reduced['gradient'](y),
+                                      self.gradient(x)[[0, 1, 3, 4]])
+
+    def test_singleton_and_empty_rows(self):
+        A_eq = np.array([[0, 0, 0, 2, 0], [0, 0, 0, 0, 0]])
+        A_ineq = np.array([[0, 0, 0, 0, 2]])
+        reduced, postsolve = self.presolve(A_eq=A_eq, b_eq=np.array([1, 0]),
+                                           A_ineq=A_ineq,
+                                           b_ineq=np.array([1]))
+        self.assertIsNone(reduced['A_eq'])
+        self.assertIsNone(reduced['A_ineq'])
+        self.assertEqual(postsolve.x_fixed[3], 0.5)
+        self.assertEqual(reduced['ub'][-1], 0.5)
+        self.assertEqual(postsolve.statistics['removed_rows_eq'], 2)
+
+    def test_duplicate_rows(self):
+        A_ineq = scipy.sparse.csr_matrix(np.array([[1, 1, 1, 1, 1],
+                                                   [2, 2, 2, 2, 2],
+                                                   [1, 1, 0, 1, 0]]))
+        reduced, postsolve = self.presolve(A_ineq=A_ineq,
+                                           b_ineq=np.array([4, 6, 2]))
+        self.assertEqual(reduced['A_ineq'].shape, (2, 5))
+        np.testing.assert_array_equal(reduced['b_ineq'], np.array([6, 2]))
+        np.testing.assert_array_equal(postsolve.rows_ineq, np.array([1, 2]))
+
+        with self.assertRaises(Exception):
+            self.presolve(A_eq=np.array([[1, 1, 0, 0, 0], [2, 2, 0, 0, 0]]),
+                          b_eq=np.array([1, 1]))
+
+    def test_activity_bounds(self):
+        # x_0 + x_1 + 2 x_2 <= 1.5: the binary x_2 must be 0
+        A_ineq = np.array([[1, 1, 2, 0, 0]])
+        reduced, postsolve = self.presolve(A_ineq=A_ineq,
+                                           b_ineq=np.array([1.5]))
+        self.assertEqual(postsolve.x_fixed[2], 0)
+        self.assertNotIn(2, postsolve.columns)
+        self.assertEqual(postsolve.statistics['removed_variables'], 1)
+
+        # redundant row
+        reduced, postsolve = self.presolve(A_ineq=np.array([[1, 1, 0, 0, 0]]),
+                                           b_ineq=np.array([3]))
+        self.assertIsNone(reduced['A_ineq'])
+
+    def test_infeasible(self):
+        with self.assertRaises(Exception):
+            self.presolve(A_eq=np.array([[0, 0, 0, 0, 0]]), b_eq=np.array([1]))
+
+    def test_solve_and_postsolve(self):
+        self.lb[2] = 1
+        A_ineq = np.array([[1, 1, 1, 0, 0], [1, 1, 1, 0, 0]])
+        reduced, postsolve = self.presolve(A_ineq=A_ineq,
+                                           b_ineq=np.array([2, 2]))
+        solver = HopfieldSolver(max_iterations=20)
+        problem = solver.setup_optimization_problem(penalty_ineq=10,
+                                                    **reduced)
+        result = postsolve.result(solver.solve(problem))
+        self.assertEqual(result.x.shape, (self.n,))
+        self.assertEqual(result.x[2], 1)
+        self.assertEqual(result.dual_variable_ineq.shape, (2,))
+        self.assertEqual(result.dual_variable_ineq[1], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import pickle
+import numpy as np
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hmip.hopfield import HopfieldSolver
+from hmip.result import SolveResult
+import hmip.utils as utils
+
+
+class TestSolveResult(unittest.TestCase):
+    def setUp(self):
+        self.H = np.array([[1, 1], [1, 10]])
+        self.q = np.array([-1, -6])
+        self.A = np.array([[1, 2]])
+        self.b = np.array([0.5])
+        self.k_max = 20
+        self.objective_function = lambda x: 1 / 2 * np.dot(
+            np.dot(x.T, self.H), x) + np.dot(self.q.T, x)
+        self.gradient = lambda x: np.dot(self.H, x) + self.q
+        self.solver = HopfieldSolver(max_iterations=self.k_max)
+        self.problem = self.solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            np.array([0, 0]),
+            np.array([1, 1]),
+            np.array([1, 1]),
+            A_eq=self.A,
+            b_eq=self.b,
+            A_ineq=self.A,
+            b_ineq=self.b,
+            smoothness_coef=utils.smoothness_coefficient(self.H),
+            penalty_eq=10,
+            penalty_ineq=10)
+
+    def test_result(self):
+        result = self.solver.solve(self.problem)
+        self.assertIsInstance(result, SolveResult)
+        self.assertEqual(result.x_history.shape[1], result.iterations + 1)
+        self.assertEqual(result.step_size_history.shape[0], result.iterations)
+        self.assertFalse(np.isnan(result.x_history).any())
+        self.assertFalse(np.isnan(result.f_val_history).any())
+        self.assertTrue(np.array_equal(result.x, result.x_history[:, -1]))
+        self.assertEqual(result.objective, result.f_val_history[-1])
+        self.assertEqual(result.slack_variable.shape, self.b.shape)
+        self.assertTrue(result.solve_time > 0)
+
+    def test_all_saturated(self):
+        # the gradient pushes every variable to a bound: once they are all
+        # saturated the step is 0 and the last iterate stays finite
+        solver = HopfieldSolver(max_iterations=200)
+        problem = solver.setup_optimization_problem(
+            lambda x: np.dot(self.q, x),
+            lambda x: 1. * self.q,
+            np.array([0, 0]),
+            np.array([1, 1]),
+            np.array([1, 1]),
+            smoothness_coef=1)
+        result = solver.solve(problem)
+        self.assertFalse(np.isnan(result.x_history).any())
+        self.assertFalse(np.isnan(result.x_h_history).any())
+        self.assertTrue(np.allclose(result.x, np.ones(2)))
+
+    def test_history_views(self):
+        result = self.solver.solve(self.problem)
+        self.assertTrue(np.shares_memory(result.x_history, result.x))
+        self.assertTrue(np.shares_memory(result.x_h_history, result.x_h))
+
+    def test_unpack(self):
+        result = self.solver.solve(self.problem)
+        x, x_h, f_val_hist, step_size, other_dict = result
+        self.assertEqual(x.shape, x_h.shape)
+        self.assertEqual(len(f_val_hist), x.shape[1])
+        self.assertTrue(np.array_equal(other_dict['dual_variable_ineq'],
+                                       result.dual_variable_ineq))
+        self.assertEqual(other_dict['slack_variable'].shape[1], x.shape[1])
+
+    def test_serialization(self):
+        result = self.solver.solve(self.problem)
+        d = result.to_dict()
+        self.assertNotIn('history', d)
+        loaded = SolveResult.from_dict(d)
+        self.assertTrue(np.allclose(loaded.x, result.x))
+        self.assertEqual(loaded.iterations, result.iterations)
+        self.assertEqual(loaded.status, result.status)
+        self.assertFalse(loaded.has_history)
+        self.assertTrue(isinstance(result.to_json(), str))
+        self.assertIsNone(loaded.constraint_residuals)
+        self.assertEqual(loaded.penalty_eq, 10)
+        self.assertEqual(loaded.penalty_ineq, 10)
+
+        result.constraint_residuals = np.array([[1, np.nan], [0, np.nan]])
+        loaded = SolveResult.from_dict(result.to_dict())
+        np.testing.assert_array_equal(loaded.constraint_residuals,
+                                      result.constraint_residuals)
+
+        loaded = SolveResult.from_dict(result.to_dict(include_history=True))
+        self.assertTrue(np.allclose(loaded.x_history, result.x_history))
+
+        loaded = pickle.loads(pickle.dumps(result))
+        self.assertEqual(loaded._history['x'].shape[1], result.iterations + 1)
+        self.assertTrue(np.allclose(loaded.f_val_history,
+                                    result.f_val_history))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import numpy as np
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hmip.hopfield import HopfieldSolver
+from hmip.result import SolveResult
+from hmip.rolling_horizon import RollingHorizonSolver, shift_warm_start
+
+
+class TestRollingHorizon(unittest.TestCase):
+    def setUp(self):
+        # each period has a binary and a continuous variable with
+        # x_binary + x_continuous = 1 and a price changing with the period
+        self.num_periods = 4
+        self.n = 2 * self.num_periods
+        self.H = np.eye(self.n)
+        self.A = np.kron(np.eye(self.num_periods), np.array([[1, 1]]))
+        self.b = np.ones(self.num_periods)
+        self.k_max = 50
+        self.gradient_calls = 0
+
+    def build_problem(self, window):
+        prices = np.sin(np.arange(window, window + self.num_periods))
+        q = np.kron(prices, np.array([1, -1]))
+
+        def gradient(x):
+            self.gradient_calls += 1
+            return np.dot(self.H, x) + q
+
+        return dict({
+            'objective_function': lambda x: 1 / 2 * np.dot(
+                np.dot(x.T, self.H), x) + np.dot(q.T, x),
+            'gradient': gradient,
+            'lb': np.zeros(self.n),
+            'ub': np.ones(self.n),
+            'binary_indicator': np.tile(np.array([1, 0]), self.num_periods),
+            'A_eq': self.A,
+            'b_eq': self.b,
+            'penalty_eq': 10,
+        })
+
+    def test_shift_warm_start(self):
+        result = SolveResult(np.arange(4.), np.arange(4.), 0, 1,
+                             dual_variable_eq=np.array([1., 2.]))
+        warm_start = shift_warm_start(result, 2, eq_rows_per_period=1)
+        np.testing.assert_array_equal(warm_start['x_h'],
+                                      np.array([2, 3, 2, 3]))
+        np.testing.assert_array_equal(warm_start['dual_variable_eq'],
+                                      np.array([2, 2]))
+        self.assertIsNone(warm_start['slack_variable'])
+
+    def test_run(self):
+        solver = HopfieldSolver(max_iterations=self.k_max)
+        driver = RollingHorizonSolver(solver, self.build_problem, 2,
+                                      eq_rows_per_period=1)
+        committed = driver.run(3)
+        self.assertEqual(committed.shape, (3, 2))
+        self.assertEqual(len(driver.windows), 3)
+        self.assertEqual([window['warm_start'] for window in driver.windows],
+                         [False, True, True])
+        self.assertEqual(len(driver.latencies()), 3)
+        self.assertIsNotNone(driver._structure['smoothness_coef'])
+        self.assertIsNotNone(driver._structure['squared_norm_eq'])
+
+    def test_reuse_structure(self):
+        solver = HopfieldSolver(max_iterations=1)
+        driver = RollingHorizonSolver(solver, self.build_problem, 2,
+                                      eq_rows_per_period=1)
+        driver.solve_window(0)
+        self.gradient_calls = 0
+        driver.solve_window(1)
+        # smoothness estimation and dual computation are skipped: only the
+        # initial evaluation of the solve remains
+        self.assertEqual(self.gradient_calls, 1)
+
+    def test_window_time_limit(self):
+        solver = HopfieldSolver(max_iterations=self.k_max, time_limit=100)
+        driver = RollingHorizonSolver(solver, self.build_problem, 2,
+                                      eq_rows_per_period=1,
+                                      window_time_limit=0)
+        driver.run(2)
+        self.assertEqual([window['status'] for window in driver.windows],
+                         ['time_limit', 'time_limit'])
+        self.assertEqual(solver.time_limit, 100)
+
+
+    def test_window_time_limit_tracks_incumbent(self):
+        # the incumbent interval 'auto' follows the budget of the window
+        solver = HopfieldSolver(max_iterations=self.k_max)
+        checks = {'count': 0}
+        update_incumbent = solver._update_incumbent
+
+        def counted_update_incumbent(*args):
+            checks['count'] += 1
+            return update_incumbent(*args)
+        solver._update_incumbent = counted_update_incumbent
+        driver = RollingHorizonSolver(solver, self.build_problem, 2,
+                                      eq_rows_per_period=1,
+                                      window_time_limit=100)
+        driver.solve_window(0)
+        self.assertGreater(checks['count'], 1)
+        self.assertIsNone(solver.time_limit)
+        self.assertIsNone(solver._incumbent_interval())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hmip.hopfield import HopfieldSolver
+from hmip.result import SolveResult
+from hmip.scaling import scale_problem, Scaling
+import hmip.utils as utils
+
+
+class TestScaling(unittest.TestCase):
+    def setUp(self):
+        self.n = 4
+        self.H = np.diag([1, 1, 100, 0.01])
+        self.q = np.array([-1, 1, -50, 0.1])
+        self.objective_function, self.gradient = utils.quadratic_objective(
+            self.H, self.q)
+        self.lb = np.zeros(self.n)
+        self.ub = np.array([1, 1, 1, 100])
+        self.binary_indicator = np.array([1, 1, 0, 0])
+        self.A_eq = np.array([[1000, 0, 1000, 10]])
+        self.b_eq = np.array([1000])
+        self.A_ineq = np.array([[1, 1, 0, 0], [0, 0, 0.001, 0.0001]])
+        self.b_ineq = np.array([1, 0.01])
+
+    def scale(self, **kwargs):
+        return scale_problem(self.objective_function, self.gradient, self.lb,
+                             self.ub, self.binary_indicator, A_eq=self.A_eq,
+                             b_eq=self.b_eq, A_ineq=self.A_ineq,
+                             b_ineq=self.b_ineq, H=self.H, **kwargs)
+
+    def test_equilibrated(self):
+        scaled, scaling = self.scale(max_iterations=100, tolerance=10**-6)
+        np.testing.assert_array_equal(scaling.column_scale[:2], np.ones(2))
+        for key in ['A_eq', 'A_ineq']:
+            row_norm = np.max(np.abs(scaled[key]), axis=1)
+            np.testing.assert_allclose(row_norm, 1, rtol=10**-4)
+        H_scaled = np.diag(scaling.column_scale).dot(self.H).dot(
+            np.diag(scaling.column_scale))
+        column_norm = np.max(np.abs(np.vstack(
+            (scaled['A_eq'], scaled['A_ineq'], H_scaled))), axis=0)
+        np.testing.assert_allclose(column_norm[2:], 1, rtol=10**-4)
+        np.testing.assert_array_equal(scaled['lb'][:2], self.lb[:2])
+        np.testing.assert_array_equal(scaled['ub'][:2], self.ub[:2])
+        self.assertAlmostEqual(scaled['smoothness_coef'],
+                               np.max(np.diag(H_scaled)))
+
+    def test_scaled_problem_is_equivalent(self):
+        scaled, scaling = self.scale()
+        y = np.array([1, 0, 0.3, 2]) / scaling.column_scale
+        x = scaling.unscale(y)
+        self.assertAlmostEqual(scaled['objective_function'](y),
+                               self.objective_function(x))
+        np.testing.assert_allclose(
+            scaled['gradient'](y),
+            scaling.column_scale * self.gradient(x))
+        np.testing.assert_allclose(
+            np.dot(scaled['A_eq'], y) - scaled['b_eq'],
+            scaling.row_scale_eq * (np.dot(self.A_eq, x) - self.b_eq))
+        np.testing.assert_allclose(
+            np.dot(scaled['A_ineq'], y) - scaled['b_ineq'],
+            scaling.row_scale_ineq * (np.dot(self.A_ineq, x) - self.b_ineq))
+
+    def test_sparse(self):
+        self.A_eq = scipy.sparse.csr_matrix(self.A_eq)
+        self.A_ineq = scipy.sparse.csr_matrix(self.A_ineq)
+        self.H = scipy.sparse.csr_matrix(self.H)
+        scaled, _ = self.scale()
+        self.assertTrue(scipy.sparse.issparse(scaled['A_eq']))
+        dense, _ = scale_problem(self.objective_function, self.gradient,
+                                 self.lb, self.ub, self.binary_indicator,
+                                 A_eq=self.A_eq.toarray(), b_eq=self.b_eq,
+                                 A_ineq=self.A_ineq.toarray(),
+                                 b_ineq=self.b_ineq, H=self.H.toarray())
+        np.testing.assert_allclose(scaled['A_eq'].toarray(), dense['A_eq'])
+
+    def test_penalties(self):
+        scaled, scaling = self.scale(penalty_eq=10, penalty_ineq=20)
+        for key, penalty in [('eq', 10), ('ineq', 20)]:
+            row_scale = getattr(scaling, 'row_scale_' + key)
+            # the mean penalty of the rows is the original one
+            self.assertAlmostEqual(
+                np.mean(scaled['penalty_' + key] * row_scale**2), penalty)
+        self.assertNotIn('penalty_eq', self.scale()[0])
+
+    def test_result(self):
+        scaling = Scaling(np.array([1, 2]), np.array([10]), np.array([4]))
+        result = scaling.result(SolveResult(
+            np.array([1, 3]), np.array([1, 3]), 5, 10,
+            slack_variable=np.array([8]), dual_variable_eq=np.array([1]),
+            dual_variable_ineq=np.array([2]), status='converged',
+            incumbent=np.array([1, 1]), incumbent_objective=4,
+            penalty_eq=1, penalty_ineq=2))
+        np.testing.assert_array_equal(result.x, np.array([1, 6]))
+        np.testing.assert_array_equal(result.slack_variable, np.array([2]))
+        np.testing.assert_array_equal(result.dual_variable_eq,
+                                      np.array([10]))
+        np.testing.assert_array_equal(result.dual_variable_ineq,
+                                      np.array([8]))
+        np.testing.assert_array_equal(result.incumbent, np.array([1, 2]))
+        self.assertEqual(result.penalty_eq, 100)
+        self.assertEqual(result.penalty_ineq, 32)
+        self.assertEqual(result.status, 'converged')
+
+    def test_solve(self):
+        scaled, scaling = self.scale(penalty_eq=10, penalty_ineq=10)
+        solver = HopfieldSolver(max_iterations=200, seed=0)
+        problem = solver.setup_optimization_problem(**scaled)
+        result = scaling.result(solver.solve(problem))
+        self.assertTrue(np.all(result.x >= self.lb - 10**-6))
+        self.assertTrue(np.all(result.x <= self.ub + 10**-6))
+        self.assertEqual(len(result.dual_variable_eq), 1)
+
+    def test_linear_operator(self):
+        with self.assertRaises(Exception):
+            scale_problem(self.objective_function, self.gradient, self.lb,
+                          self.ub, self.binary_indicator,
+                          A_eq=scipy.sparse.linalg.aslinearoperator(
+                              self.A_eq), b_eq=self.b_eq)
+
+
+if __name__ == '__main__':
+    unittest.main()
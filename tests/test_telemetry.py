@@ -0,0 +1,197 @@
+import unittest
+import json
+import tempfile
+import threading
+import time
+import numpy as np
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from hmip.hopfield import HopfieldSolver
+from hmip.telemetry import (AsyncSink, JsonLinesSink, MultiSink,
+                            PrometheusTextfileSink, RingBufferSink,
+                            TelemetrySink, get_sink)
+
+
+class SlowSink(TelemetrySink):
+    def __init__(self):
+        self.event = threading.Event()
+        self.records = []
+
+    def write(self, record):
+        self.event.wait()
+        self.records.append(record)
+
+
+class SleepingSink(TelemetrySink):
+    def __init__(self, delay):
+        self.delay = delay
+        self.records = []
+        self.closed = threading.Event()
+
+    def write(self, record):
+        time.sleep(self.delay)
+        self.records.append(record)
+
+    def close(self):
+        self.closed.set()
+
+
+class TestTelemetry(unittest.TestCase):
+    def setUp(self):
+        self.H = np.array([[1, 1], [1, 10]])
+        self.q = np.array([-1, -6])
+        self.A = np.array([[1, 2]])
+        self.b = np.array([0.5])
+        self.k_max = 20
+        self.objective_function = lambda x: 1 / 2 * np.dot(
+            np.dot(x.T, self.H), x) + np.dot(self.q.T, x)
+        self.gradient = lambda x: np.dot(self.H, x) + self.q
+
+    def solve(self, solver):
+        problem = solver.setup_optimization_problem(
+            self.objective_function,
+            self.gradient,
+            np.array([0, 0]),
+            np.array([1, 1]),
+            np.array([1, 1]),
+            A_eq=self.A,
+            b_eq=self.b,
+            A_ineq=self.A,
+            b_ineq=self.b,
+            penalty_eq=10,
+            penalty_ineq=10)
+        return solver.solve(problem)
+
+    def test_ring_buffer(self):
+        sink = RingBufferSink(capacity=3)
+        for k in range(5):
+            sink.write(dict({'iteration': k}))
+        self.assertEqual([r['iteration'] for r in sink.to_list()], [2, 3, 4])
+
+    def test_get_sink(self):
+        self.assertIsNone(get_sink(None))
+        sink = RingBufferSink()
+        self.assertIs(get_sink(sink), sink)
+        json_sink = get_sink(JsonLinesSink('unused.jsonl'))
+        self.assertIsInstance(json_sink, AsyncSink)
+        json_sink.close()
+        multi_sink = get_sink([sink])
+        self.assertIsInstance(multi_sink, MultiSink)
+
+    def test_json_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'telemetry.jsonl')
+            sink = JsonLinesSink(file_path)
+            sink.write(dict({'iteration': 1, 'objective': float('nan')}))
+            sink.write(dict({'iteration': 2, 'objective': 1.5}))
+            sink.close()
+            with open(file_path) as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual(records, [{'iteration': 1, 'objective': None},
+                                   {'iteration': 2, 'objective': 1.5}])
+
+    def test_prometheus_textfile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'hmip.prom')
+            sink = PrometheusTextfileSink(file_path, labels={'job': 'test'})
+            sink.write(dict({'iteration': 1, 'objective': 2.0,
+                             'residual_eq': None}))
+            sink.write(dict({'iteration': 2, 'objective': 1.0,
+                             'residual_eq': None}))
+            with open(file_path) as f:
+                text = f.read()
+            self.assertFalse(os.path.exists(file_path + '.tmp'))
+        self.assertIn('# TYPE hmip_objective gauge', text)
+        self.assertIn('hmip_objective{job="test"} 1.0', text)
+        self.assertIn('hmip_iteration{job="test"} 2.0', text)
+        self.assertNotIn('residual_eq', text)
+
+    def test_async_sink_drops_under_backpressure(self):
+        slow_sink = SlowSink()
+        sink = AsyncSink(slow_sink, max_queue_size=2)
+        for k in range(10):
+            sink.write(dict({'iteration': k}))
+        # one record is being written, two are queued
+        self.assertGreaterEqual(sink.dropped, 7)
+        self.assertFalse(sink.flush(timeout=0.01))
+        slow_sink.event.set()
+        self.assertTrue(sink.flush(timeout=5))
+        sink.close()
+        self.assertEqual(len(slow_sink.records) + sink.dropped, 10)
+
+    def test_solve_streams_records(self):
+        sink = RingBufferSink()
+        solver = HopfieldSolver(max_iterations=self.k_max, telemetry=sink,
+                                telemetry_interval=3)
+        result = self.solve(solver)
+        records = sink.to_list()
+        iterations = [record['iteration'] for record in records]
+        self.assertEqual(iterations[-1], result.iterations)
+        self.assertEqual(iterations[:-1],
+                         list(range(3, result.iterations + 1, 3))[
+                             :len(iterations) - 1])
+        for key in ['time', 'objective', 'gradient_precision', 'step_size',
+                    'absorbed_fraction', 'residual_eq', 'residual_ineq']:
+            self.assertIsInstance(records[-1][key], float)
+        self.assertAlmostEqual(records[-1]['objective'], result.objective)
+
+    def test_solve_closes_json_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'telemetry.jsonl')
+            sink = JsonLinesSink(file_path)
+            solver = HopfieldSolver(max_iterations=self.k_max,
+                                    telemetry=sink, telemetry_interval=1)
+            result = self.solve(solver)
+            # every record is in the file once solve returns
+            self.assertIsNone(sink._file)
+            with open(file_path) as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual([record['iteration'] for record in records],
+                             list(range(1, result.iterations + 1)))
+            # the sink is reopened by the next solve
+            result_2 = self.solve(solver)
+            with open(file_path) as f:
+                self.assertEqual(len(f.readlines()),
+                                 result.iterations + result_2.iterations)
+            self.assertIsNone(sink._file)
+
+    def test_slow_sink_does_not_block_solve(self):
+        slow_sink = SleepingSink(0.2)
+        sink = AsyncSink(slow_sink, close_timeout=0.1)
+        solver = HopfieldSolver(max_iterations=200, telemetry=sink,
+                                telemetry_interval=1,
+                                precision_stopping_criterion=0)
+        t = time.perf_counter()
+        result = self.solve(solver)
+        self.assertLess(time.perf_counter() - t, 5)
+        self.assertGreater(sink.left_behind, 0)
+        # the thread closes the sink after the record it was writing
+        self.assertTrue(slow_sink.closed.wait(5))
+        self.assertEqual(len(slow_sink.records) + sink.dropped +
+                         sink.left_behind, result.iterations)
+
+    def test_abstract_sink(self):
+        with self.assertRaises(TypeError):
+            TelemetrySink()
+
+    def test_solve_without_history(self):
+        np.random.seed(0)
+        result = self.solve(HopfieldSolver(max_iterations=self.k_max))
+        solver = HopfieldSolver(max_iterations=self.k_max,
+                                store_history=False)
+        np.random.seed(0)
+        result_no_history = self.solve(solver)
+        self.assertFalse(result_no_history.has_history)
+        self.assertIsNone(result_no_history.x_history)
+        self.assertEqual(result_no_history.iterations, result.iterations)
+        np.testing.assert_allclose(result_no_history.x, result.x)
+        np.testing.assert_allclose(result_no_history.slack_variable,
+                                   result.slack_variable)
+        np.testing.assert_allclose(result_no_history.f_val_history,
+                                   result.f_val_history)
+
+
+if __name__ == '__main__':
+    unittest.main()
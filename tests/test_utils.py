@@ -1,5 +1,7 @@
 import unittest
 import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
 
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
@@ -174,6 +176,95 @@ class TestCheck(unittest.TestCase):
                                        0.5 * (non_symmetric_matrix + non_symmetric_matrix.T)))
 
 
+class TestLinearOperator(unittest.TestCase):
+    def setUp(self):
+        self.A = np.array([[1., 2., 0.], [0., 1., 3.]])
+        self.operator = scipy.sparse.linalg.LinearOperator(
+            self.A.shape, matvec=lambda x: np.dot(self.A, x),
+            rmatvec=lambda y: np.dot(self.A.T, y))
+
+    def test_matvec_rmatvec(self):
+        x = np.array([1., -1., 2.])
+        y = np.array([0.5, 2.])
+        for A in [self.A, scipy.sparse.csr_matrix(self.A), self.operator]:
+            self.assertTrue(np.allclose(utils.matvec(A, x), np.dot(self.A, x)))
+            self.assertTrue(np.allclose(utils.rmatvec(A, y),
+                                        np.dot(self.A.T, y)))
+
+    def test_is_linear_operator(self):
+        self.assertTrue(utils.is_linear_operator(self.operator))
+        self.assertFalse(utils.is_linear_operator(self.A))
+        self.assertFalse(utils.is_linear_operator(None))
+
+    def test_squared_spectral_norm(self):
+        expected = max(np.linalg.eigvals(np.dot(self.A.T, self.A)))
+        self.assertTrue(np.isclose(utils.squared_spectral_norm(self.operator),
+                                   expected, rtol=1e-3))
+
+    def test_power_iteration_random_state(self):
+        # the estimate does not depend on, nor change, the global state
+        np.random.seed(0)
+        first = utils.squared_spectral_norm(self.operator)
+        self.assertEqual(np.random.rand(), np.random.RandomState(0).rand())
+        self.assertEqual(utils.squared_spectral_norm(self.operator), first)
+        # a given random state is used instead
+        random_state = np.random.RandomState(1)
+        utils.squared_spectral_norm(self.operator, random_state)
+        self.assertNotEqual(random_state.rand(),
+                            np.random.RandomState(1).rand())
+
+    def test_use_gram_operator(self):
+        tall = np.ones((10, 3))
+        wide = np.ones((2, 10))
+        self.assertTrue(utils.use_gram_operator(tall))
+        self.assertFalse(utils.use_gram_operator(wide))
+        self.assertTrue(utils.use_gram_operator(wide, 'gram'))
+        self.assertFalse(utils.use_gram_operator(tall, 'matvec'))
+        self.assertFalse(utils.use_gram_operator(self.operator))
+        with self.assertRaises(Exception):
+            utils.use_gram_operator(self.operator, 'gram')
+
+        diagonal = scipy.sparse.identity(10, format='csr')
+        self.assertTrue(utils.use_gram_operator(diagonal))
+        dense_rows = scipy.sparse.csr_matrix(np.ones((2, 10)))
+        self.assertFalse(utils.use_gram_operator(dense_rows))
+
+    def test_constraint_gram(self):
+        b = np.array([1., 2.])
+        for A in [self.A, scipy.sparse.csr_matrix(self.A)]:
+            gram, gram_b = utils.constraint_gram(A, b)
+            x = np.array([1., -1., 2.])
+            self.assertTrue(np.allclose(utils.matvec(gram, x),
+                                        np.dot(self.A.T, np.dot(self.A, x))))
+            self.assertTrue(np.allclose(gram_b, np.dot(self.A.T, b)))
+
+    def test_smoothness_coefficient(self):
+        H = np.array([[2., 1.], [1., 3.]])
+        operator = scipy.sparse.linalg.aslinearoperator(H)
+        self.assertTrue(np.isclose(utils.smoothness_coefficient(operator),
+                                   utils.smoothness_coefficient(H), rtol=1e-3))
+
+
+    def test_squared_column_norms(self):
+        expected = np.diag(np.dot(self.A.T, self.A))
+        for A in [self.A, scipy.sparse.csr_matrix(self.A)]:
+            np.testing.assert_allclose(utils.squared_column_norms(A),
+                                       expected)
+
+    def test_diagonal(self):
+        H = np.array([[2., 1.], [1., 3.]])
+        for matrix in [H, scipy.sparse.csr_matrix(H)]:
+            np.testing.assert_allclose(utils.diagonal(matrix),
+                                       np.array([2., 3.]))
+        # exact for a diagonal operator, unbiased otherwise
+        operator = scipy.sparse.linalg.aslinearoperator(np.diag([1., 5.]))
+        np.testing.assert_allclose(utils.diagonal(operator),
+                                   np.array([1., 5.]))
+        estimate = utils.estimate_diagonal(
+            lambda v: np.dot(H, v), 2, np.random.RandomState(0),
+            samples=1000)
+        np.testing.assert_allclose(estimate, np.array([2., 3.]), atol=0.2)
+
 class TestUtils(unittest.TestCase):
     def test_remove_nan_results(self):
         x = np.array([[0, 0, 0, 1, None, None, None]], dtype=np.float64)